@@ -0,0 +1,464 @@
+"""
+Benchmarks das etapas do pipeline sobre dados sintéticos (gerar_acidentes.py), usando
+substitutos locais dos serviços:
+
+- bronze: CSV -> Parquet, em streaming e concatenando a tabela inteira, contra a
+  conversão antiga em chunks do pandas (referencias_antigas.py), e linhas/s de cada
+  tipo lógico de coluna (esquema_bronze) nos dois leitores;
+- upload: envio multipart do Parquet com vários tamanhos de parte (só com
+  BENCH_S3_ENDPOINT, ex.: um MinIO local ou `moto_server`);
+- mysql: Parquet -> MySQL com cada backend de carga, tamanho das linhas e latência
+  de uma consulta da Gold com o schema inferido e com a DDL antiga (TEXT), e as métricas da Gold pelas tabelas de resumo contra o
+  caminho antigo (SELECT * + cubo no pandas) e o backend DuckDB sobre o mesmo
+  Parquet (só com BENCH_MYSQL_HOST);
+- gold: cubo de métricas com pandas (uma passada e em chunks) e com DuckDB;
+- artefatos: gráficos e mapa de calor, com o cache de artefatos frio e quente, e o
+  HTML do mapa de calor com um ponto por acidente (antigo) contra as células
+  agregadas (tempo de renderização e tamanho do arquivo);
+- hotspots: detecção de pontos críticos (índice em grade + agrupamento por densidade)
+  de 100 mil a 10 milhões de pontos, para conferir que o custo cresce ~linearmente,
+  com todos os pontos de uma vez e alimentados em chunks (pico de RSS limitado).
+
+Cada etapa registra tempo, linhas/s e pico de RSS do processo em um arquivo JSON,
+identificado pelo commit, para comparar execuções.
+
+Uso: python executar_benchmarks.py --linhas 1000000 --dir /tmp/bench
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import psutil
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(RAIZ, 'airflow', 'dags', 'tasks'))
+os.environ.setdefault('BRONZE_LOG_PATH', os.devnull)
+
+from gerar_acidentes import gerar_csv, gerar_pontos  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ETAPAS = ['bronze', 'upload', 'mysql', 'gold', 'artefatos', 'hotspots']
+PONTOS_HOTSPOTS = [100_000, 1_000_000, 10_000_000]
+TAMANHO_LOTE = 50_000
+MB = 1024 * 1024
+
+class MedidorDePico:
+    """Amostra o RSS do processo em uma thread para obter o pico durante uma etapa."""
+
+    def __init__(self, intervalo=0.02):
+        self.intervalo = intervalo
+        self.processo = psutil.Process()
+        self._parar = threading.Event()
+
+    def _amostrar(self):
+        while not self._parar.wait(self.intervalo):
+            self.pico = max(self.pico, self.processo.memory_info().rss)
+
+    def __enter__(self):
+        self.inicial = self.pico = self.processo.memory_info().rss
+        self._thread = threading.Thread(target=self._amostrar, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *excecao):
+        self._parar.set()
+        self._thread.join()
+        self.pico = max(self.pico, self.processo.memory_info().rss)
+
+def medir(resultados, nome, linhas, funcao, *args, **kwargs):
+    """Executa funcao e registra tempo, linhas/s e pico de RSS em resultados[nome]."""
+    logger.info(f"Executando {nome}...")
+    with MedidorDePico() as medidor:
+        inicio = time.perf_counter()
+        retorno = funcao(*args, **kwargs)
+        tempo_s = time.perf_counter() - inicio
+    resultados[nome] = {
+        'tempo_s': round(tempo_s, 4),
+        'linhas': linhas,
+        'linhas_por_s': round(linhas / tempo_s, 1) if tempo_s else None,
+        'pico_rss_mb': round(medidor.pico / MB, 1),
+        'acrescimo_rss_mb': round((medidor.pico - medidor.inicial) / MB, 1),
+    }
+    logger.info(f"{nome}: {resultados[nome]}")
+    return retorno
+
+def _converter_colunas_arrow(caminho_csv, colunas):
+    import pyarrow.csv as pv
+    from esquema_bronze import ler_cabecalho, normalizar_lote, opcoes_conversao, schema_arrow
+
+    opcoes = opcoes_conversao(ler_cabecalho(caminho_csv))
+    opcoes.include_columns = colunas
+    leitor = pv.open_csv(
+        caminho_csv,
+        read_options=pv.ReadOptions(encoding='latin1', block_size=16 * MB),
+        parse_options=pv.ParseOptions(delimiter=';'),
+        convert_options=opcoes,
+    )
+    schema = schema_arrow(colunas)
+    return sum(normalizar_lote(lote, schema).num_rows for lote in leitor)
+
+def etapa_bronze(resultados, caminho_csv, diretorio, linhas):
+    from bronze import carregar_e_salvar_em_chunks
+    from esquema_bronze import ler_cabecalho, tipo_logico
+    from referencias_antigas import converter_colunas_pandas, converter_csv_pandas
+
+    caminho_parquet = os.path.join(diretorio, 'bronze.parquet')
+    caminho_parquet_pandas = os.path.join(diretorio, 'bronze_pandas.parquet')
+    # Streaming primeiro: memória liberada pelo modo concatenado nem sempre volta ao SO
+    medir(resultados, 'bronze_csv_parquet_streaming', linhas, carregar_e_salvar_em_chunks, caminho_csv, caminho_parquet)
+    medir(resultados, 'bronze_csv_parquet_pandas', linhas, converter_csv_pandas, caminho_csv, caminho_parquet_pandas,
+          chunksize=TAMANHO_LOTE)
+    medir(resultados, 'bronze_csv_parquet_concatenado', linhas, carregar_e_salvar_em_chunks,
+          caminho_csv, caminho_parquet, streaming=False)
+    resultados['bronze_csv_parquet_streaming']['bytes_csv'] = os.path.getsize(caminho_csv)
+    resultados['bronze_csv_parquet_streaming']['bytes_parquet'] = os.path.getsize(caminho_parquet)
+    resultados['bronze_csv_parquet_pandas']['bytes_parquet'] = os.path.getsize(caminho_parquet_pandas)
+
+    # Leitura + conversão só das colunas de cada tipo lógico, nos dois leitores
+    por_tipo = {}
+    for coluna in ler_cabecalho(caminho_csv):
+        por_tipo.setdefault(tipo_logico(coluna), []).append(coluna)
+    for tipo, colunas in sorted(por_tipo.items()):
+        arrow = f'bronze_tipo_{tipo}_arrow'
+        pandas = f'bronze_tipo_{tipo}_pandas'
+        medir(resultados, arrow, linhas, _converter_colunas_arrow, caminho_csv, colunas)
+        medir(resultados, pandas, linhas, converter_colunas_pandas, caminho_csv, colunas, chunksize=TAMANHO_LOTE)
+        resultados[arrow]['colunas'] = colunas
+        resultados[arrow]['aceleracao'] = round(resultados[pandas]['tempo_s'] / resultados[arrow]['tempo_s'], 2)
+    return caminho_parquet
+
+def etapa_upload(resultados, caminho_parquet, linhas):
+    from upload_minio import criar_cliente_s3, enviar_arquivo_multipart
+
+    endpoint = os.environ.get('BENCH_S3_ENDPOINT')
+    if not endpoint:
+        logger.info("BENCH_S3_ENDPOINT não definido; etapa upload ignorada.")
+        return
+    s3_client = criar_cliente_s3(
+        endpoint,
+        os.environ.get('BENCH_S3_ACCESS_KEY', 'minioadmin'),
+        os.environ.get('BENCH_S3_SECRET_KEY', 'minio@1234!')
+    )
+    bucket = os.environ.get('BENCH_S3_BUCKET', 'benchmark')
+    if bucket not in [b['Name'] for b in s3_client.list_buckets()['Buckets']]:
+        s3_client.create_bucket(Bucket=bucket)
+
+    tamanho = os.path.getsize(caminho_parquet)
+    for tamanho_parte_mb in (5, 16, 64):
+        nome = f'upload_parte_{tamanho_parte_mb}mb'
+        medir(resultados, nome, linhas, enviar_arquivo_multipart, s3_client, caminho_parquet, bucket,
+              'data.parquet', tamanho_parte=tamanho_parte_mb * MB, forcar=True)
+        resultados[nome]['mb_por_s'] = round(tamanho / MB / resultados[nome]['tempo_s'], 1)
+
+def _carregar_parquet_no_mysql(conexao, caminho_parquet, tabela, backend, esquema_texto=False):
+    """Carrega o Parquet na tabela com os tipos inferidos ou, com esquema_texto, com a DDL antiga."""
+    import pyarrow as pa
+    from pyarrow import fs
+
+    from carga_mysql import carregar_chunk
+    from esquema_mysql import criar_ou_evoluir_tabela, inferir_tipos
+    from leitura_minio import iterar_lotes_parquet
+    from referencias_antigas import montar_create_table_texto
+
+    schema, lotes = iterar_lotes_parquet(caminho_parquet, fs.LocalFileSystem(), tamanho_lote=TAMANHO_LOTE)
+    with conexao.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {tabela}")
+        if esquema_texto:
+            cursor.execute(montar_create_table_texto(tabela, schema, ['id']))
+        for numero, lote in enumerate(lotes):
+            chunk = pa.Table.from_batches([lote]).to_pandas()
+            if numero == 0 and not esquema_texto:
+                criar_ou_evoluir_tabela(cursor, tabela, inferir_tipos(schema, chunk), ['id'])
+            carregar_chunk(backend, cursor, tabela, chunk, colunas_chave=['id'])
+            conexao.commit()
+
+def _medir_tabela_mysql(conexao, tabela):
+    """Tamanho das linhas e latência de uma consulta típica da Gold (um estado em um mês)."""
+    from esquema_mysql import tamanho_medio_linha
+
+    with conexao.cursor() as cursor:
+        cursor.execute(f"ANALYZE TABLE {tabela}")
+        cursor.fetchall()
+        tamanho_linha, tamanho_dados, tamanho_indices = tamanho_medio_linha(cursor, tabela)
+        inicio = time.perf_counter()
+        cursor.execute(
+            f"SELECT uf, COUNT(*), SUM(mortos) FROM {tabela} "
+            "WHERE uf = 'SP' AND data_inversa BETWEEN '2024-03-01' AND '2024-03-31' GROUP BY uf"
+        )
+        cursor.fetchall()
+        return {
+            'bytes_por_linha': tamanho_linha,
+            'bytes_dados': tamanho_dados,
+            'bytes_indices': tamanho_indices,
+            'consulta_uf_periodo_s': round(time.perf_counter() - inicio, 4),
+        }
+
+def _gold_select_todas(conexao, tabela):
+    """Caminho antigo da Gold: a tabela inteira no pandas e o cubo de métricas em memória."""
+    import pandas as pd
+
+    from metrics import build_cube, compute_metrics
+
+    df = pd.read_sql(f"SELECT * FROM {tabela}", conexao)
+    return compute_metrics(build_cube(df)), len(df)
+
+def _atualizar_resumos(conexao, tabela):
+    from aggregates import refresh_summaries
+
+    with conexao.cursor() as cursor:
+        refresh_summaries(cursor, source=tabela)
+    conexao.commit()
+
+def _mesmos_obitos_por_estado(antigo, atual):
+    return bool(
+        antigo['obitos_por_estado']['mortos'].sort_index().astype('int64')
+        .equals(atual['obitos_por_estado']['mortos'].sort_index().astype('int64'))
+    )
+
+def _comparar_gold_mysql(resultados, conexao, tabela, caminho_parquet, linhas):
+    """
+    Métricas da Gold pelas tabelas de resumo (construção completa + consulta) contra o
+    SELECT * da tabela inteira, e o backend DuckDB lendo o Parquet que foi carregado na
+    tabela. Os resumos são criados como TEMPORARY com os nomes de produção: na sessão do
+    benchmark eles encobrem os reais, que não são alterados.
+    """
+    from aggregates import SUMMARY_TABLES, query_summaries
+
+    with conexao.cursor() as cursor:
+        for definicao in SUMMARY_TABLES.values():
+            cursor.execute(definicao["ddl"].replace("CREATE TABLE IF NOT EXISTS", "CREATE TEMPORARY TABLE"))
+    try:
+        antigo, linhas_transferidas = medir(resultados, 'gold_mysql_select_todas', linhas, _gold_select_todas, conexao, tabela)
+        resultados['gold_mysql_select_todas']['linhas_transferidas'] = linhas_transferidas
+        medir(resultados, 'gold_mysql_resumos_construcao', linhas, _atualizar_resumos, conexao, tabela)
+        atual = medir(resultados, 'gold_mysql_resumos_consulta', linhas, query_summaries, conexao)
+        resultados['gold_mysql_resumos_consulta']['aceleracao'] = round(
+            resultados['gold_mysql_select_todas']['tempo_s'] / resultados['gold_mysql_resumos_consulta']['tempo_s'], 1
+        )
+        resultados['gold_mysql_resumos_consulta']['mesmos_obitos_por_estado'] = _mesmos_obitos_por_estado(antigo, atual)
+
+        pelo_duckdb = medir(resultados, 'gold_duckdb_contra_mysql', linhas, _metricas_duckdb, caminho=caminho_parquet)
+        tempo_duckdb = resultados['gold_duckdb_contra_mysql']['tempo_s']
+        tempo_resumos = (
+            resultados['gold_mysql_resumos_construcao']['tempo_s'] + resultados['gold_mysql_resumos_consulta']['tempo_s']
+        )
+        resultados['gold_duckdb_contra_mysql'].update(
+            aceleracao_sobre_select_todas=round(resultados['gold_mysql_select_todas']['tempo_s'] / tempo_duckdb, 1),
+            aceleracao_sobre_resumos_completos=round(tempo_resumos / tempo_duckdb, 1),
+            mesmos_obitos_por_estado=_mesmos_obitos_por_estado(antigo, pelo_duckdb),
+        )
+    finally:
+        with conexao.cursor() as cursor:
+            cursor.execute(f"DROP TEMPORARY TABLE IF EXISTS {', '.join(SUMMARY_TABLES)}")
+
+def etapa_mysql(resultados, caminho_parquet, linhas):
+    import pymysql
+
+    from carga_mysql import BACKENDS
+
+    host = os.environ.get('BENCH_MYSQL_HOST')
+    if not host:
+        logger.info("BENCH_MYSQL_HOST não definido; etapa mysql ignorada.")
+        return
+    conexao = pymysql.connect(
+        host=host,
+        port=int(os.environ.get('BENCH_MYSQL_PORT', 3306)),
+        user=os.environ.get('BENCH_MYSQL_USER', 'airflow_user'),
+        password=os.environ.get('BENCH_MYSQL_PASSWORD', 'airflow_password'),
+        database=os.environ.get('BENCH_MYSQL_DATABASE', 'airflow'),
+        local_infile=True
+    )
+    tabela = 'benchmark_acidentes'
+    try:
+        for backend in BACKENDS:
+            nome = f'mysql_carga_{backend}'
+            medir(resultados, nome, linhas, _carregar_parquet_no_mysql, conexao, caminho_parquet, tabela, backend)
+
+        resultados['mysql_tabela'] = _medir_tabela_mysql(conexao, tabela)
+        _comparar_gold_mysql(resultados, conexao, tabela, caminho_parquet, linhas)
+
+        # Mesmos dados com a DDL antiga (INT/DOUBLE/TEXT, sem índices secundários)
+        medir(resultados, 'mysql_carga_esquema_texto_antigo', linhas, _carregar_parquet_no_mysql, conexao,
+              caminho_parquet, tabela, 'multirow', esquema_texto=True)
+        resultados['mysql_tabela_esquema_texto_antigo'] = _medir_tabela_mysql(conexao, tabela)
+        for metrica in ('bytes_por_linha', 'consulta_uf_periodo_s'):
+            antigo = resultados['mysql_tabela_esquema_texto_antigo'][metrica]
+            atual = resultados['mysql_tabela'][metrica]
+            resultados['mysql_tabela'][f'{metrica}_reducao'] = round(antigo / atual, 1) if atual else None
+        with conexao.cursor() as cursor:
+            cursor.execute(f"DROP TABLE {tabela}")
+    finally:
+        conexao.close()
+
+def _metricas_pandas(caminho_parquet):
+    import pyarrow.parquet as pq
+
+    from metrics import build_cube, compute_metrics, required_columns
+
+    df = pq.read_table(caminho_parquet, columns=required_columns()).to_pandas()
+    return compute_metrics(build_cube(df))
+
+def _metricas_pandas_em_chunks(caminho_parquet):
+    import pyarrow.parquet as pq
+
+    from metrics import build_cube, compute_metrics, merge_cubes, required_columns
+
+    cube = None
+    for lote in pq.ParquetFile(caminho_parquet).iter_batches(batch_size=TAMANHO_LOTE, columns=required_columns()):
+        parcial = build_cube(lote.to_pandas())
+        cube = parcial if cube is None else merge_cubes([cube, parcial])
+    return compute_metrics(cube)
+
+def _metricas_duckdb(diretorio=None, caminho=None):
+    import duckdb
+
+    from duckdb_backend import build_cube_duckdb
+    from metrics import compute_metrics
+
+    con = duckdb.connect()
+    try:
+        return compute_metrics(build_cube_duckdb(con, base=diretorio, path=caminho))
+    finally:
+        con.close()
+
+def etapa_gold(resultados, caminho_parquet, diretorio, linhas):
+    from duckdb_backend import SILVER_FILE
+
+    analise = medir(resultados, 'gold_pandas_uma_passada', linhas, _metricas_pandas, caminho_parquet)
+    medir(resultados, 'gold_pandas_em_chunks', linhas, _metricas_pandas_em_chunks, caminho_parquet)
+
+    # O DuckDB lê o Parquet como se fosse a saída da Silver (mesmas colunas)
+    shutil.copyfile(caminho_parquet, os.path.join(diretorio, SILVER_FILE))
+    medir(resultados, 'gold_duckdb', linhas, _metricas_duckdb, diretorio)
+    return analise
+
+def etapa_artefatos(resultados, caminho_parquet, diretorio, analise, linhas):
+    import pyarrow.parquet as pq
+
+    from gold import BRAZIL_BOUNDS, HEATMAP_RESOLUTION, create_artifacts, render_heatmap
+    from referencias_antigas import agrupar_celulas_numpy, criar_mapa_pontos_folium
+
+    coordenadas = pq.read_table(caminho_parquet, columns=['latitude', 'longitude'])
+    cells = medir(resultados, 'gold_celulas_mapa', linhas, agrupar_celulas_numpy,
+                  coordenadas['latitude'].to_numpy(), coordenadas['longitude'].to_numpy(),
+                  HEATMAP_RESOLUTION, BRAZIL_BOUNDS)
+
+    # Mapa de calor HTML: um ponto do folium por acidente (antigo) contra as células agregadas
+    os.makedirs(diretorio, exist_ok=True)
+    mapa_pontos = os.path.join(diretorio, 'heatmap_pontos.html')
+    mapa_celulas = os.path.join(diretorio, 'heatmap_celulas.html')
+    # O folium recusa coordenadas nulas; a Silver antiga já as descartava antes do mapa
+    pontos = medir(resultados, 'gold_mapa_html_pontos_antigo', linhas, criar_mapa_pontos_folium,
+                   coordenadas.to_pandas().dropna(), mapa_pontos)
+    medir(resultados, 'gold_mapa_html_celulas', linhas, render_heatmap, cells, mapa_celulas)
+    resultados['gold_mapa_html_pontos_antigo'].update(pontos=pontos, bytes_html=os.path.getsize(mapa_pontos))
+    resultados['gold_mapa_html_celulas'].update(pontos=len(cells), bytes_html=os.path.getsize(mapa_celulas))
+
+    # Caminho completo da Gold: gráficos, mapa de calor (HTML e PNG) e o relatório PDF
+    saida = os.path.join(diretorio, 'artefatos')
+    cache = os.path.join(diretorio, 'cache_artefatos')
+    shutil.rmtree(cache, ignore_errors=True)
+    caminhos = {
+        'graphs_dir': saida,
+        'heatmap_path': os.path.join(saida, 'heatmap_acidentes.html'),
+        'pdf_path': os.path.join(saida, 'analise_acidentes.pdf'),
+    }
+    medir(resultados, 'gold_artefatos_cache_frio', linhas, create_artifacts, analise, cells, cache_dir=cache, **caminhos)
+    medir(resultados, 'gold_artefatos_cache_quente', linhas, create_artifacts, analise, cells, cache_dir=cache, **caminhos)
+    resultados['gold_artefatos_cache_frio']['bytes'] = {
+        nome: os.path.getsize(os.path.join(saida, nome)) for nome in sorted(os.listdir(saida))
+    }
+    resultados['gold_artefatos_cache_frio']['celulas_mapa'] = len(cells)
+
+def _hotspots_em_chunks(dados, tamanho_chunk):
+    from hotspots import HotspotAccumulator
+
+    acumulador = HotspotAccumulator()
+    for inicio in range(0, len(dados), tamanho_chunk):
+        acumulador.add(dados.iloc[inicio:inicio + tamanho_chunk])
+    return acumulador.result()
+
+def etapa_hotspots(resultados, tamanhos, semente, tamanho_chunk):
+    from hotspots import find_hotspots
+
+    for pontos in tamanhos:
+        dados = gerar_pontos(pontos, semente)
+        for nome, funcao, argumentos in (
+            (f'hotspots_{pontos}_pontos', find_hotspots, (dados,)),
+            (f'hotspots_{pontos}_pontos_em_chunks', _hotspots_em_chunks, (dados, tamanho_chunk)),
+        ):
+            ranking = medir(resultados, nome, pontos, funcao, *argumentos)
+            resultados[nome]['hotspots'] = len(ranking)
+            resultados[nome]['microssegundos_por_ponto'] = round(resultados[nome]['tempo_s'] / pontos * 1e6, 3)
+            del ranking
+        del dados
+
+def _commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'desconhecido'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--dir', default='/tmp/benchmark_acidentes')
+    parser.add_argument('--etapas', nargs='+', choices=ETAPAS, default=ETAPAS)
+    parser.add_argument('--pontos-hotspots', nargs='+', type=int, default=PONTOS_HOTSPOTS)
+    parser.add_argument('--chunk-hotspots', type=int, default=100_000)
+    parser.add_argument('--resultados', help='Arquivo JSON de saída (padrão: <dir>/resultados_<commit>.json)')
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    commit = _commit_atual()
+    caminho_csv = os.path.join(args.dir, f'acidentes_2024_{args.linhas}.csv')
+    if not os.path.exists(caminho_csv):
+        gerar_csv(caminho_csv, args.linhas, 2024, args.semente)
+
+    etapas = {}
+    caminho_parquet = os.path.join(args.dir, 'bronze.parquet')
+    if 'bronze' in args.etapas or not os.path.exists(caminho_parquet):
+        caminho_parquet = etapa_bronze(etapas, caminho_csv, args.dir, args.linhas)
+    if 'upload' in args.etapas:
+        etapa_upload(etapas, caminho_parquet, args.linhas)
+    if 'mysql' in args.etapas:
+        etapa_mysql(etapas, caminho_parquet, args.linhas)
+    if 'gold' in args.etapas or 'artefatos' in args.etapas:
+        analise = etapa_gold(etapas, caminho_parquet, args.dir, args.linhas)
+        if 'artefatos' in args.etapas:
+            etapa_artefatos(etapas, caminho_parquet, args.dir, analise, args.linhas)
+    if 'hotspots' in args.etapas:
+        etapa_hotspots(etapas, args.pontos_hotspots, args.semente, args.chunk_hotspots)
+
+    resultado = {
+        'commit': commit,
+        'executado_em': datetime.now(timezone.utc).isoformat(),
+        'linhas': args.linhas,
+        'semente': args.semente,
+        'maquina': {
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'memoria_mb': round(psutil.virtual_memory().total / MB),
+        },
+        'etapas': etapas,
+    }
+    caminho_resultados = args.resultados or os.path.join(args.dir, f'resultados_{commit}.json')
+    with open(caminho_resultados, 'w', encoding='utf-8') as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    logger.info(f"Resultados gravados em {caminho_resultados}.")
+
+if __name__ == "__main__":
+    main()
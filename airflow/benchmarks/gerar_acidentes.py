@@ -0,0 +1,221 @@
+"""
+Gerador determinístico de arquivos acidentes_AAAA.csv sintéticos no formato da PRF
+(separador ';', latin1, vírgula decimal), com as mesmas colunas e cardinalidades
+aproximadas dos dados reais. A mesma semente e o mesmo número de linhas geram sempre
+o mesmo arquivo, o que permite comparar benchmarks entre commits.
+
+Uso: python gerar_acidentes.py --linhas 1000000 --ano 2024 --saida /tmp/bench
+"""
+import argparse
+import logging
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Linhas geradas (e gravadas) por vez; fixo para que o arquivo não dependa da memória disponível
+LINHAS_POR_BLOCO = 200_000
+
+# Faixa de ids de cada ano (ids de anos diferentes não colidem até este número de linhas)
+IDS_POR_ANO = 50_000_000
+
+COLUNAS = [
+    'id', 'data_inversa', 'dia_semana', 'horario', 'uf', 'br', 'km', 'municipio',
+    'causa_principal', 'causa_acidente', 'tipo_acidente', 'classificacao_acidente', 'fase_dia',
+    'sentido_via', 'condicao_metereologica', 'tipo_pista', 'tracado_via', 'uso_solo',
+    'pessoas', 'mortos', 'feridos_leves', 'feridos_graves', 'ilesos', 'ignorados', 'feridos',
+    'veiculos', 'latitude', 'longitude', 'regional', 'delegacia', 'uop',
+]
+
+# UF -> (latitude, longitude) aproximadas do centro do estado e peso relativo de acidentes
+UFS = {
+    'AC': (-9.0, -70.5, 1), 'AL': (-9.6, -36.6, 2), 'AM': (-4.0, -63.0, 1), 'AP': (1.4, -51.8, 1),
+    'BA': (-12.5, -41.7, 8), 'CE': (-5.2, -39.5, 4), 'DF': (-15.8, -47.9, 3), 'ES': (-19.6, -40.7, 4),
+    'GO': (-16.0, -49.6, 7), 'MA': (-5.0, -45.3, 3), 'MG': (-18.5, -44.6, 15), 'MS': (-20.5, -54.6, 4),
+    'MT': (-12.9, -56.0, 5), 'PA': (-3.8, -52.5, 3), 'PB': (-7.1, -36.7, 3), 'PE': (-8.3, -37.9, 5),
+    'PI': (-7.7, -42.7, 3), 'PR': (-24.6, -51.6, 12), 'RJ': (-22.4, -42.7, 7), 'RN': (-5.8, -36.5, 3),
+    'RO': (-10.9, -62.8, 3), 'RR': (2.0, -61.4, 1), 'RS': (-29.8, -53.2, 8), 'SC': (-27.3, -50.4, 10),
+    'SE': (-10.6, -37.4, 1), 'SP': (-22.2, -48.7, 9), 'TO': (-10.2, -48.3, 2),
+}
+
+CONDICOES = ['Céu Claro', 'Nublado', 'Chuva', 'Sol', 'Garoa/Chuvisco', 'Nevoeiro/Neblina', 'Ignorado', 'Vento', 'Normal', 'Granizo']
+CAUSAS = [
+    'Ausência de reação do condutor', 'Reação tardia ou ineficiente do condutor', 'Velocidade Incompatível',
+    'Acessar a via sem observar a presença dos outros veículos', 'Condutor deixou de manter distância do veículo da frente',
+    'Manobra de mudança de faixa', 'Ingestão de álcool pelo condutor', 'Transitar na contramão',
+    'Condutor Dormindo', 'Pista Escorregadia', 'Desrespeitar a preferência no cruzamento', 'Animais na Pista',
+    'Demais falhas mecânicas ou elétricas', 'Pedestre andava na pista', 'Ultrapassagem Indevida',
+    'Mal súbito do condutor', 'Chuva', 'Defeito na Via', 'Carga excessiva e/ou mal acondicionada',
+    'Avarias e/ou desgaste excessivo no pneu',
+] + [f'Outra causa {numero:02d}' for numero in range(50)]
+TIPOS_ACIDENTE = [
+    'Colisão traseira', 'Saída de leito carroçável', 'Colisão transversal', 'Tombamento', 'Colisão lateral mesmo sentido',
+    'Colisão frontal', 'Queda de ocupante de veículo', 'Atropelamento de Pedestre', 'Engavetamento',
+    'Colisão com objeto', 'Capotamento', 'Atropelamento de Animal', 'Incêndio', 'Derramamento de carga',
+    'Colisão lateral sentido oposto', 'Eventos atípicos',
+]
+CLASSIFICACOES = ['Com Vítimas Feridas', 'Sem Vítimas', 'Com Vítimas Fatais']
+FASES_DIA = ['Pleno dia', 'Plena Noite', 'Anoitecer', 'Amanhecer']
+SENTIDOS = ['Crescente', 'Decrescente', 'Não Informado']
+TIPOS_PISTA = ['Simples', 'Dupla', 'Múltipla']
+TRACADOS = ['Reta', 'Curva', 'Interseção de Vias', 'Rotatória', 'Desvio Temporário', 'Viaduto', 'Ponte', 'Não Informado']
+USO_SOLO = ['Sim', 'Não']
+DIAS_SEMANA = ['segunda-feira', 'terça-feira', 'quarta-feira', 'quinta-feira', 'sexta-feira', 'sábado', 'domingo']
+BRS = [101, 116, 40, 381, 153, 364, 277, 369, 163, 470, 262, 60, 20, 230, 304, 50, 232, 316, 135, 242]
+
+# Trechos de rodovia por UF em torno dos quais os acidentes se concentram
+TRECHOS_POR_UF = 150
+MUNICIPIOS_POR_UF = 70
+
+def _escolher(rng, valores, tamanho, pesos=None):
+    indices = rng.choice(len(valores), size=tamanho, p=pesos)
+    return np.asarray(valores, dtype=object)[indices]
+
+def _pesos_zipf(quantidade, expoente=1.1):
+    pesos = 1.0 / np.arange(1, quantidade + 1) ** expoente
+    return pesos / pesos.sum()
+
+def _trechos(semente):
+    """Centros fixos dos trechos de rodovia de cada UF (não dependem do número de linhas)."""
+    rng = np.random.default_rng([semente, 0])
+    trechos = {}
+    for uf, (latitude, longitude, _) in UFS.items():
+        trechos[uf] = np.column_stack([
+            latitude + rng.normal(0, 1.5, TRECHOS_POR_UF),
+            longitude + rng.normal(0, 1.5, TRECHOS_POR_UF),
+        ])
+    return trechos
+
+def _formatar_decimal(valores, casas):
+    texto = pd.Series(valores).round(casas).map(lambda valor: f"{valor:.{casas}f}".replace('.', ','))
+    return texto.where(pd.notna(valores), '')
+
+def gerar_bloco(rng, inicio, tamanho, ano, trechos):
+    """Gera tamanho linhas a partir do id inicio + 1."""
+    ufs = list(UFS)
+    pesos_uf = np.array([peso for _, _, peso in UFS.values()], dtype=float)
+    uf = _escolher(rng, ufs, tamanho, pesos_uf / pesos_uf.sum())
+
+    primeiro_dia = np.datetime64(date(ano, 1, 1))
+    dias = (np.datetime64(date(ano + 1, 1, 1)) - primeiro_dia).astype(int)
+    datas = primeiro_dia + rng.integers(0, dias, tamanho).astype('timedelta64[D]')
+    datas = pd.DatetimeIndex(datas)
+    segundos = rng.integers(0, 24 * 3600, tamanho)
+
+    # Coordenadas: um trecho da UF + ruído de ~1 km; 0,5% sem coordenada
+    indices_trecho = rng.choice(TRECHOS_POR_UF, size=tamanho, p=_pesos_zipf(TRECHOS_POR_UF))
+    centros = np.empty((tamanho, 2))
+    for sigla in np.unique(uf):
+        mascara = uf == sigla
+        centros[mascara] = trechos[sigla][indices_trecho[mascara]]
+    coordenadas = centros + rng.normal(0, 0.01, (tamanho, 2))
+    invalidas = rng.random(tamanho) < 0.005
+    coordenadas[invalidas] = np.nan
+
+    classificacao = _escolher(rng, CLASSIFICACOES, tamanho, [0.75, 0.18, 0.07])
+    pessoas = rng.integers(1, 6, tamanho) + (rng.random(tamanho) < 0.01) * rng.integers(10, 60, tamanho)
+    mortos = np.where(classificacao == 'Com Vítimas Fatais', rng.integers(1, 3, tamanho), 0)
+    feridos_graves = np.where(classificacao != 'Sem Vítimas', rng.binomial(2, 0.25, tamanho), 0)
+    feridos_leves = np.where(classificacao != 'Sem Vítimas', rng.binomial(3, 0.4, tamanho), 0)
+    ilesos = np.maximum(pessoas - mortos - feridos_graves - feridos_leves, 0)
+    ignorados = rng.binomial(1, 0.05, tamanho)
+
+    municipio = np.char.add(np.char.add(uf.astype(str), ' MUNICIPIO '), rng.integers(1, MUNICIPIOS_POR_UF + 1, tamanho).astype(str))
+    delegacia = np.char.add('DEL', rng.integers(1, 8, tamanho).astype(str))
+    causa = _escolher(rng, CAUSAS, tamanho, _pesos_zipf(len(CAUSAS)))
+
+    return pd.DataFrame({
+        'id': np.arange(inicio + 1, inicio + tamanho + 1),
+        'data_inversa': datas.strftime('%Y-%m-%d'),
+        'dia_semana': np.asarray(DIAS_SEMANA, dtype=object)[datas.dayofweek],
+        'horario': pd.Series(segundos).map(lambda s: f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}"),
+        'uf': uf,
+        'br': _escolher(rng, BRS, tamanho, _pesos_zipf(len(BRS))),
+        'km': _formatar_decimal(rng.uniform(0, 900, tamanho), 1),
+        'municipio': municipio,
+        'causa_principal': causa,
+        'causa_acidente': causa,
+        'tipo_acidente': _escolher(rng, TIPOS_ACIDENTE, tamanho, _pesos_zipf(len(TIPOS_ACIDENTE), 0.8)),
+        'classificacao_acidente': classificacao,
+        'fase_dia': _escolher(rng, FASES_DIA, tamanho, [0.55, 0.3, 0.08, 0.07]),
+        'sentido_via': _escolher(rng, SENTIDOS, tamanho, [0.49, 0.49, 0.02]),
+        'condicao_metereologica': _escolher(rng, CONDICOES, tamanho, _pesos_zipf(len(CONDICOES), 0.9)),
+        'tipo_pista': _escolher(rng, TIPOS_PISTA, tamanho, [0.5, 0.4, 0.1]),
+        'tracado_via': _escolher(rng, TRACADOS, tamanho, _pesos_zipf(len(TRACADOS))),
+        'uso_solo': _escolher(rng, USO_SOLO, tamanho),
+        'pessoas': pessoas,
+        'mortos': mortos,
+        'feridos_leves': feridos_leves,
+        'feridos_graves': feridos_graves,
+        'ilesos': ilesos,
+        'ignorados': ignorados,
+        'feridos': feridos_leves + feridos_graves,
+        'veiculos': rng.integers(1, 4, tamanho),
+        'latitude': _formatar_decimal(coordenadas[:, 0], 6),
+        'longitude': _formatar_decimal(coordenadas[:, 1], 6),
+        'regional': np.char.add('SPRF-', uf.astype(str)),
+        'delegacia': np.char.add(np.char.add(delegacia, '/'), uf.astype(str)),
+        'uop': np.char.add('UOP', rng.integers(1, 5, tamanho).astype(str)),
+    }, columns=COLUNAS)
+
+def gerar_pontos(linhas, semente=42):
+    """
+    Acidentes só com as colunas numéricas da detecção de hotspots (coordenadas, UF, BR,
+    km e vítimas), com a mesma distribuição espacial de gerar_bloco mas sem formatar o
+    CSV, para gerar milhões de pontos rapidamente.
+    """
+    rng = np.random.default_rng([semente, 1])
+    trechos = _trechos(semente)
+    ufs = list(UFS)
+    pesos_uf = np.array([peso for _, _, peso in UFS.values()], dtype=float)
+    indices_uf = rng.choice(len(ufs), size=linhas, p=pesos_uf / pesos_uf.sum())
+    indices_trecho = rng.choice(TRECHOS_POR_UF, size=linhas, p=_pesos_zipf(TRECHOS_POR_UF))
+    coordenadas = np.stack([trechos[uf] for uf in ufs])[indices_uf, indices_trecho] + rng.normal(0, 0.01, (linhas, 2))
+
+    classificacao = rng.choice(len(CLASSIFICACOES), size=linhas, p=[0.75, 0.18, 0.07])
+    com_vitimas = classificacao != CLASSIFICACOES.index('Sem Vítimas')
+    return pd.DataFrame({
+        'id': np.arange(1, linhas + 1),
+        'latitude': coordenadas[:, 0],
+        'longitude': coordenadas[:, 1],
+        'uf': pd.Categorical.from_codes(indices_uf, ufs),
+        'br': np.asarray(BRS)[rng.choice(len(BRS), size=linhas, p=_pesos_zipf(len(BRS)))],
+        'km': rng.uniform(0, 900, linhas).round(1),
+        'mortos': np.where(classificacao == CLASSIFICACOES.index('Com Vítimas Fatais'), rng.integers(1, 3, linhas), 0),
+        'feridos_graves': np.where(com_vitimas, rng.binomial(2, 0.25, linhas), 0),
+        'feridos_leves': np.where(com_vitimas, rng.binomial(3, 0.4, linhas), 0),
+        'tipo_acidente': pd.Categorical.from_codes(
+            rng.choice(len(TIPOS_ACIDENTE), size=linhas, p=_pesos_zipf(len(TIPOS_ACIDENTE), 0.8)), TIPOS_ACIDENTE
+        ),
+    })
+
+def gerar_csv(caminho_arquivo_csv, linhas, ano=2024, semente=42):
+    """Grava um CSV sintético com linhas linhas; retorna o caminho gravado."""
+    trechos = _trechos(semente)
+    logger.info(f"Gerando {linhas} linhas sintéticas para {ano} em {caminho_arquivo_csv}...")
+    with open(caminho_arquivo_csv, 'w', encoding='latin1', newline='') as arquivo:
+        for numero, inicio in enumerate(range(0, linhas, LINHAS_POR_BLOCO)):
+            rng = np.random.default_rng([semente, ano, numero + 1])
+            bloco = gerar_bloco(rng, inicio + (ano - 2000) * IDS_POR_ANO, min(LINHAS_POR_BLOCO, linhas - inicio), ano, trechos)
+            bloco.to_csv(arquivo, sep=';', index=False, header=numero == 0)
+    logger.info(f"Arquivo {caminho_arquivo_csv} gerado ({os.path.getsize(caminho_arquivo_csv)} bytes).")
+    return caminho_arquivo_csv
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--linhas', type=int, default=100_000)
+    parser.add_argument('--ano', type=int, nargs='+', default=[2024])
+    parser.add_argument('--semente', type=int, default=42)
+    parser.add_argument('--saida', default='.')
+    args = parser.parse_args()
+
+    os.makedirs(args.saida, exist_ok=True)
+    for ano in args.ano:
+        gerar_csv(os.path.join(args.saida, f'acidentes_{ano}.csv'), args.linhas, ano, args.semente)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Implementações anteriores de partes do pipeline, mantidas só como linha de base dos
+benchmarks (executar_benchmarks.py): cada etapa mede a versão atual e a antiga sobre
+os mesmos dados. Também ficam aqui as versões em memória do que as DAGs fazem no
+banco. Nada aqui é usado pelas DAGs.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# ----------------------
+# Bronze: conversão do CSV em chunks do pandas, com normalização coluna a coluna
+# ----------------------
+
+# Tipos Arrow das colunas conhecidas do arquivo da PRF; as demais são gravadas como texto.
+TIPOS_COLUNAS_PANDAS = {
+    'id': pa.int64(),
+    'latitude': pa.float64(),
+    'longitude': pa.float64(),
+    'feridos_leves': pa.int64(),
+    'feridos_graves': pa.int64(),
+    'mortos': pa.int64(),
+    'data_inversa': pa.date32(),
+    'horario': pa.time64('us'),
+}
+
+def normalizar_chunk_pandas(chunk):
+    """Normaliza os tipos de um chunk lido do CSV (troca de vírgula e casts por coluna)."""
+    for coluna in ('latitude', 'longitude'):
+        if coluna in chunk.columns:
+            chunk[coluna] = chunk[coluna].astype(str).str.replace(',', '.').astype(float)
+
+    for coluna in ('feridos_leves', 'feridos_graves', 'mortos'):
+        if coluna in chunk.columns:
+            chunk[coluna] = chunk[coluna].fillna(0).astype(int)
+
+    if 'data_inversa' in chunk.columns:
+        chunk['data_inversa'] = pd.to_datetime(chunk['data_inversa'], format='%Y-%m-%d', errors='coerce').dt.date
+
+    if 'horario' in chunk.columns:
+        chunk['horario'] = pd.to_datetime(chunk['horario'], format='%H:%M:%S', errors='coerce').dt.time
+
+    return chunk
+
+def ler_chunks_pandas(caminho_arquivo_csv, chunksize=50000, colunas=None):
+    """Chunks normalizados do CSV; colunas fora de TIPOS_COLUNAS_PANDAS são lidas como texto."""
+    cabecalho = pd.read_csv(caminho_arquivo_csv, sep=';', encoding='latin1', nrows=0).columns
+    colunas = list(cabecalho) if colunas is None else colunas
+    dtypes_texto = {coluna: str for coluna in colunas if coluna not in TIPOS_COLUNAS_PANDAS}
+    leitor = pd.read_csv(
+        caminho_arquivo_csv, sep=';', encoding='latin1', usecols=colunas, dtype=dtypes_texto, chunksize=chunksize
+    )
+    for chunk in leitor:
+        yield normalizar_chunk_pandas(chunk[colunas])
+
+def converter_csv_pandas(caminho_arquivo_csv, caminho_arquivo_parquet, chunksize=50000):
+    """CSV -> Parquet em streaming, cada chunk normalizado pelo pandas vira um row group."""
+    colunas = list(pd.read_csv(caminho_arquivo_csv, sep=';', encoding='latin1', nrows=0).columns)
+    schema = pa.schema([(coluna, TIPOS_COLUNAS_PANDAS.get(coluna, pa.string())) for coluna in colunas])
+    total_linhas = 0
+    with pq.ParquetWriter(caminho_arquivo_parquet, schema) as writer:
+        for chunk in ler_chunks_pandas(caminho_arquivo_csv, chunksize):
+            tabela = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            writer.write_table(tabela, row_group_size=len(tabela))
+            total_linhas += len(tabela)
+    return total_linhas
+
+def converter_colunas_pandas(caminho_arquivo_csv, colunas, chunksize=50000):
+    """Só leitura e normalização das colunas informadas (sem gravar), para medir cada tipo."""
+    return sum(len(chunk) for chunk in ler_chunks_pandas(caminho_arquivo_csv, chunksize, colunas))
+
+# ----------------------
+# Gold: mapa de calor com um ponto do folium por acidente, e as células agregadas em memória
+# ----------------------
+
+def criar_mapa_pontos_folium(df, caminho_html):
+    """Mapa de calor antigo: geometria e um ponto do HeatMap por linha, via apply/iterrows."""
+    import folium
+    from folium.plugins import HeatMap
+    from shapely.geometry import Point
+
+    df['geometry'] = df.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
+    mapa = folium.Map(location=[-15.7801, -47.9292], zoom_start=5)
+    heat_data = [[row['latitude'], row['longitude']] for _, row in df.iterrows()]
+    HeatMap(heat_data).add_to(mapa)
+    mapa.save(caminho_html)
+    return len(heat_data)
+
+def agrupar_celulas_numpy(latitude, longitude, resolucao, limites):
+    """
+    Agrupa as coordenadas em células de grade em memória, com o número de acidentes
+    como peso. Na DAG o mesmo agrupamento é feito no banco (gold.fetch_heatmap_cells).
+    """
+    lat = np.asarray(latitude, dtype=float)
+    lon = np.asarray(longitude, dtype=float)
+    validas = (
+        np.isfinite(lat) & np.isfinite(lon)
+        & (lat >= limites["lat_min"]) & (lat <= limites["lat_max"])
+        & (lon >= limites["lon_min"]) & (lon <= limites["lon_max"])
+    )
+    celulas = np.floor(np.column_stack([lat[validas], lon[validas]]) / resolucao).astype(np.int64)
+    if len(celulas) == 0:
+        return pd.DataFrame(columns=["latitude", "longitude", "weight"])
+    unicas, contagens = np.unique(celulas, axis=0, return_counts=True)
+    centros = (unicas + 0.5) * resolucao
+    return pd.DataFrame({"latitude": centros[:, 0], "longitude": centros[:, 1], "weight": contagens})
+
+# ----------------------
+# Silver: DDL antiga, com os dtypes do pandas mapeados para INT/DOUBLE/DATETIME/TEXT
+# ----------------------
+
+def montar_create_table_texto(tabela, schema, chave):
+    """CREATE TABLE da Silver antiga: sem tipos compactos nem índices secundários, só a chave primária."""
+    df_tipos = schema.empty_table().to_pandas()
+    column_types = []
+    for column, dtype in zip(df_tipos.columns, df_tipos.dtypes):
+        if pd.api.types.is_integer_dtype(dtype):
+            sql_type = "INT"
+        elif pd.api.types.is_float_dtype(dtype):
+            sql_type = "DOUBLE"
+        elif pd.api.types.is_datetime64_any_dtype(dtype):
+            sql_type = "DATETIME"
+        else:
+            sql_type = "TEXT"
+        nullable = "NOT NULL" if column in chave else "NULL"
+        column_types.append(f"`{column}` {sql_type} {nullable}")
+    column_types.append(f"PRIMARY KEY ({', '.join(f'`{col}`' for col in chave)})")
+    return f"CREATE TABLE {tabela} ({', '.join(column_types)})"
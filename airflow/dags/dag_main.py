@@ -1,72 +1,201 @@
 from airflow import DAG
+from airflow.datasets import Dataset
+from airflow.exceptions import AirflowSkipException
 from airflow.operators.python import PythonOperator
 from datetime import datetime
+import importlib
+import json
+import os
+import re
 import subprocess
+import sys
+import time
 import logging
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# ----------------------
-# Função para a camada Bronze
-# ----------------------
-def executar_script_bronze(**kwargs):
-    script_path = "/opt/airflow/dags/tasks/bronze.py"
+# Diretório dos módulos das camadas (eles importam uns aos outros pelo nome, ex.: esquema_bronze)
+TASKS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tasks")
+PYTHON_PATH = "/usr/local/bin/python"
 
-    try:
-        python_path = "/usr/local/bin/python"
-        result = subprocess.run(
-            [python_path, script_path],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        logger.info(result.stdout)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Erro ao executar o script Bronze: {e}")
-        logger.error(f"Saída de erro: {e.stderr}")
-        raise
+# Datasets de cada camada: a task que os produz só emite o evento quando termina com
+# sucesso (uma task pulada com AirflowSkipException não emite). Tanto a DAG encadeada
+# quanto as avulsas declaram os outlets, para que consumidores externos (agendados
+# pelos Datasets) saibam de qualquer atualização; o encadeamento das camadas em si é
+# feito só pela DAG acidentes_pipeline, e as DAGs avulsas são disparadas manualmente.
+BRONZE_DATASET = Dataset("s3://bronze/acidentes")
+SILVER_DATASET = Dataset("s3://silver/acidentes")
+GOLD_DATASET = Dataset("file:///opt/airflow/data/analise_acidentes.pdf")
+
+# Diretório dos arquivos de métricas (JSON lines) gravados pela instrumentação das camadas
+METRICAS_DIR = "/opt/airflow/logs/metricas"
+
+# Linha impressa pelo subprocesso quando o módulo terminou de ser importado
+MARCADOR_INICIALIZACAO = "__camada_importada__"
+
+# Prefixo da linha com o retorno de main (JSON) impressa pelo subprocesso ao terminar
+MARCADOR_RESULTADO = "__camada_resultado__ "
+
+_CODIGO_SUBPROCESSO = (
+    "import importlib, json, sys; sys.path.insert(0, sys.argv[1]); "
+    "modulo = importlib.import_module(sys.argv[2]); "
+    f"print({MARCADOR_INICIALIZACAO!r}, flush=True); "
+    "resultado = modulo.main(**json.loads(sys.argv[3])); "
+    f"print({MARCADOR_RESULTADO!r} + json.dumps(resultado, default=str), flush=True)"
+)
+
+def _importar(nome_modulo):
+    if TASKS_DIR not in sys.path:
+        sys.path.insert(0, TASKS_DIR)
+    return importlib.import_module(nome_modulo)
+
+def _executar_no_processo(nome_modulo, parametros):
+    """Importar o módulo no próprio worker e chamar main; os logs vão direto para o log da task."""
+    inicio = time.perf_counter()
+    modulo = _importar(nome_modulo)
+    inicializacao_s = time.perf_counter() - inicio
+    resultado = modulo.main(**parametros)
+    return inicializacao_s, resultado
+
+def _executar_em_subprocesso(nome_modulo, parametros):
+    """
+    Rodar main em um interpretador novo, repassando a saída linha a linha enquanto ele
+    executa. O retorno de main chega como JSON na linha que começa com MARCADOR_RESULTADO
+    (valores que não são JSON, como datas, viram texto).
+    """
+    inicio = time.perf_counter()
+    inicializacao_s = None
+    resultado = None
+    processo = subprocess.Popen(
+        [PYTHON_PATH, "-u", "-c", _CODIGO_SUBPROCESSO, TASKS_DIR, nome_modulo, json.dumps(parametros)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        bufsize=1
+    )
+    for linha in processo.stdout:
+        linha = linha.rstrip("\n")
+        if linha == MARCADOR_INICIALIZACAO:
+            inicializacao_s = time.perf_counter() - inicio
+            continue
+        if linha.startswith(MARCADOR_RESULTADO):
+            resultado = json.loads(linha[len(MARCADOR_RESULTADO):])
+            continue
+        logger.info(linha)
+    codigo_saida = processo.wait()
+    if codigo_saida != 0:
+        raise subprocess.CalledProcessError(codigo_saida, processo.args)
+    return inicializacao_s, resultado
+
+def _caminho_metricas(nome_modulo, kwargs):
+    """Um arquivo de métricas por execução de task (inclui o índice das tasks mapeadas)."""
+    ti = kwargs.get("ti")
+    if ti is None:
+        return os.path.join(METRICAS_DIR, f"{nome_modulo}.jsonl")
+    partes = [ti.dag_id, ti.run_id, ti.task_id] + ([str(ti.map_index)] if ti.map_index >= 0 else [])
+    return os.path.join(METRICAS_DIR, re.sub(r"[^A-Za-z0-9_.-]+", "_", "__".join(partes)) + ".jsonl")
 
 # ----------------------
-# Função para a camada Silver
+# Execução de uma camada (Bronze, Silver ou Gold)
 # ----------------------
-def executar_script_silver(**kwargs):
-    script_path = "/opt/airflow/dags/tasks/silver.py"
-
+def executar_camada(nome_modulo, parametros=None, **kwargs):
+    """
+    Executa main(**parametros) do módulo da camada (por padrão, os params da DAG).
+    O param modo_execucao da DAG escolhe o modo:
+    "processo" (padrão) importa o módulo no worker, sem pagar a inicialização de um
+    interpretador novo, e reaproveita os imports já feitos; "subprocesso" isola a
+    execução em um interpretador novo. O tempo de inicialização (interpretador +
+    imports) e o total são registrados no log e retornados para o XCom, junto com o
+    retorno de main (nos dois modos) e o resumo das métricas da camada
+    (ver tasks/instrumentacao.py).
+    """
+    params = dict(kwargs.get("params") or {})
+    modo = params.pop("modo_execucao", "processo")
+    if parametros is None:
+        parametros = params
+    # A variável de ambiente também vale para o subprocesso
+    caminho_metricas = _caminho_metricas(nome_modulo, kwargs)
+    os.environ["PIPELINE_METRICAS"] = caminho_metricas
+    inicio = time.perf_counter()
     try:
-        python_path = "/usr/local/bin/python"
-        result = subprocess.run(
-            [python_path, script_path],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        logger.info(result.stdout)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Erro ao executar o script Silver: {e}")
-        logger.error(f"Saída de erro: {e.stderr}")
+        if modo == "processo":
+            inicializacao_s, resultado = _executar_no_processo(nome_modulo, parametros)
+        elif modo == "subprocesso":
+            inicializacao_s, resultado = _executar_em_subprocesso(nome_modulo, parametros)
+        else:
+            raise ValueError(f"Modo de execução desconhecido: {modo}")
+    except Exception as e:
+        logger.error(f"Erro ao executar a camada {nome_modulo}: {e}")
         raise
+    total_s = time.perf_counter() - inicio
+    logger.info(f"Camada {nome_modulo} executada ({modo}): inicialização {inicializacao_s or 0:.2f}s, total {total_s:.2f}s.")
+    return {
+        "modo": modo,
+        "inicializacao_s": inicializacao_s,
+        "total_s": total_s,
+        "resultado": resultado,
+        "metricas": _importar("instrumentacao").ler_resumo(caminho_metricas, nome_modulo),
+    }
+
+def executar_bronze(**kwargs):
+    """Bronze avulsa; pulada (sem evento no BRONZE_DATASET) quando nenhum objeto foi escrito."""
+    execucao = executar_camada("bronze", **kwargs)
+    if execucao["resultado"] is not None and not execucao["resultado"]["gravado"]:
+        raise AirflowSkipException("Nenhum arquivo da Bronze mudou; a Silver não precisa rodar.")
+    return execucao
+
+def executar_silver(**kwargs):
+    """Silver avulsa; pulada (sem evento no SILVER_DATASET) quando nenhuma origem da Bronze mudou."""
+    execucao = executar_camada("silver", **kwargs)
+    if execucao["resultado"] is not None and not execucao["resultado"]["origens"]:
+        raise AirflowSkipException("Nenhum arquivo da Bronze mudou desde a última carga; a Gold não precisa rodar.")
+    return execucao
 
 # ----------------------
-# Função para a camada Gold
+# Tasks da DAG encadeada Bronze -> Silver -> Gold
 # ----------------------
-def executar_script_gold(**kwargs):
-    script_path = "/opt/airflow/dags/tasks/gold.py"
+def listar_arquivos_bronze(**kwargs):
+    """
+    Um conjunto de parâmetros da Bronze por ano pendente (task mapping): os
+    acidentes_AAAA.csv[.zip|.gz] cujo tamanho/mtime difere do manifesto da ingestão
+    não são mapeados. Sem anos pendentes a lista é vazia e a task mapeada é pulada.
+    """
+    diretorio = kwargs["params"]["diretorio_entrada"]
+    pendentes, encontrados = _importar("ingestao_bronze").arquivos_pendentes(diretorio)
+    if not encontrados:
+        raise AirflowSkipException(f"Nenhum arquivo acidentes_AAAA.csv[.zip|.gz] encontrado em {diretorio}.")
+    logger.info(f"{len(pendentes)} de {encontrados} arquivo(s) pendente(s) para a Bronze: {[a['caminho'] for a in pendentes]}")
+    return [
+        {"parametros": {"particionado": True, "diretorio_entrada": diretorio, "anos": [arquivo["ano"]]}}
+        for arquivo in pendentes
+    ]
 
-    try:
-        python_path = "/usr/local/bin/python"
-        result = subprocess.run(
-            [python_path, script_path],
-            check=True,
-            capture_output=True,
-            text=True
-        )
-        logger.info(result.stdout)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Erro ao executar o script Gold: {e}")
-        logger.error(f"Saída de erro: {e.stderr}")
-        raise
+def executar_bronze_mapeada(parametros, **kwargs):
+    """Converte um ano pela ingestão com manifesto (hash confere antes de reescrever)."""
+    execucao = executar_camada("bronze", parametros=parametros, **kwargs)
+    if execucao["resultado"] is not None and not execucao["resultado"]["gravado"]:
+        raise AirflowSkipException(f"Anos {parametros['anos']} com o mesmo conteúdo já convertido; nada gravado.")
+    return execucao
+
+def executar_silver_encadeada(**kwargs):
+    params = kwargs["params"]
+    execucao = executar_camada("silver", parametros={
+        "particionado": True,
+        "backend_carga": params["backend_carga"],
+        "pipeline": params["pipeline_silver"],
+    }, **kwargs)
+    if execucao["resultado"] is not None and not execucao["resultado"]["origens"]:
+        # Gold pulada pela dependência: nada mudou desde a última carga
+        raise AirflowSkipException("Nenhuma partição da Bronze mudou; a Silver e a Gold não precisam rodar.")
+    return execucao
+
+def executar_gold_encadeada(**kwargs):
+    return executar_camada("gold", parametros={
+        "backend": kwargs["params"]["backend_gold"],
+        "partitioned": kwargs["params"]["backend_gold"] == "duckdb",
+    }, **kwargs)
 
 # ----------------------
 # Definição da DAG para Bronze
@@ -84,11 +213,13 @@ with DAG(
     schedule_interval=None,
     start_date=datetime(2024, 1, 1),
     catchup=False,
+    params={"modo_execucao": "processo", "particionado": False, "diretorio_entrada": None},
 ) as bronze_dag:
 
     executar_bronze_task = PythonOperator(
         task_id="executar_bronze_script",
-        python_callable=executar_script_bronze,
+        python_callable=executar_bronze,
+        outlets=[BRONZE_DATASET],
     )
 
 # ----------------------
@@ -107,11 +238,19 @@ with DAG(
     schedule_interval=None,
     start_date=datetime(2024, 1, 1),
     catchup=False,
+    params={
+        "modo_execucao": "processo",
+        "particionado": False,
+        "incremental": True,
+        "backend_carga": "multirow",
+        "pipeline": False,
+    },
 ) as silver_dag:
 
     executar_silver_task = PythonOperator(
         task_id="executar_silver_script",
-        python_callable=executar_script_silver,
+        python_callable=executar_silver,
+        outlets=[SILVER_DATASET],
     )
 
 # ----------------------
@@ -130,9 +269,73 @@ with DAG(
     schedule_interval=None,
     start_date=datetime(2024, 1, 1),
     catchup=False,
+    params={"modo_execucao": "processo", "backend": "summary"},
 ) as gold_dag:
 
     executar_gold_task = PythonOperator(
         task_id="executar_gold_script",
-        python_callable=executar_script_gold,
+        python_callable=executar_camada,
+        op_kwargs={"nome_modulo": "gold"},
+        outlets=[GOLD_DATASET],
+    )
+
+# ----------------------
+# DAG encadeada: Bronze (um task por arquivo/ano) -> Silver -> Gold
+#
+# O encadeamento é feito pelas dependências entre as tasks; cada camada emite o seu
+# Dataset só quando gravou algo (anos, Silver e Gold sem mudança são pulados).
+# ----------------------
+with DAG(
+    dag_id="acidentes_pipeline",
+    default_args={
+        "owner": "airflow",
+        "depends_on_past": False,
+        "email_on_failure": False,
+        "email_on_retry": False,
+        "retries": 1,
+    },
+    description="DAG encadeada das camadas Bronze, Silver e Gold",
+    schedule_interval=None,
+    start_date=datetime(2024, 1, 1),
+    catchup=False,
+    max_active_runs=1,
+    params={
+        "modo_execucao": "processo",
+        "diretorio_entrada": "/opt/airflow/data",
+        "backend_carga": "multirow",
+        "pipeline_silver": False,
+        "backend_gold": "summary",
+    },
+) as pipeline_dag:
+
+    listar_arquivos_task = PythonOperator(
+        task_id="listar_arquivos_bronze",
+        python_callable=listar_arquivos_bronze,
     )
+
+    # Cada ano só substitui os próprios arquivos acidentes_AAAA-N.parquet, em qualquer
+    # partição (ver particionamento.escrever_particionado), então os anos podem ser
+    # processados em paralelo sem apagar os dados uns dos outros
+    bronze_tasks = PythonOperator.partial(
+        task_id="executar_bronze",
+        python_callable=executar_bronze_mapeada,
+        max_active_tis_per_dagrun=4,
+        outlets=[BRONZE_DATASET],
+    ).expand(op_kwargs=listar_arquivos_task.output)
+
+    # A Silver roda mesmo com anos pulados na Bronze (nenhum pendente ou conteúdo igual)
+    # e confere o próprio manifesto; só uma falha na Bronze a impede
+    silver_pipeline_task = PythonOperator(
+        task_id="executar_silver",
+        python_callable=executar_silver_encadeada,
+        trigger_rule="none_failed",
+        outlets=[SILVER_DATASET],
+    )
+
+    gold_pipeline_task = PythonOperator(
+        task_id="executar_gold",
+        python_callable=executar_gold_encadeada,
+        outlets=[GOLD_DATASET],
+    )
+
+    bronze_tasks >> silver_pipeline_task >> gold_pipeline_task
@@ -0,0 +1,180 @@
+import logging
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SOURCE_TABLE = "acidentes_silver"
+
+# Tabelas de resumo mantidas a cada carga da Silver. Todas são agregadas por dia,
+# o que permite atualizá-las só para as datas que a carga tocou. {source} é a tabela
+# de origem (SOURCE_TABLE, ou outra com as mesmas colunas nos benchmarks).
+SUMMARY_TABLES = {
+    "gold_resumo_uf_dia": {
+        "ddl": """
+        CREATE TABLE IF NOT EXISTS gold_resumo_uf_dia (
+            data_inversa DATE NULL,
+            uf VARCHAR(64) NULL,
+            acidentes INT NOT NULL,
+            mortos INT NOT NULL,
+            KEY idx_data (data_inversa)
+        );
+        """,
+        "select": """
+        SELECT data_inversa, uf, COUNT(*), COALESCE(SUM(mortos), 0)
+        FROM {source} WHERE {where} GROUP BY data_inversa, uf
+        """,
+        "columns": ["data_inversa", "uf", "acidentes", "mortos"],
+    },
+    "gold_resumo_causa_dia": {
+        "ddl": """
+        CREATE TABLE IF NOT EXISTS gold_resumo_causa_dia (
+            data_inversa DATE NULL,
+            causa_principal VARCHAR(255) NULL,
+            acidentes INT NOT NULL,
+            KEY idx_data (data_inversa)
+        );
+        """,
+        "select": """
+        SELECT data_inversa, causa_principal, COUNT(*)
+        FROM {source} WHERE {where} GROUP BY data_inversa, causa_principal
+        """,
+        "columns": ["data_inversa", "causa_principal", "acidentes"],
+    },
+    "gold_resumo_condicao_dia": {
+        "ddl": """
+        CREATE TABLE IF NOT EXISTS gold_resumo_condicao_dia (
+            data_inversa DATE NULL,
+            condicao_metereologica VARCHAR(255) NULL,
+            acidentes INT NOT NULL,
+            KEY idx_data (data_inversa)
+        );
+        """,
+        "select": """
+        SELECT data_inversa, condicao_metereologica, COUNT(*)
+        FROM {source} WHERE {where} GROUP BY data_inversa, condicao_metereologica
+        """,
+        "columns": ["data_inversa", "condicao_metereologica", "acidentes"],
+    },
+}
+
+# Colunas da Silver necessárias para manter os resumos
+REQUIRED_COLUMNS = {"id", "uf", "data_inversa", "mortos", "causa_principal", "condicao_metereologica"}
+
+# Quantidade de datas por comando DELETE/INSERT na atualização incremental
+DATES_PER_BATCH = 500
+
+# Quantidade de ids por consulta das datas já gravadas
+IDS_PER_BATCH = 5000
+
+def create_summary_tables(cursor):
+    """Criar as tabelas de resumo, se ainda não existirem."""
+    for definition in SUMMARY_TABLES.values():
+        cursor.execute(definition["ddl"])
+
+def _refresh(cursor, where, params, source):
+    for table, definition in SUMMARY_TABLES.items():
+        cursor.execute(f"DELETE FROM {table} WHERE {where}", params)
+        columns = ", ".join(definition["columns"])
+        cursor.execute(
+            f"INSERT INTO {table} ({columns}) " + definition["select"].format(source=source, where=where),
+            params
+        )
+
+def stored_dates(cursor, ids, source=SOURCE_TABLE):
+    """
+    Datas gravadas hoje em source para os ids informados, e se algum deles está sem data.
+    Um upsert que muda a data de um id também altera o resumo do dia antigo, então essas
+    datas precisam ser recalculadas junto com as da carga.
+    """
+    ids = list(ids)
+    dates = set()
+    has_null_date = False
+    for start in range(0, len(ids), IDS_PER_BATCH):
+        batch = ids[start:start + IDS_PER_BATCH]
+        placeholders = ",".join(["%s"] * len(batch))
+        cursor.execute(f"SELECT DISTINCT data_inversa FROM {source} WHERE id IN ({placeholders})", tuple(batch))
+        for (date,) in cursor.fetchall():
+            if date is None:
+                has_null_date = True
+            else:
+                dates.add(date)
+    return dates, has_null_date
+
+def refresh_summaries(cursor, dates=None, include_null_date=False, source=SOURCE_TABLE):
+    """
+    Atualizar as tabelas de resumo a partir da acidentes_silver (ou de source).
+
+    Com dates, apenas os dias informados são recalculados (e os registros sem data, se
+    include_null_date=True); sem dates, os resumos são reconstruídos por completo.
+    """
+    create_summary_tables(cursor)
+
+    if dates is None:
+        logger.info("Reconstruindo todas as tabelas de resumo da camada Gold...")
+        for table in SUMMARY_TABLES:
+            cursor.execute(f"DELETE FROM {table}")
+        _refresh(cursor, "1 = 1", (), source)
+        return
+
+    dates = sorted(dates)
+    logger.info(f"Atualizando tabelas de resumo para {len(dates)} data(s)...")
+    for start in range(0, len(dates), DATES_PER_BATCH):
+        batch = dates[start:start + DATES_PER_BATCH]
+        placeholders = ",".join(["%s"] * len(batch))
+        _refresh(cursor, f"data_inversa IN ({placeholders})", tuple(batch), source)
+    if include_null_date:
+        _refresh(cursor, "data_inversa IS NULL", (), source)
+
+def ensure_summaries(conn):
+    """Criar e popular os resumos se a Silver já tem dados carregados antes deles existirem."""
+    with conn.cursor() as cursor:
+        create_summary_tables(cursor)
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM gold_resumo_uf_dia)")
+        has_summaries = cursor.fetchone()[0]
+        cursor.execute(f"SELECT EXISTS(SELECT 1 FROM {SOURCE_TABLE})")
+        has_source = cursor.fetchone()[0]
+        if has_source and not has_summaries:
+            refresh_summaries(cursor)
+    conn.commit()
+
+def query_summaries(conn):
+    """Calcular as métricas da camada Gold a partir das tabelas de resumo."""
+    logger.info("Consultando as tabelas de resumo da camada Gold...")
+
+    obitos_por_estado = pd.read_sql(
+        "SELECT uf, SUM(mortos) AS mortos, SUM(acidentes) AS total_acidentes "
+        "FROM gold_resumo_uf_dia WHERE uf IS NOT NULL GROUP BY uf ORDER BY uf",
+        conn,
+        index_col="uf"
+    ).astype("int64")
+
+    dias = pd.read_sql(
+        "SELECT CASE WHEN WEEKDAY(data_inversa) >= 5 THEN 'Fim de semana' ELSE 'Dia útil' END AS tipo_dia, "
+        "SUM(acidentes) AS acidentes FROM gold_resumo_uf_dia GROUP BY tipo_dia ORDER BY acidentes DESC",
+        conn
+    )
+    acidentes_dia_semana = dias.set_index("tipo_dia")["acidentes"].astype("int64").rename("count")
+    acidentes_dia_semana.index.name = "dia_semana"
+
+    condicoes = pd.read_sql(
+        "SELECT condicao_metereologica, SUM(acidentes) AS acidentes FROM gold_resumo_condicao_dia "
+        "WHERE condicao_metereologica IN ('Normal', 'Chuva') GROUP BY condicao_metereologica",
+        conn
+    ).set_index("condicao_metereologica")["acidentes"]
+
+    causas = pd.read_sql(
+        "SELECT causa_principal, SUM(acidentes) AS acidentes FROM gold_resumo_causa_dia "
+        "WHERE causa_principal IS NOT NULL GROUP BY causa_principal ORDER BY acidentes DESC LIMIT 5",
+        conn
+    )
+    principais_causas = causas.set_index("causa_principal")["acidentes"].astype("int64").rename("count")
+
+    return {
+        "media_acidentes_estado": obitos_por_estado["total_acidentes"].mean(),
+        "acidentes_dia_semana": acidentes_dia_semana,
+        "obitos_por_estado": obitos_por_estado,
+        "condicoes_normais": int(condicoes.get("Normal", 0)),
+        "condicoes_chuvosas": int(condicoes.get("Chuva", 0)),
+        "principais_causas": principais_causas
+    }
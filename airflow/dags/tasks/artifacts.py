@@ -0,0 +1,127 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "/opt/airflow/data/cache/gold"
+MANIFEST_NAME = "manifest.json"
+
+def _update(digest, value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        digest.update(value.to_csv().encode("utf-8"))
+    elif isinstance(value, dict):
+        for key in sorted(value, key=str):
+            digest.update(str(key).encode("utf-8"))
+            _update(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            _update(digest, item)
+    elif isinstance(value, bytes):
+        digest.update(value)
+    else:
+        digest.update(json.dumps(value, default=str).encode("utf-8"))
+    digest.update(b"\0")
+
+def fingerprint(*values):
+    """Hash estável do conteúdo de entrada de um artefato (DataFrames, Series, dicts, escalares)."""
+    digest = hashlib.sha256()
+    for value in values:
+        _update(digest, value)
+    return digest.hexdigest()
+
+def artifact_key(render, data):
+    """Chave do artefato: os dados de entrada e o código da função que o renderiza."""
+    code = render.__code__
+    return fingerprint(render.__module__, render.__qualname__, code.co_code, repr(code.co_consts), data)
+
+def load_manifest(cache_dir=CACHE_DIR):
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as manifest_file:
+        return json.load(manifest_file)
+
+def save_manifest(manifest, cache_dir=CACHE_DIR):
+    """Gravar o manifesto de forma atômica (arquivo temporário + rename)."""
+    path = os.path.join(cache_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _render_to_cache(render, data, cache_path):
+    """Renderizar em um arquivo temporário (mesma extensão) e movê-lo para o cache."""
+    start = time.monotonic()
+    base, extension = os.path.splitext(cache_path)
+    tmp_path = f"{base}.tmp-{os.getpid()}{extension}"
+    try:
+        render(data, tmp_path)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return time.monotonic() - start
+
+def _prune(cache_dir, manifest):
+    """Remover do cache os arquivos que não são mais referenciados pelo manifesto."""
+    referenced = {os.path.basename(entry["cache_path"]) for entry in manifest.values()}
+    for name in os.listdir(cache_dir):
+        if name != MANIFEST_NAME and name not in referenced:
+            os.remove(os.path.join(cache_dir, name))
+
+def render_artifacts(jobs, cache_dir=CACHE_DIR, max_workers=None):
+    """
+    Renderizar artefatos reaproveitando o cache.
+
+    jobs mapeia nome -> (render, dados, caminho_saida), onde render(dados, caminho) é
+    uma função de módulo (serializável). Cada artefato é identificado pelo hash dos
+    dados e do código de render; se o hash já está no cache, o arquivo é só copiado.
+    Os que faltam são renderizados em paralelo em um pool de processos.
+
+    Retorna nome -> entrada do manifesto (hash, caminhos, tempo de render).
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    manifest = load_manifest(cache_dir)
+    entries, pending = {}, {}
+    for name, (render, data, output_path) in jobs.items():
+        key = artifact_key(render, data)
+        cache_path = os.path.join(cache_dir, key + os.path.splitext(output_path)[1])
+        entries[name] = {"hash": key, "cache_path": cache_path, "output_path": output_path, "render_s": None}
+        if os.path.exists(cache_path):
+            logger.info(f"Artefato '{name}' reaproveitado do cache ({key[:12]}).")
+            entries[name]["rendered_at"] = manifest.get(name, {}).get("rendered_at")
+        else:
+            pending[name] = (render, data, cache_path)
+
+    if len(pending) == 1:
+        name, args = next(iter(pending.items()))
+        entries[name]["render_s"] = _render_to_cache(*args)
+    elif pending:
+        workers = min(len(pending), max_workers or os.cpu_count() or 1)
+        logger.info(f"Renderizando {len(pending)} artefato(s) em {workers} processo(s)...")
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {name: executor.submit(_render_to_cache, *args) for name, args in pending.items()}
+            for name, future in futures.items():
+                entries[name]["render_s"] = future.result()
+
+    now = datetime.now(timezone.utc).isoformat()
+    for name, entry in entries.items():
+        if name in pending:
+            entry["rendered_at"] = now
+            logger.info(f"Artefato '{name}' renderizado em {entry['render_s']:.2f}s.")
+        os.makedirs(os.path.dirname(entry["output_path"]), exist_ok=True)
+        shutil.copyfile(entry["cache_path"], entry["output_path"])
+        entry["bytes"] = os.path.getsize(entry["output_path"])
+        manifest[name] = entry
+
+    save_manifest(manifest, cache_dir)
+    _prune(cache_dir, manifest)
+    return entries
@@ -1,126 +1,185 @@
-import pandas as pd
-import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
 import os
 import logging
 import traceback
 import sys
 
+from esquema_bronze import ler_csv_em_lotes
+from ingestao_bronze import ingerir_arquivos
+from instrumentacao import contar, etapa, sessao
+from particionamento import criar_filesystem_s3, escrever_particionado
+from upload_minio import CONCORRENCIA_PADRAO, TAMANHO_PARTE_PADRAO, criar_cliente_s3, enviar_arquivo_multipart
+
 # Configuração dos logs
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
     handlers=[
         logging.StreamHandler(sys.stdout),  # Logs no console
-        logging.FileHandler('/opt/airflow/logs/bronze_script.log')  # Logs em arquivo
+        logging.FileHandler(os.environ.get('BRONZE_LOG_PATH', '/opt/airflow/logs/bronze_script.log'))  # Logs em arquivo
     ]
 )
 logger = logging.getLogger(__name__)
 
-def carregar_e_salvar_em_chunks(caminho_arquivo_csv, caminho_arquivo_parquet, chunksize=50000):
+def carregar_e_salvar_em_chunks(caminho_arquivo_csv, caminho_arquivo_parquet, tamanho_bloco=16 * 1024 * 1024, streaming=True):
     """
     Função para processar um arquivo CSV em chunks, normalizar dados e salvá-lo como Parquet.
-    """
-    try:
-        logger.info(f"Iniciando conversão do CSV para Parquet em chunks de {chunksize} linhas.")
-
-        chunks = []
-        for chunk in pd.read_csv(caminho_arquivo_csv, sep=';', encoding='latin1', chunksize=chunksize):
-            logger.info(f"Lendo chunk com dimensões: {chunk.shape}")
-
-            # Normalização e conversão de tipos
-            if 'latitude' in chunk.columns and 'longitude' in chunk.columns:
-                chunk['latitude'] = chunk['latitude'].astype(str).str.replace(',', '.').astype(float)
-                chunk['longitude'] = chunk['longitude'].astype(str).str.replace(',', '.').astype(float)
-                logger.info("Normalização das colunas latitude e longitude concluída neste chunk.")
 
-            if 'feridos_leves' in chunk.columns:
-                chunk['feridos_leves'] = chunk['feridos_leves'].fillna(0).astype(int)
+    Os tipos de cada coluna vêm do schema declarado em esquema_bronze: números com vírgula
+    decimal são convertidos na leitura, datas e horários são gravados como date32/time64 e
+    textos de baixa cardinalidade como categorias.
 
-            if 'feridos_graves' in chunk.columns:
-                chunk['feridos_graves'] = chunk['feridos_graves'].fillna(0).astype(int)
+    No modo streaming cada lote normalizado é gravado diretamente como um row group
+    do arquivo Parquet, então o pico de memória depende do tamanho do bloco e não do
+    tamanho do arquivo. Com streaming=False os lotes são acumulados e concatenados
+    antes da gravação (comportamento antigo).
+    """
+    try:
+        logger.info(f"Iniciando conversão do CSV para Parquet em blocos de {tamanho_bloco} bytes.")
 
-            if 'mortos' in chunk.columns:
-                chunk['mortos'] = chunk['mortos'].fillna(0).astype(int)
+        schema, lotes = ler_csv_em_lotes(caminho_arquivo_csv, tamanho_bloco)
 
-            if 'data_inversa' in chunk.columns:
-                chunk['data_inversa'] = pd.to_datetime(chunk['data_inversa'], format='%Y-%m-%d', errors='coerce').dt.date
+        if not streaming:
+            tabela = pa.Table.from_batches(list(lotes), schema=schema)
+            logger.info(f"Tabela final concatenada. Dimensões: {tabela.shape}")
 
-            if 'horario' in chunk.columns:
-                chunk['horario'] = pd.to_datetime(chunk['horario'], format='%H:%M:%S', errors='coerce').dt.time
+            logger.info(f"Salvando a tabela no formato Parquet: {caminho_arquivo_parquet}")
+            pq.write_table(tabela, caminho_arquivo_parquet)
+            logger.info("Conversão concluída com sucesso.")
+            return
 
-            chunks.append(chunk)
+        total_linhas = 0
+        logger.info(f"Gravando Parquet em streaming em: {caminho_arquivo_parquet}")
+        with etapa('csv_parquet', arquivo=caminho_arquivo_csv) as registro, \
+                pq.ParquetWriter(caminho_arquivo_parquet, schema) as writer:
+            for lote in lotes:
+                logger.info(f"Lendo lote com dimensões: ({lote.num_rows}, {lote.num_columns})")
+                writer.write_batch(lote, row_group_size=lote.num_rows)
+                total_linhas += lote.num_rows
+            registro['linhas'] = total_linhas
+        contar('linhas', total_linhas)
+        contar('bytes_lidos', os.path.getsize(caminho_arquivo_csv))
+        contar('bytes_gravados', os.path.getsize(caminho_arquivo_parquet))
 
-        # Concatenar todos os chunks
-        df = pd.concat(chunks, ignore_index=True)
-        logger.info(f"DataFrame final concatenado. Dimensões: {df.shape}")
+        if total_linhas == 0:
+            raise ValueError(f"Nenhuma linha encontrada no arquivo CSV: {caminho_arquivo_csv}")
 
-        # Salvar o DataFrame como arquivo Parquet
-        logger.info(f"Salvando o DataFrame no formato Parquet: {caminho_arquivo_parquet}")
-        df.to_parquet(caminho_arquivo_parquet, index=False)
-        logger.info("Conversão concluída com sucesso.")
+        logger.info(f"Conversão concluída com sucesso. Total de linhas gravadas: {total_linhas}")
 
     except Exception as e:
         logger.error(f"Erro ao converter o CSV para Parquet: {e}")
         logger.error(traceback.format_exc())
         raise
 
-def enviar_para_minio(caminho_arquivo_parquet, bucket_name, endpoint_url, access_key, secret_key):
+def enviar_para_minio(caminho_arquivo_parquet, bucket_name, endpoint_url, access_key, secret_key,
+                      object_key="data.parquet", tamanho_parte=TAMANHO_PARTE_PADRAO, concorrencia=CONCORRENCIA_PADRAO):
     """
     Função para enviar o arquivo Parquet ao MinIO.
+
+    O envio é feito em multipart com partes paralelas e checksum por parte, e é
+    ignorado quando o objeto remoto já tem o mesmo conteúdo.
     """
     try:
         logger.info(f"Iniciando envio do arquivo Parquet para o bucket {bucket_name} no MinIO.")
 
         # Configurar cliente MinIO
-        minio_client = boto3.client(
-            's3',
-            endpoint_url=endpoint_url,
-            aws_access_key_id=access_key,
-            aws_secret_access_key=secret_key
-        )
+        minio_client = criar_cliente_s3(endpoint_url, access_key, secret_key, max_conexoes=concorrencia)
 
         # Verificar se o arquivo Parquet existe
         if not os.path.exists(caminho_arquivo_parquet):
             raise FileNotFoundError(f"Arquivo Parquet não encontrado: {caminho_arquivo_parquet}")
 
-        # Preparar o arquivo para upload
-        with open(caminho_arquivo_parquet, 'rb') as parquet_file:
-            minio_client.put_object(
-                Bucket=bucket_name,
-                Key="data.parquet",
-                Body=parquet_file
+        with etapa('upload_minio', objeto=f"{bucket_name}/{object_key}"):
+            resultado = enviar_arquivo_multipart(
+                minio_client,
+                caminho_arquivo_parquet,
+                bucket_name,
+                object_key,
+                tamanho_parte=tamanho_parte,
+                concorrencia=concorrencia
             )
         logger.info("Arquivo Parquet enviado para o MinIO com sucesso.")
+        return resultado
 
     except Exception as e:
         logger.error(f"Erro ao enviar o arquivo Parquet para o MinIO: {e}")
         logger.error(traceback.format_exc())
         raise
 
-def main():
-    try:
-        # Caminhos dos arquivos
-        caminho_arquivo_csv = '/opt/airflow/data/acidentes_2024.csv'
-        caminho_arquivo_parquet = '/opt/airflow/data/acidentes_2024.parquet'
-
-        # Configurações do MinIO
-        bucket_name = "bronze"
-        endpoint_url = "http://minio:9000"
-        access_key = "minioadmin"
-        secret_key = "minio@1234!"
+def salvar_particionado_no_minio(caminho_arquivo_csv, bucket_name, endpoint_url, access_key, secret_key,
+                                 prefixo="acidentes", tamanho_bloco=16 * 1024 * 1024):
+    """
+    Função para converter o CSV diretamente no layout particionado ano/mes/uf do MinIO.
 
-        # Processar o arquivo CSV e salvá-lo como Parquet
-        carregar_e_salvar_em_chunks(caminho_arquivo_csv, caminho_arquivo_parquet)
+    Só os arquivos gravados antes a partir do mesmo CSV são substituídos, então carregar
+    um novo acidentes_AAAA.csv não reprocessa nem apaga os anos que já estão no bucket.
+    """
+    try:
+        logger.info(f"Iniciando conversão particionada de {caminho_arquivo_csv} para {bucket_name}/{prefixo}.")
 
-        # Enviar o arquivo Parquet para o MinIO
-        enviar_para_minio(caminho_arquivo_parquet, bucket_name, endpoint_url, access_key, secret_key)
+        filesystem = criar_filesystem_s3(endpoint_url, access_key, secret_key)
+        schema, lotes = ler_csv_em_lotes(caminho_arquivo_csv, tamanho_bloco)
+        nome_arquivo = os.path.splitext(os.path.basename(caminho_arquivo_csv))[0]
+        with etapa('csv_particionado', arquivo=caminho_arquivo_csv):
+            escrever_particionado(lotes, schema, f"{bucket_name}/{prefixo}", filesystem, prefixo_arquivo=nome_arquivo)
+        contar('bytes_lidos', os.path.getsize(caminho_arquivo_csv))
 
-        logger.info("Processo da camada Bronze concluído com sucesso!")
+        logger.info("Conversão particionada concluída com sucesso.")
 
     except Exception as e:
-        logger.error(f"Erro na execução principal: {e}")
+        logger.error(f"Erro ao gravar o dataset particionado no MinIO: {e}")
         logger.error(traceback.format_exc())
-        sys.exit(1)
+        raise
+
+def main(particionado=False, caminho_arquivo_csv='/opt/airflow/data/acidentes_2024.csv', diretorio_entrada=None, anos=None):
+    """
+    Sem diretorio_entrada, converte um único CSV. Com diretorio_entrada (diretório local
+    ou s3://bucket/prefixo), converte em paralelo todos os acidentes_AAAA.csv[.zip|.gz]
+    encontrados (ou só os de anos), um destino por ano, pulando os anos que não mudaram.
+
+    Retorna {'gravado': se algum objeto do MinIO foi escrito, 'anos': resultado por ano
+    (só com diretorio_entrada)}; a DAG usa 'gravado' para só emitir o evento do
+    Dataset da Bronze quando algo mudou.
+    """
+    with sessao('bronze'):
+        try:
+            # Caminhos dos arquivos
+            caminho_arquivo_parquet = os.path.splitext(caminho_arquivo_csv)[0] + '.parquet'
+
+            # Configurações do MinIO
+            bucket_name = "bronze"
+            endpoint_url = "http://minio:9000"
+            access_key = "minioadmin"
+            secret_key = "minio@1234!"
+
+            resultado = {'gravado': True, 'anos': None}
+            if diretorio_entrada:
+                # Todos os anos da área de entrada, em paralelo
+                anos = ingerir_arquivos(diretorio_entrada, bucket_name, endpoint_url, access_key, secret_key,
+                                        particionado=particionado, anos=anos)
+                resultado = {
+                    'gravado': any(ano['status'] != 'inalterado' for ano in anos.values()),
+                    'anos': anos,
+                }
+            elif particionado:
+                # Gravar direto no layout particionado ano/mes/uf
+                salvar_particionado_no_minio(caminho_arquivo_csv, bucket_name, endpoint_url, access_key, secret_key)
+            else:
+                # Processar o arquivo CSV e salvá-lo como Parquet
+                carregar_e_salvar_em_chunks(caminho_arquivo_csv, caminho_arquivo_parquet)
+
+                # Enviar o arquivo Parquet para o MinIO
+                envio = enviar_para_minio(caminho_arquivo_parquet, bucket_name, endpoint_url, access_key, secret_key)
+                resultado['gravado'] = envio['enviado']
+
+            logger.info("Processo da camada Bronze concluído com sucesso!")
+            return resultado
+
+        except Exception as e:
+            logger.error(f"Erro na execução principal: {e}")
+            logger.error(traceback.format_exc())
+            raise
 
 if __name__ == "__main__":
     main()
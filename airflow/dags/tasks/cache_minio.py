@@ -0,0 +1,162 @@
+import contextlib
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+
+import pyarrow as pa
+from botocore.exceptions import ClientError
+
+from instrumentacao import contar
+
+logger = logging.getLogger(__name__)
+
+# Cache local dos objetos do MinIO, compartilhado pelas camadas no mesmo container
+CACHE_DIR = "/opt/airflow/data/cache/minio"
+TAMANHO_MAXIMO_PADRAO = 4 * 1024 * 1024 * 1024
+
+NOME_INDICE = "indice.json"
+NOME_TRAVA = "indice.lock"
+
+TAMANHO_LEITURA = 8 * 1024 * 1024
+
+def nome_no_cache(bucket, chave, etag):
+    """Nome do arquivo no cache: derivado de bucket/chave e do ETag (o conteúdo) do objeto."""
+    return hashlib.sha256(f"{bucket}/{chave}\0{etag}".encode("utf-8")).hexdigest() + os.path.splitext(chave)[1]
+
+class CacheObjetosS3:
+    """
+    Cache em disco, na frente do cliente S3, para objetos lidos repetidamente do MinIO
+    (por exemplo bronze/data.parquet a cada execução da Silver).
+
+    Cada objeto fica em um arquivo cujo nome vem de bucket/chave + ETag, então uma nova
+    versão do objeto nunca é confundida com a anterior. Um objeto já em cache é
+    revalidado com um GET condicional (If-None-Match): o MinIO responde 304 sem corpo
+    quando o ETag não mudou, e só uma versão nova é baixada. O tamanho total é limitado
+    e os objetos acessados há mais tempo são removidos primeiro (LRU).
+
+    O índice (objeto -> ETag, arquivo, tamanho, último acesso) é um JSON protegido por
+    uma trava de arquivo, para que tasks em processos diferentes compartilhem o cache.
+    """
+
+    def __init__(self, s3_client, diretorio=CACHE_DIR, tamanho_maximo=TAMANHO_MAXIMO_PADRAO):
+        self._s3_client = s3_client
+        self._diretorio = diretorio
+        self._tamanho_maximo = tamanho_maximo
+        self._estatisticas = {
+            'acertos': 0,
+            'falhas': 0,
+            'revalidacoes': 0,
+            'remocoes': 0,
+            'bytes_economizados': 0,
+            'bytes_baixados': 0,
+        }
+        os.makedirs(diretorio, exist_ok=True)
+
+    @contextlib.contextmanager
+    def _indice(self):
+        """Índice do cache com trava exclusiva; alterações no dicionário são gravadas ao sair."""
+        with open(os.path.join(self._diretorio, NOME_TRAVA), "w") as trava:
+            fcntl.flock(trava, fcntl.LOCK_EX)
+            try:
+                caminho = os.path.join(self._diretorio, NOME_INDICE)
+                indice = {}
+                if os.path.exists(caminho):
+                    with open(caminho, encoding="utf-8") as arquivo:
+                        indice = json.load(arquivo)
+                yield indice
+                caminho_temporario = f"{caminho}.tmp"
+                with open(caminho_temporario, "w", encoding="utf-8") as arquivo:
+                    json.dump(indice, arquivo, indent=2, sort_keys=True)
+                os.replace(caminho_temporario, caminho)
+            finally:
+                fcntl.flock(trava, fcntl.LOCK_UN)
+
+    def _contar(self, nome, valor=1):
+        self._estatisticas[nome] += valor
+        contar(f"cache_{nome}", valor)
+
+    def _baixar(self, resposta, caminho):
+        """Grava o corpo de um GET em um arquivo temporário e o move para o cache."""
+        caminho_temporario = f"{caminho}.tmp-{os.getpid()}"
+        try:
+            with open(caminho_temporario, "wb") as destino:
+                shutil.copyfileobj(resposta['Body'], destino, TAMANHO_LEITURA)
+            os.replace(caminho_temporario, caminho)
+        finally:
+            if os.path.exists(caminho_temporario):
+                os.remove(caminho_temporario)
+        return os.path.getsize(caminho)
+
+    def _remover_excedente(self, indice, manter):
+        """Remove os objetos menos usados recentemente até o total caber no limite."""
+        total = sum(entrada['tamanho'] for entrada in indice.values())
+        for objeto, entrada in sorted(indice.items(), key=lambda item: item[1]['ultimo_acesso']):
+            if total <= self._tamanho_maximo:
+                break
+            if objeto == manter:
+                continue
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(self._diretorio, entrada['arquivo']))
+            del indice[objeto]
+            total -= entrada['tamanho']
+            self._contar('remocoes')
+            logger.info(f"Objeto {objeto} removido do cache (LRU).")
+        if total > self._tamanho_maximo:
+            logger.warning(f"O objeto {manter} sozinho excede o limite do cache ({self._tamanho_maximo} bytes).")
+
+    def obter(self, bucket, chave):
+        """Caminho local de bucket/chave, atualizado com o MinIO."""
+        objeto = f"{bucket}/{chave}"
+        with self._indice() as indice:
+            entrada = indice.get(objeto)
+            if entrada and not os.path.exists(os.path.join(self._diretorio, entrada['arquivo'])):
+                entrada = None
+            parametros = {'Bucket': bucket, 'Key': chave}
+            if entrada:
+                parametros['IfNoneMatch'] = f'"{entrada["etag"]}"'
+            try:
+                resposta = self._s3_client.get_object(**parametros)
+            except ClientError as e:
+                if entrada is None or e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') != 304:
+                    raise
+                resposta = None
+
+            if resposta is None:
+                self._contar('acertos')
+                self._contar('bytes_economizados', entrada['tamanho'])
+                logger.info(f"Objeto {objeto} servido do cache (ETag {entrada['etag']} inalterado).")
+            else:
+                if entrada:
+                    # Versão antiga no cache: o objeto mudou no MinIO
+                    self._contar('revalidacoes')
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(self._diretorio, entrada['arquivo']))
+                self._contar('falhas')
+                etag = resposta['ETag'].strip('"')
+                arquivo = nome_no_cache(bucket, chave, etag)
+                tamanho = self._baixar(resposta, os.path.join(self._diretorio, arquivo))
+                self._contar('bytes_baixados', tamanho)
+                entrada = {'etag': etag, 'arquivo': arquivo, 'tamanho': tamanho}
+                logger.info(f"Objeto {objeto} baixado para o cache ({tamanho} bytes).")
+
+            entrada['ultimo_acesso'] = time.time()
+            indice[objeto] = entrada
+            self._remover_excedente(indice, objeto)
+        return os.path.join(self._diretorio, entrada['arquivo'])
+
+    def abrir(self, caminho):
+        """
+        Abre 'bucket/chave' do cache como arquivo mapeado em memória: o pyarrow lê o
+        Parquet direto das páginas do arquivo, sem cópia para buffers próprios.
+        """
+        bucket, chave = caminho.split('/', 1)
+        return pa.memory_map(self.obter(bucket, chave), 'r')
+
+    def estatisticas(self):
+        """Acertos, falhas, remoções e bytes baixados/economizados desde a criação do cache."""
+        consultas = self._estatisticas['acertos'] + self._estatisticas['falhas']
+        return dict(self._estatisticas, taxa_acerto=self._estatisticas['acertos'] / consultas if consultas else None)
@@ -0,0 +1,102 @@
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Registro dos arquivos da Bronze já carregados na Silver, com o hash do conteúdo
+TABELA_MANIFESTO = "silver_manifest"
+
+def criar_tabela_manifesto(cursor):
+    """Cria (se necessário) a tabela de manifesto das cargas incrementais."""
+    cursor.execute(f"""
+    CREATE TABLE IF NOT EXISTS {TABELA_MANIFESTO} (
+        origem VARCHAR(512) NOT NULL,
+        hash_conteudo VARCHAR(128) NOT NULL,
+        carregado_em DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+        PRIMARY KEY (origem)
+    );
+    """)
+
+def carregar_manifesto(cursor, origens):
+    """Retorna {origem: hash_conteudo} das origens informadas que já foram carregadas."""
+    if not origens:
+        return {}
+    marcadores = ','.join(['%s'] * len(origens))
+    cursor.execute(
+        f"SELECT origem, hash_conteudo FROM {TABELA_MANIFESTO} WHERE origem IN ({marcadores})",
+        list(origens)
+    )
+    return dict(cursor.fetchall())
+
+def registrar_no_manifesto(cursor, hashes):
+    """Grava (ou atualiza) o hash das origens carregadas."""
+    cursor.executemany(
+        f"INSERT INTO {TABELA_MANIFESTO} (origem, hash_conteudo) VALUES (%s, %s) "
+        "ON DUPLICATE KEY UPDATE hash_conteudo = VALUES(hash_conteudo)",
+        list(hashes.items())
+    )
+
+def hashes_das_origens(s3_client, origens):
+    """
+    Obtém o hash de conteúdo (ETag) de cada origem 'bucket/chave' sem baixar os objetos.
+    """
+    hashes = {}
+    for origem in origens:
+        bucket, chave = origem.split('/', 1)
+        resposta = s3_client.head_object(Bucket=bucket, Key=chave)
+        hashes[origem] = resposta['ETag'].strip('"')
+    return hashes
+
+def origens_pendentes(hashes, manifesto):
+    """Filtra as origens novas ou cujo conteúdo mudou desde a última carga."""
+    return [origem for origem, hash_conteudo in hashes.items() if manifesto.get(origem) != hash_conteudo]
+
+def possui_chave_primaria(cursor, tabela):
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.table_constraints "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND constraint_type = 'PRIMARY KEY'",
+        (tabela,)
+    )
+    return cursor.fetchone()[0] > 0
+
+def garantir_chave_primaria(cursor, tabela, colunas_chave):
+    """
+    Garante que a tabela tenha chave primária nas colunas_chave.
+
+    Tabelas criadas antes da carga incremental podem ter linhas duplicadas; nesse caso
+    os dados são copiados para uma tabela nova já com a chave (mantendo a primeira
+    ocorrência de cada chave) e as tabelas são trocadas com RENAME, que é atômico.
+    """
+    if possui_chave_primaria(cursor, tabela):
+        return
+
+    logger.info(f"Tabela {tabela} sem chave primária. Recriando com PRIMARY KEY ({', '.join(colunas_chave)})...")
+    chave = ', '.join(f"`{coluna}`" for coluna in colunas_chave)
+    cursor.execute(f"DROP TABLE IF EXISTS {tabela}_nova")
+    cursor.execute(f"CREATE TABLE {tabela}_nova LIKE {tabela}")
+    cursor.execute(f"ALTER TABLE {tabela}_nova ADD PRIMARY KEY ({chave})")
+    cursor.execute(f"INSERT IGNORE INTO {tabela}_nova SELECT * FROM {tabela}")
+    cursor.execute(f"RENAME TABLE {tabela} TO {tabela}_antiga, {tabela}_nova TO {tabela}")
+    cursor.execute(f"DROP TABLE {tabela}_antiga")
+    logger.info(f"Chave primária criada em {tabela}.")
+
+def clausula_upsert(colunas, colunas_chave):
+    """Cláusula ON DUPLICATE KEY UPDATE que atualiza todas as colunas fora da chave."""
+    atualizacoes = ", ".join(f"`{coluna}` = VALUES(`{coluna}`)" for coluna in colunas if coluna not in colunas_chave)
+    if not atualizacoes:
+        atualizacoes = f"`{colunas_chave[0]}` = `{colunas_chave[0]}`"
+    return f"ON DUPLICATE KEY UPDATE {atualizacoes}"
+
+def montar_upsert(tabela, colunas, colunas_chave):
+    """
+    Monta um INSERT ... ON DUPLICATE KEY UPDATE para as colunas informadas.
+
+    Linhas cujo conteúdo não mudou não são regravadas pelo MySQL (0 linhas afetadas).
+    A forma VALUES(coluna) é usada para que o executemany do pymysql continue
+    agrupando as linhas em um único INSERT de várias linhas.
+    """
+    lista_colunas = ",".join(f"`{coluna}`" for coluna in colunas)
+    marcadores = ','.join(['%s'] * len(colunas))
+    return (
+        f"INSERT INTO {tabela} ({lista_colunas}) VALUES ({marcadores}) "
+        f"{clausula_upsert(colunas, colunas_chave)}"
+    )
@@ -0,0 +1,175 @@
+import csv
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+
+import pandas as pd
+
+from carga_incremental import clausula_upsert
+from instrumentacao import contar
+
+logger = logging.getLogger(__name__)
+
+# Fração do max_allowed_packet usada por INSERT de várias linhas (margem para o protocolo)
+FRACAO_PACOTE = 0.9
+
+def preparar_linhas(chunk):
+    """
+    Converte o chunk em tuplas prontas para o driver, com NaN/NaT/NA mapeados para None.
+
+    O mapeamento é feito de uma vez sobre o DataFrame inteiro (astype(object) + where),
+    sem testar célula a célula em Python. astype(object) também converte os escalares
+    numpy em int/float nativos, que o pymysql sabe escapar.
+    """
+    valores = chunk.astype(object).where(chunk.notna(), None)
+    return list(valores.itertuples(index=False, name=None))
+
+def _lista_colunas(colunas):
+    return ",".join(f"`{coluna}`" for coluna in colunas)
+
+def carregar_executemany(cursor, tabela, chunk, colunas_chave=None):
+    """Backend simples: executemany com um INSERT parametrizado."""
+    colunas = list(chunk.columns)
+    query = f"INSERT INTO {tabela} ({_lista_colunas(colunas)}) VALUES ({','.join(['%s'] * len(colunas))})"
+    if colunas_chave:
+        query += " " + clausula_upsert(colunas, colunas_chave)
+    # O pymysql agrupa o executemany de INSERT em comandos de várias linhas
+    contar('comandos_mysql')
+    return cursor.executemany(query, preparar_linhas(chunk))
+
+def max_allowed_packet(cursor):
+    cursor.execute("SELECT @@max_allowed_packet")
+    return int(cursor.fetchone()[0])
+
+def carregar_multirow(cursor, tabela, chunk, colunas_chave=None, tamanho_pacote=None):
+    """
+    Backend de INSERT com várias linhas por comando, cada comando dimensionado para
+    caber no max_allowed_packet do servidor (menos round trips que o executemany).
+    """
+    colunas = list(chunk.columns)
+    prefixo = f"INSERT INTO {tabela} ({_lista_colunas(colunas)}) VALUES "
+    sufixo = f" {clausula_upsert(colunas, colunas_chave)}" if colunas_chave else ""
+    limite = int((tamanho_pacote or max_allowed_packet(cursor)) * FRACAO_PACOTE) - len(prefixo) - len(sufixo)
+
+    escape = cursor.connection.escape
+    afetadas = 0
+    valores = []
+    tamanho = 0
+    for linha in preparar_linhas(chunk):
+        literal = escape(linha)
+        if valores and tamanho + len(literal) + 1 > limite:
+            afetadas += cursor.execute(prefixo + ",".join(valores) + sufixo)
+            contar('comandos_mysql')
+            valores = []
+            tamanho = 0
+        valores.append(literal)
+        tamanho += len(literal) + 1
+    if valores:
+        afetadas += cursor.execute(prefixo + ",".join(valores) + sufixo)
+        contar('comandos_mysql')
+    return afetadas
+
+def escrever_csv_temporario(chunk, caminho):
+    """
+    Grava o chunk no formato lido pelo LOAD DATA: vírgula como separador, aspas
+    opcionais, \\N para nulos e barras invertidas escapadas.
+    """
+    dados = chunk.copy()
+    for coluna in dados.columns:
+        if pd.api.types.is_object_dtype(dados[coluna]) or isinstance(dados[coluna].dtype, pd.CategoricalDtype):
+            dados[coluna] = dados[coluna].astype('string').str.replace('\\', '\\\\', regex=False)
+    dados.to_csv(
+        caminho,
+        sep=',',
+        header=False,
+        index=False,
+        na_rep='\\N',
+        quoting=csv.QUOTE_MINIMAL,
+        lineterminator='\n',
+        encoding='utf-8',
+    )
+
+def carregar_load_data(cursor, tabela, chunk, colunas_chave=None):
+    """
+    Backend LOAD DATA LOCAL INFILE a partir de um CSV temporário.
+
+    Requer local_infile habilitado no servidor e na conexão. Com colunas_chave, os
+    dados passam por uma tabela temporária e entram na tabela final com upsert.
+    """
+    colunas = list(chunk.columns)
+    destino = f"{tabela}_carga" if colunas_chave else tabela
+    if colunas_chave:
+        cursor.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {destino} LIKE {tabela}")
+        cursor.execute(f"TRUNCATE TABLE {destino}")
+
+    descritor, caminho = tempfile.mkstemp(suffix='.csv')
+    os.close(descritor)
+    try:
+        escrever_csv_temporario(chunk, caminho)
+        afetadas = cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {destino} CHARACTER SET utf8mb4 "
+            "FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '\"' ESCAPED BY '\\\\' "
+            f"LINES TERMINATED BY '\\n' ({_lista_colunas(colunas)})",
+            (caminho,)
+        )
+        contar('comandos_mysql')
+    finally:
+        os.remove(caminho)
+
+    if colunas_chave:
+        afetadas = cursor.execute(
+            f"INSERT INTO {tabela} ({_lista_colunas(colunas)}) "
+            f"SELECT {_lista_colunas(colunas)} FROM {destino} {clausula_upsert(colunas, colunas_chave)}"
+        )
+        contar('comandos_mysql')
+    return afetadas
+
+BACKENDS = {
+    'executemany': carregar_executemany,
+    'multirow': carregar_multirow,
+    'load_data': carregar_load_data,
+}
+
+def carregar_chunk(backend, cursor, tabela, chunk, colunas_chave=None):
+    """Carrega um chunk com o backend escolhido e retorna o número de linhas afetadas."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend de carga desconhecido: {backend}. Opções: {', '.join(BACKENDS)}")
+    return BACKENDS[backend](cursor, tabela, chunk, colunas_chave=colunas_chave)
+
+def _indices_secundarios(cursor, tabela):
+    """Retorna {nome_indice: (unico, [colunas])} dos índices que não são a chave primária."""
+    cursor.execute(
+        "SELECT index_name, non_unique, column_name, sub_part FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s AND index_name <> 'PRIMARY' "
+        "ORDER BY index_name, seq_in_index",
+        (tabela,)
+    )
+    indices = {}
+    for nome, nao_unico, coluna, prefixo in cursor.fetchall():
+        definicao = f"`{coluna}`({prefixo})" if prefixo else f"`{coluna}`"
+        indices.setdefault(nome, (not nao_unico, []))[1].append(definicao)
+    return indices
+
+@contextmanager
+def indices_adiados(cursor, tabela):
+    """
+    Remove os índices secundários da tabela durante a carga e os recria ao final,
+    com as verificações de unicidade e de chaves estrangeiras desligadas na sessão.
+    Reconstruir um índice uma vez é bem mais barato que mantê-lo linha a linha.
+    """
+    indices = _indices_secundarios(cursor, tabela)
+    cursor.execute("SET SESSION unique_checks = 0")
+    cursor.execute("SET SESSION foreign_key_checks = 0")
+    for nome in indices:
+        logger.info(f"Removendo índice {nome} de {tabela} durante a carga...")
+        cursor.execute(f"ALTER TABLE {tabela} DROP INDEX `{nome}`")
+    try:
+        yield
+    finally:
+        for nome, (unico, colunas) in indices.items():
+            logger.info(f"Recriando índice {nome} em {tabela}...")
+            tipo = "UNIQUE INDEX" if unico else "INDEX"
+            cursor.execute(f"ALTER TABLE {tabela} ADD {tipo} `{nome}` ({', '.join(colunas)})")
+        cursor.execute("SET SESSION unique_checks = 1")
+        cursor.execute("SET SESSION foreign_key_checks = 1")
@@ -0,0 +1,116 @@
+import logging
+import os
+from urllib.parse import urlparse
+
+import duckdb
+
+from metrics import WEEKDAY, WEEKEND
+
+logger = logging.getLogger(__name__)
+
+# Local da saída da Silver; pode ser um diretório local com o mesmo layout
+SILVER_BASE = "s3://silver"
+SILVER_FILE = "data_silver_final.parquet"
+SILVER_PARTITIONED = "acidentes/*/*/*/*.parquet"
+
+# Linhas por lote nas leituras em streaming
+BATCH_SIZE = 100000
+
+def connect_duckdb(endpoint_url=None, access_key=None, secret_key=None, threads=None, memory_limit=None):
+    """
+    Abrir uma conexão DuckDB em memória. Com endpoint_url ela é configurada para ler o
+    MinIO via httpfs; sem ele só lê arquivos locais e a extensão httpfs, que o INSTALL
+    baixa da internet, não é carregada (workers sem acesso externo).
+    """
+    con = duckdb.connect()
+    if endpoint_url is not None:
+        endpoint = urlparse(endpoint_url)
+        con.execute("INSTALL httpfs")
+        con.execute("LOAD httpfs")
+        con.execute(f"SET s3_endpoint = '{endpoint.netloc}'")
+        con.execute(f"SET s3_use_ssl = {'true' if endpoint.scheme == 'https' else 'false'}")
+        con.execute("SET s3_url_style = 'path'")
+        con.execute(f"SET s3_access_key_id = '{access_key}'")
+        con.execute(f"SET s3_secret_access_key = '{secret_key}'")
+    con.execute(f"SET threads = {threads or os.cpu_count() or 1}")
+    if memory_limit:
+        con.execute(f"SET memory_limit = '{memory_limit}'")
+    return con
+
+def silver_relation(partitioned=False, base=SILVER_BASE, path=None):
+    """
+    Expressão FROM para a saída da Silver no MinIO (arquivo único ou layout ano/mes/uf).
+    path substitui o arquivo único por outro caminho (ex.: a cópia no cache local).
+    """
+    if path is not None:
+        return f"read_parquet('{path}')"
+    if partitioned:
+        return f"read_parquet('{base}/{SILVER_PARTITIONED}', hive_partitioning = true)"
+    return f"read_parquet('{base}/{SILVER_FILE}')"
+
+def _where(filters):
+    """Montar a cláusula WHERE; filtros sobre ano/mes/uf no layout particionado podam arquivos inteiros."""
+    if not filters:
+        return "", []
+    conditions, params = [], []
+    for column, value in filters.items():
+        if isinstance(value, (list, tuple, set)):
+            conditions.append(f"{column} IN ({', '.join(['?'] * len(value))})")
+            params.extend(value)
+        else:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    return "WHERE " + " AND ".join(conditions), params
+
+def build_cube_duckdb(con, partitioned=False, filters=None, base=SILVER_BASE, path=None):
+    """
+    Calcular no DuckDB o mesmo cubo de metrics.build_cube, lendo do Parquet só as
+    colunas usadas (projection pushdown) e só os row groups/partições que passam
+    nos filtros (predicate pushdown).
+    """
+    where, params = _where(filters)
+    query = f"""
+    SELECT
+        uf,
+        CASE WHEN isodow(CAST(data_inversa AS DATE)) >= 6 THEN '{WEEKEND}' ELSE '{WEEKDAY}' END AS tipo_dia,
+        condicao_metereologica,
+        causa_principal,
+        COUNT(*) AS linhas,
+        COUNT(id) AS acidentes,
+        COALESCE(SUM(mortos), 0) AS mortos
+    FROM {silver_relation(partitioned, base, path)}
+    {where}
+    GROUP BY ALL
+    """
+    logger.info("Calculando o cubo de agregação no DuckDB a partir do Parquet da Silver...")
+    return con.execute(query, params).df()
+
+def heatmap_cells_duckdb(con, resolution, bounds, partitioned=False, filters=None, base=SILVER_BASE, path=None):
+    """Agregar as coordenadas em células de grade no DuckDB (mesmo formato de gold.fetch_heatmap_cells)."""
+    where, params = _where(filters)
+    bounds_condition = (
+        "latitude BETWEEN ? AND ? AND longitude BETWEEN ? AND ?"
+    )
+    where = f"{where} AND {bounds_condition}" if where else f"WHERE {bounds_condition}"
+    params = params + [bounds["lat_min"], bounds["lat_max"], bounds["lon_min"], bounds["lon_max"]]
+    query = f"""
+    SELECT
+        (FLOOR(latitude / {resolution}) + 0.5) * {resolution} AS latitude,
+        (FLOOR(longitude / {resolution}) + 0.5) * {resolution} AS longitude,
+        COUNT(*) AS weight
+    FROM {silver_relation(partitioned, base, path)}
+    {where}
+    GROUP BY FLOOR(latitude / {resolution}), FLOOR(longitude / {resolution})
+    """
+    return con.execute(query, params).df()
+
+def iter_columns_duckdb(con, columns, partitioned=False, filters=None, base=SILVER_BASE, path=None, batch_size=BATCH_SIZE):
+    """
+    Ler só as colunas pedidas do Parquet da Silver em lotes de batch_size linhas
+    (ex.: os pontos da detecção de hotspots), sem materializar o resultado inteiro.
+    """
+    where, params = _where(filters)
+    query = f"SELECT {', '.join(columns)} FROM {silver_relation(partitioned, base, path)} {where}"
+    reader = con.execute(query, params).fetch_record_batch(batch_size)
+    for batch in reader:
+        yield batch.to_pandas()
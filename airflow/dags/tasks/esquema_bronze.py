@@ -0,0 +1,198 @@
+import io
+import logging
+import os
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+
+logger = logging.getLogger(__name__)
+
+# Tipo lógico de cada coluna conhecida dos arquivos de acidentes da PRF.
+# Colunas que não aparecem aqui são tratadas como 'texto'.
+COLUNAS = {
+    'id': 'inteiro',
+    'pesid': 'inteiro',
+    'data_inversa': 'data',
+    'dia_semana': 'categoria',
+    'horario': 'hora',
+    'uf': 'categoria',
+    'br': 'inteiro',
+    'km': 'decimal',
+    'municipio': 'categoria',
+    'causa_principal': 'categoria',
+    'causa_acidente': 'categoria',
+    'tipo_acidente': 'categoria',
+    'classificacao_acidente': 'categoria',
+    'fase_dia': 'categoria',
+    'sentido_via': 'categoria',
+    'condicao_metereologica': 'categoria',
+    'tipo_pista': 'categoria',
+    'tracado_via': 'categoria',
+    'uso_solo': 'categoria',
+    'pessoas': 'contagem',
+    'mortos': 'contagem',
+    'feridos_leves': 'contagem',
+    'feridos_graves': 'contagem',
+    'ilesos': 'contagem',
+    'ignorados': 'contagem',
+    'feridos': 'contagem',
+    'veiculos': 'contagem',
+    'latitude': 'decimal',
+    'longitude': 'decimal',
+    'regional': 'categoria',
+    'delegacia': 'categoria',
+    'uop': 'categoria',
+}
+
+# Tipo Arrow final (gravado no Parquet) de cada tipo lógico
+TIPOS_ARROW = {
+    'inteiro': pa.int64(),
+    'contagem': pa.int32(),
+    'decimal': pa.float64(),
+    'data': pa.date32(),
+    'hora': pa.time64('us'),
+    'categoria': pa.dictionary(pa.int32(), pa.string()),
+    'texto': pa.string(),
+}
+
+# Datas e horários são lidos como texto e convertidos depois, para que valores
+# inválidos virem nulos (como o errors='coerce' do pandas) em vez de abortar a leitura.
+TIPOS_LEITURA = dict(TIPOS_ARROW, data=pa.string(), hora=pa.string())
+
+FORMATOS_DATA = ['%Y-%m-%d', '%d/%m/%Y']
+FORMATO_HORA = '%H:%M:%S'
+
+# Quantidade de bytes lida de cada vez ao procurar o cabeçalho em um fluxo
+TAMANHO_ESPIADA = 64 * 1024
+
+def tipo_logico(coluna):
+    """Retorna o tipo lógico declarado para a coluna."""
+    return COLUNAS.get(coluna, 'texto')
+
+def schema_arrow(colunas):
+    """Monta o schema Arrow fixo do arquivo Parquet para as colunas informadas."""
+    return pa.schema([(coluna, TIPOS_ARROW[tipo_logico(coluna)]) for coluna in colunas])
+
+def _colunas_do_cabecalho(cabecalho, separador):
+    return [coluna.strip().strip('"') for coluna in cabecalho.strip().split(separador)]
+
+def ler_cabecalho(caminho_arquivo_csv, encoding='latin1', separador=';'):
+    """Lê apenas a linha de cabeçalho do CSV e retorna a lista de colunas."""
+    with open(caminho_arquivo_csv, 'r', encoding=encoding) as arquivo:
+        cabecalho = arquivo.readline()
+    return _colunas_do_cabecalho(cabecalho, separador)
+
+class _FluxoComPrefixo(io.RawIOBase):
+    """Fluxo binário que devolve primeiro os bytes já lidos e depois o restante do fluxo original."""
+
+    def __init__(self, prefixo, fluxo):
+        super().__init__()
+        self._prefixo = memoryview(prefixo)
+        self._fluxo = fluxo
+
+    def readable(self):
+        return True
+
+    def readinto(self, destino):
+        if self._prefixo:
+            quantidade = min(len(destino), len(self._prefixo))
+            destino[:quantidade] = self._prefixo[:quantidade]
+            self._prefixo = self._prefixo[quantidade:]
+            return quantidade
+        dados = self._fluxo.read(len(destino))
+        destino[:len(dados)] = dados
+        return len(dados)
+
+    def close(self):
+        try:
+            self._fluxo.close()
+        finally:
+            super().close()
+
+def espiar_cabecalho(fluxo, encoding='latin1', separador=';'):
+    """
+    Lê o cabeçalho de um fluxo binário (arquivo dentro de um zip, gzip, objeto do S3)
+    sem consumi-lo: retorna as colunas e um fluxo equivalente ao original, que ainda
+    começa pelo cabeçalho.
+    """
+    prefixo = b''
+    while b'\n' not in prefixo:
+        dados = fluxo.read(TAMANHO_ESPIADA)
+        if not dados:
+            break
+        prefixo += dados
+    cabecalho = prefixo.split(b'\n', 1)[0].decode(encoding)
+    return _colunas_do_cabecalho(cabecalho, separador), io.BufferedReader(_FluxoComPrefixo(prefixo, fluxo))
+
+def opcoes_conversao(colunas):
+    """
+    Monta as opções do leitor CSV do pyarrow: tipos explícitos por coluna,
+    vírgula como separador decimal e textos vazios como nulos.
+    """
+    return pv.ConvertOptions(
+        column_types={coluna: TIPOS_LEITURA[tipo_logico(coluna)] for coluna in colunas},
+        decimal_point=',',
+        strings_can_be_null=True,
+        quoted_strings_can_be_null=True,
+    )
+
+def _converter_data(coluna):
+    datas = [pc.strptime(coluna, format=formato, unit='s', error_is_null=True) for formato in FORMATOS_DATA]
+    return pc.cast(pc.coalesce(*datas), pa.date32())
+
+def _converter_hora(coluna):
+    instantes = pc.strptime(coluna, format=FORMATO_HORA, unit='s', error_is_null=True)
+    segundos = pc.add(
+        pc.add(pc.multiply(pc.hour(instantes), 3600), pc.multiply(pc.minute(instantes), 60)),
+        pc.second(instantes),
+    )
+    return pc.multiply(segundos, 1_000_000).cast(pa.time64('us'))
+
+def _converter_contagem(coluna):
+    return pc.fill_null(coluna, 0)
+
+CONVERSORES = {
+    'data': _converter_data,
+    'hora': _converter_hora,
+    'contagem': _converter_contagem,
+}
+
+def normalizar_lote(lote, schema):
+    """Aplica as conversões vetorizadas de cada tipo lógico a um RecordBatch lido do CSV."""
+    arrays = []
+    for nome, coluna in zip(lote.schema.names, lote.columns):
+        conversor = CONVERSORES.get(tipo_logico(nome))
+        arrays.append(conversor(coluna) if conversor else coluna)
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+def ler_csv_em_lotes(caminho_arquivo_csv, tamanho_bloco=16 * 1024 * 1024):
+    """
+    Lê o CSV da PRF em streaming com o leitor do pyarrow e gera RecordBatches já
+    normalizados segundo o schema declarado em COLUNAS.
+
+    caminho_arquivo_csv pode ser um caminho local ou um fluxo binário já aberto (por
+    exemplo o CSV dentro de um .zip), que é lido sem ser extraído para o disco.
+
+    Retorna o schema e o gerador de lotes.
+    """
+    if isinstance(caminho_arquivo_csv, (str, bytes, os.PathLike)):
+        colunas = ler_cabecalho(caminho_arquivo_csv)
+        origem = caminho_arquivo_csv
+    else:
+        colunas, origem = espiar_cabecalho(caminho_arquivo_csv)
+    schema = schema_arrow(colunas)
+    logger.info(f"Schema do arquivo {caminho_arquivo_csv}: {len(colunas)} colunas.")
+
+    leitor = pv.open_csv(
+        origem,
+        read_options=pv.ReadOptions(encoding='latin1', block_size=tamanho_bloco),
+        parse_options=pv.ParseOptions(delimiter=';'),
+        convert_options=opcoes_conversao(colunas),
+    )
+
+    def lotes():
+        for lote in leitor:
+            yield normalizar_lote(lote, schema)
+
+    return schema, lotes()
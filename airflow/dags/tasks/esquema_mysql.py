@@ -0,0 +1,258 @@
+import logging
+import math
+import threading
+
+import pandas as pd
+import pyarrow as pa
+import pymysql
+
+from esquema_bronze import tipo_logico
+
+logger = logging.getLogger(__name__)
+
+# Colunas com domínio conhecido, que recebem um tipo mais justo que o do schema Arrow
+TIPOS_POR_COLUNA = {
+    'uf': 'CHAR(2)',
+    'br': 'SMALLINT',
+    'mortos': 'TINYINT',
+    'feridos_graves': 'TINYINT',
+    'ignorados': 'TINYINT',
+}
+
+# Índices secundários padrão da acidentes_silver (nome -> colunas)
+INDICES_PADRAO = {
+    'idx_uf_data': ['uf', 'data_inversa'],
+    'idx_data': ['data_inversa'],
+}
+
+# Tipos inteiros do MySQL, do mais estreito ao mais largo, com seus limites
+INTEIROS = [
+    ('TINYINT', -2 ** 7, 2 ** 7 - 1),
+    ('SMALLINT', -2 ** 15, 2 ** 15 - 1),
+    ('MEDIUMINT', -2 ** 23, 2 ** 23 - 1),
+    ('INT', -2 ** 31, 2 ** 31 - 1),
+    ('BIGINT', -2 ** 63, 2 ** 63 - 1),
+]
+
+TEXTOS = {'TINYTEXT': 255, 'TEXT': 65535, 'MEDIUMTEXT': 2 ** 24 - 1, 'LONGTEXT': 2 ** 32 - 1}
+
+# Textos até este comprimento viram VARCHAR (arredondado para múltiplos de 32); acima, TEXT
+VARCHAR_MAXIMO = 1024
+
+# Anos com partição própria quando a tabela é particionada por ano (os demais vão para pmax)
+ANOS_PARTICAO = range(2007, 2031)
+
+def tipo_inteiro(minimo, maximo):
+    """Menor tipo inteiro do MySQL que comporta o intervalo [minimo, maximo]."""
+    for nome, menor, maior in INTEIROS:
+        if menor <= minimo and maximo <= maior:
+            return nome
+    raise ValueError(f"Intervalo [{minimo}, {maximo}] não cabe em nenhum tipo inteiro do MySQL.")
+
+def tipo_texto(comprimento):
+    """VARCHAR com folga para textos de até comprimento caracteres (TEXT acima de VARCHAR_MAXIMO)."""
+    if comprimento > VARCHAR_MAXIMO:
+        return 'TEXT'
+    return f"VARCHAR({max(32, math.ceil(comprimento / 32) * 32)})"
+
+def largura(tipo):
+    """Família e largura de um tipo MySQL, para comparar tipos da mesma família."""
+    tipo = tipo.upper()
+    nome = tipo.split('(')[0].split()[0]
+    for ordem, (inteiro, _, _) in enumerate(INTEIROS):
+        if nome == inteiro:
+            return 'inteiro', ordem
+    if nome in ('CHAR', 'VARCHAR'):
+        return 'texto', int(tipo.split('(')[1].split(')')[0])
+    if nome in TEXTOS:
+        return 'texto', TEXTOS[nome]
+    return nome, 0
+
+def _tipo_arrow(campo):
+    tipo = campo.type
+    if pa.types.is_integer(tipo):
+        return 'SMALLINT' if tipo_logico(campo.name) == 'contagem' else 'INT'
+    if pa.types.is_floating(tipo):
+        return 'DOUBLE'
+    if pa.types.is_date(tipo):
+        return 'DATE'
+    if pa.types.is_time(tipo):
+        return 'TIME'
+    if pa.types.is_timestamp(tipo):
+        return 'DATETIME'
+    if pa.types.is_dictionary(tipo):
+        return tipo_texto(0)
+    return 'TEXT'
+
+def _comprimento_maximo(valores):
+    if isinstance(valores.dtype, pd.CategoricalDtype):
+        valores = pd.Series(valores.cat.categories)
+    return int(valores.astype(str).str.len().max())
+
+def alargamentos(chunk, tipos):
+    """Colunas cujo tipo atual não comporta os valores do chunk: {coluna: tipo alargado}."""
+    novos = {}
+    for coluna, tipo in tipos.items():
+        if coluna not in chunk:
+            continue
+        valores = chunk[coluna].dropna()
+        if valores.empty:
+            continue
+        familia, atual = largura(tipo)
+        if familia == 'inteiro':
+            necessario = tipo_inteiro(int(valores.min()), int(valores.max()))
+            if largura(necessario)[1] > atual:
+                novos[coluna] = necessario
+        elif familia == 'texto':
+            comprimento = _comprimento_maximo(valores)
+            if comprimento > atual:
+                novos[coluna] = tipo_texto(comprimento)
+    return novos
+
+def inferir_tipos(schema, amostra=None):
+    """
+    Tipos MySQL das colunas de um schema Arrow: CHAR(2) para uf, DATE/TIME para datas e
+    horários, SMALLINT/TINYINT para contagens e VARCHAR para categorias. Com uma amostra
+    (DataFrame do primeiro lote), colunas cujos valores não cabem no tipo são alargadas.
+    """
+    tipos = {campo.name: TIPOS_POR_COLUNA.get(campo.name) or _tipo_arrow(campo) for campo in schema}
+    if amostra is not None:
+        tipos.update(alargamentos(amostra, tipos))
+    return tipos
+
+def chave_primaria(colunas_chave, particionar_por_ano=False):
+    """No MySQL a coluna de particionamento precisa fazer parte de toda chave única."""
+    if particionar_por_ano and colunas_chave and 'data_inversa' not in colunas_chave:
+        return list(colunas_chave) + ['data_inversa']
+    return list(colunas_chave)
+
+def _definicao(coluna, tipo, chave):
+    return f"`{coluna}` {tipo} {'NOT NULL' if coluna in chave else 'NULL'}"
+
+def _indexavel(tipo):
+    return largura(tipo)[0] != 'texto' or tipo.upper().split('(')[0].split()[0] in ('CHAR', 'VARCHAR')
+
+def montar_create_table(tabela, tipos, chave, indices, particionar_por_ano=False):
+    """CREATE TABLE com tipos, chave primária, índices e, opcionalmente, partições por ano."""
+    definicoes = [_definicao(coluna, tipo, chave) for coluna, tipo in tipos.items()]
+    if chave:
+        definicoes.append(f"PRIMARY KEY ({', '.join(f'`{coluna}`' for coluna in chave)})")
+    for nome, colunas in indices.items():
+        if all(coluna in tipos and _indexavel(tipos[coluna]) for coluna in colunas):
+            definicoes.append(f"KEY `{nome}` ({', '.join(f'`{coluna}`' for coluna in colunas)})")
+
+    ddl = f"CREATE TABLE IF NOT EXISTS {tabela} (\n    " + ",\n    ".join(definicoes) + "\n)"
+    if particionar_por_ano:
+        particoes = [f"PARTITION p{ano} VALUES LESS THAN ({ano + 1})" for ano in ANOS_PARTICAO]
+        particoes.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+        ddl += "\nPARTITION BY RANGE (YEAR(data_inversa)) (\n    " + ",\n    ".join(particoes) + "\n)"
+    return ddl
+
+def colunas_existentes(cursor, tabela):
+    """{coluna: tipo} da tabela no banco ({} se ela não existe)."""
+    cursor.execute(
+        "SELECT column_name, column_type FROM information_schema.columns "
+        "WHERE table_schema = DATABASE() AND table_name = %s ORDER BY ordinal_position",
+        (tabela,)
+    )
+    return {coluna: tipo.upper() for coluna, tipo in cursor.fetchall()}
+
+def _indices_existentes(cursor, tabela):
+    cursor.execute(
+        "SELECT DISTINCT index_name FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        (tabela,)
+    )
+    return {linha[0] for linha in cursor.fetchall()}
+
+def _migrar_texto_generico(cursor, tabela, coluna, desejado, chave):
+    """
+    Converte uma coluna TEXT criada por versões anteriores para o tipo inferido. Para
+    textos o comprimento vem dos dados já gravados; se a conversão falhar (ex.: valores
+    que não são datas válidas), a coluna continua como TEXT.
+    """
+    if largura(desejado)[0] == 'texto':
+        cursor.execute(f"SELECT COALESCE(MAX(CHAR_LENGTH(`{coluna}`)), 0) FROM {tabela}")
+        comprimento = cursor.fetchone()[0]
+        if comprimento > largura(desejado)[1]:
+            desejado = tipo_texto(comprimento)
+    try:
+        cursor.execute(f"ALTER TABLE {tabela} MODIFY {_definicao(coluna, desejado, chave)}")
+        logger.info(f"Coluna {coluna} convertida de TEXT para {desejado}.")
+        return desejado
+    except pymysql.MySQLError as e:
+        logger.warning(f"Não foi possível converter a coluna {coluna} para {desejado}, mantendo TEXT: {e}")
+        return 'TEXT'
+
+def criar_ou_evoluir_tabela(cursor, tabela, tipos, chave, indices=None, particionar_por_ano=False):
+    """
+    Cria a tabela com os tipos inferidos ou, se ela já existe, evolui o schema sem perder
+    dados: colunas novas são adicionadas, colunas existentes só são alargadas (nunca
+    estreitadas), colunas TEXT genéricas de versões anteriores são convertidas para o
+    tipo inferido e os índices ausentes são criados. Particionamento só é aplicado na
+    criação da tabela.
+
+    Retorna os tipos efetivos das colunas no banco.
+    """
+    indices = INDICES_PADRAO if indices is None else indices
+    existentes = colunas_existentes(cursor, tabela)
+    if not existentes:
+        logger.info(f"Criando a tabela {tabela} com tipos inferidos...")
+        cursor.execute(montar_create_table(tabela, tipos, chave, indices, particionar_por_ano))
+        return dict(tipos)
+
+    efetivos = dict(existentes)
+    for coluna, tipo in tipos.items():
+        atual = existentes.get(coluna)
+        if atual is None:
+            logger.info(f"Adicionando a nova coluna {coluna} ({tipo}) à tabela {tabela}.")
+            cursor.execute(f"ALTER TABLE {tabela} ADD COLUMN {_definicao(coluna, tipo, chave)}")
+            efetivos[coluna] = tipo
+        elif atual == 'TEXT' and tipo != 'TEXT':
+            efetivos[coluna] = _migrar_texto_generico(cursor, tabela, coluna, tipo, chave)
+        elif largura(atual)[0] == largura(tipo)[0] and largura(tipo)[1] > largura(atual)[1]:
+            logger.info(f"Alargando a coluna {coluna} de {atual} para {tipo}.")
+            cursor.execute(f"ALTER TABLE {tabela} MODIFY {_definicao(coluna, tipo, chave)}")
+            efetivos[coluna] = tipo
+
+    criados = _indices_existentes(cursor, tabela)
+    ausentes = {nome: colunas for nome, colunas in indices.items() if nome not in criados}
+    for nome, colunas in ausentes.items():
+        if not all(coluna in efetivos and _indexavel(efetivos[coluna]) for coluna in colunas):
+            logger.warning(f"Índice {nome} {colunas} não criado: colunas ausentes ou do tipo TEXT.")
+            continue
+        logger.info(f"Criando o índice {nome} ({', '.join(colunas)}) em {tabela}...")
+        cursor.execute(f"ALTER TABLE {tabela} ADD INDEX `{nome}` ({', '.join(f'`{coluna}`' for coluna in colunas)})")
+    return efetivos
+
+def tamanho_medio_linha(cursor, tabela):
+    """Tamanho médio das linhas (bytes) segundo as estatísticas do InnoDB."""
+    cursor.execute(
+        "SELECT avg_row_length, data_length, index_length FROM information_schema.tables "
+        "WHERE table_schema = DATABASE() AND table_name = %s",
+        (tabela,)
+    )
+    return cursor.fetchone()
+
+class AjustadorDeTipos:
+    """
+    Alarga colunas da tabela durante a carga quando um chunk traz valores que não cabem
+    no tipo atual (ex.: um texto maior que o VARCHAR inferido do primeiro lote). Seguro
+    para ser usado pelas threads de carga do pipeline da Silver.
+    """
+
+    def __init__(self, tabela, tipos, chave):
+        self.tabela = tabela
+        self.tipos = dict(tipos)
+        self.chave = list(chave)
+        self._trava = threading.Lock()
+
+    def ajustar(self, cursor, chunk):
+        if not alargamentos(chunk, self.tipos):
+            return
+        with self._trava:
+            # Outra thread pode ter alargado a coluna enquanto esta esperava
+            for coluna, tipo in alargamentos(chunk, self.tipos).items():
+                logger.info(f"Alargando a coluna {coluna} de {self.tipos[coluna]} para {tipo}.")
+                cursor.execute(f"ALTER TABLE {self.tabela} MODIFY {_definicao(coluna, tipo, self.chave)}")
+                self.tipos[coluna] = tipo
@@ -1,18 +1,44 @@
+import boto3
+import numpy as np
 import pandas as pd
 import pymysql
 from fpdf import FPDF
+import matplotlib
+matplotlib.use("Agg")  # renderização sem interface gráfica, segura em processos filhos
 import matplotlib.pyplot as plt
-from shapely.geometry import Point
 import folium
 from folium.plugins import HeatMap
 import logging
 import os
 
+from aggregates import ensure_summaries, query_summaries
+from metrics import build_cube, compute_metrics, merge_cubes, required_columns
+from duckdb_backend import SILVER_FILE, connect_duckdb, build_cube_duckdb, heatmap_cells_duckdb, iter_columns_duckdb
+from hotspots import HOTSPOT_COLUMNS, HotspotAccumulator, write_hotspots_mysql, write_hotspots_parquet
+from artifacts import CACHE_DIR, render_artifacts
+from cache_minio import CacheObjetosS3
+from instrumentacao import contar, etapa, sessao
+
 # Configuração de logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def connect_to_db():
+# Limites aproximados do território brasileiro; coordenadas fora deles são descartadas
+BRAZIL_BOUNDS = {"lat_min": -33.8, "lat_max": 5.3, "lon_min": -74.0, "lon_max": -34.7}
+
+# Tamanho da célula do mapa de calor em graus (0.01° ≈ 1,1 km)
+HEATMAP_RESOLUTION = 0.01
+
+# Artefatos gerados pela camada Gold
+GRAPHS_DIR = "/opt/airflow/data/graphs"
+HEATMAP_PATH = "/opt/airflow/data/heatmap_acidentes.html"
+HEATMAP_IMAGE_NAME = "heatmap_acidentes.png"
+PDF_PATH = "/opt/airflow/data/analise_acidentes.pdf"
+
+# Linhas por chunk na leitura em streaming da acidentes_silver
+FETCH_CHUNK_SIZE = 100000
+
+def connect_to_db(cursorclass=pymysql.cursors.Cursor):
     """Conectar ao banco de dados MySQL."""
     logger.info("Conectando ao banco de dados MySQL...")
     return pymysql.connect(
@@ -20,112 +46,272 @@ def connect_to_db():
         user="airflow_user",
         password="airflow_password",
         database="airflow",
-        port=3306
+        port=3306,
+        cursorclass=cursorclass
     )
 
-def fetch_data():
-    """Buscar dados da tabela acidentes."""
-    logger.info("Buscando dados da tabela 'acidentes_silver' no banco de dados...")
-    conn = connect_to_db()
-    query = "SELECT * FROM acidentes_silver"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    logger.info(f"Dados carregados com sucesso. Total de linhas: {len(df)}")
+def coerce_dtypes(df):
+    """Reduzir o chunk a tipos compactos: texto vira categoria e números inteiros o menor int possível."""
+    for column in df.columns:
+        if column == "data_inversa":
+            df[column] = pd.to_datetime(df[column], errors="coerce")
+        else:
+            values = pd.to_numeric(df[column], errors="coerce")
+            if values.notna().sum() < df[column].notna().sum():
+                df[column] = df[column].astype("category")
+            elif values.notna().all():
+                df[column] = pd.to_numeric(values, downcast="integer")
+            else:
+                df[column] = values
     return df
 
-def analyze_data(df):
-    """Analisar os dados e gerar insights."""
+def iter_chunks(columns, chunksize=FETCH_CHUNK_SIZE):
+    """
+    Ler as colunas pedidas da acidentes_silver em chunks por um cursor sem buffer
+    (SSCursor): o servidor envia as linhas conforme são consumidas, então o cliente
+    nunca guarda o resultado inteiro.
+    """
+    select_list = ", ".join(f"`{column}`" for column in columns)
+    conn = connect_to_db(cursorclass=pymysql.cursors.SSCursor)
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute(f"SELECT {select_list} FROM acidentes_silver")
+            while True:
+                rows = cursor.fetchmany(chunksize)
+                if not rows:
+                    break
+                yield coerce_dtypes(pd.DataFrame.from_records(rows, columns=columns))
+    finally:
+        conn.close()
+
+def analyze_streaming(chunksize=FETCH_CHUNK_SIZE):
+    """Analisar a acidentes_silver em chunks, acumulando o cubo de agregação com memória limitada."""
+    logger.info(f"Iniciando análises dos dados em chunks de {chunksize} linhas...")
+    cube, total_rows = None, 0
+    for chunk in iter_chunks(required_columns(), chunksize):
+        total_rows += len(chunk)
+        contar("linhas_lidas", len(chunk))
+        partial = build_cube(chunk)
+        cube = partial if cube is None else merge_cubes([cube, partial])
+    if cube is None:
+        cube = merge_cubes([])
+    logger.info(f"Cubo de agregação calculado: {len(cube)} células para {total_rows} linhas.")
+    analysis_results = compute_metrics(cube)
+    logger.info(f"Média de acidentes por estado calculada: {analysis_results['media_acidentes_estado']:.2f}")
+    return analysis_results
+
+def analyze_data():
+    """Analisar os dados a partir das tabelas de resumo mantidas pela Silver."""
     logger.info("Iniciando análises dos dados...")
-    # Média de acidentes por estado
-    media_acidentes_estado = df.groupby('uf')['id'].count().mean()
-    logger.info(f"Média de acidentes por estado calculada: {media_acidentes_estado:.2f}")
-    
-    # Acidentes por dia da semana
-    df['dia_semana'] = pd.to_datetime(df['data_inversa']).dt.dayofweek
-    acidentes_dia_semana = df['dia_semana'].apply(lambda x: 'Fim de semana' if x >= 5 else 'Dia útil').value_counts()
-    logger.info("Acidentes por tipo de dia analisados com sucesso.")
-
-    # Óbitos e acidentes por estado
-    obitos_por_estado = df.groupby('uf').agg({
-        'mortos': 'sum',
-        'id': 'count'
-    }).rename(columns={'id': 'total_acidentes'})
-    logger.info("Óbitos e acidentes por estado calculados com sucesso.")
-
-    # Acidentes em condições climáticas
-    condicoes_normais = df[df['condicao_metereologica'] == 'Normal']['id'].count()
-    condicoes_chuvosas = df[df['condicao_metereologica'] == 'Chuva']['id'].count()
-    logger.info("Análise de condições climáticas concluída.")
-
-    # Principais causas de acidentes
-    principais_causas = df['causa_principal'].value_counts().head(5)
-    logger.info("Principais causas de acidentes analisadas.")
-
-    return {
-        "media_acidentes_estado": media_acidentes_estado,
-        "acidentes_dia_semana": acidentes_dia_semana,
-        "obitos_por_estado": obitos_por_estado,
-        "condicoes_normais": condicoes_normais,
-        "condicoes_chuvosas": condicoes_chuvosas,
-        "principais_causas": principais_causas
-    }
+    conn = connect_to_db()
+    try:
+        ensure_summaries(conn)
+        analysis_results = query_summaries(conn)
+    finally:
+        conn.close()
+    logger.info(f"Média de acidentes por estado calculada: {analysis_results['media_acidentes_estado']:.2f}")
+    return analysis_results
+
+def analyze_dataframe(df):
+    """Analisar os dados em memória com o motor de métricas (uma única passada sobre o DataFrame)."""
+    logger.info("Iniciando análises dos dados...")
+    cube = build_cube(df)
+    logger.info(f"Cubo de agregação calculado: {len(cube)} células para {len(df)} linhas.")
+    analysis_results = compute_metrics(cube)
+    logger.info(f"Média de acidentes por estado calculada: {analysis_results['media_acidentes_estado']:.2f}")
+    return analysis_results
+
+def analyze_parquet(partitioned=False, filters=None, resolution=HEATMAP_RESOLUTION, use_cache=True):
+    """
+    Analisar os dados direto no Parquet da Silver no MinIO com o DuckDB, sem passar pelo MySQL.
+
+    Com use_cache=True o arquivo único da Silver é lido da cópia no cache local de
+    objetos (revalidada pelo ETag) em vez de ser buscado no MinIO a cada execução.
+    """
+    logger.info("Iniciando análises dos dados no Parquet da Silver (DuckDB)...")
+    con, path = connect_silver_parquet(partitioned, use_cache)
+    try:
+        cube = build_cube_duckdb(con, partitioned=partitioned, filters=filters, path=path)
+        logger.info(f"Cubo de agregação calculado: {len(cube)} células.")
+        analysis_results = compute_metrics(cube)
+        cells = heatmap_cells_duckdb(con, resolution, BRAZIL_BOUNDS, partitioned=partitioned, filters=filters, path=path)
+        logger.info(f"{len(cells)} células carregadas para o mapa de calor.")
+    finally:
+        con.close()
+    logger.info(f"Média de acidentes por estado calculada: {analysis_results['media_acidentes_estado']:.2f}")
+    return analysis_results, cells
+
+def connect_silver_parquet(partitioned=False, use_cache=True):
+    """
+    Conexão DuckDB e, para o arquivo único da Silver com use_cache=True, o caminho da
+    cópia no cache local de objetos. Só a leitura direta do MinIO (path None) precisa
+    da extensão httpfs.
+    """
+    endpoint_url = "http://minio:9000"
+    access_key = "minioadmin"
+    secret_key = "minio@1234!"
+    path = None
+    if use_cache and not partitioned:
+        cache = CacheObjetosS3(boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key
+        ))
+        path = cache.obter("silver", SILVER_FILE)
+        logger.info(f"Cache de objetos do MinIO: {cache.estatisticas()}")
+    if path is not None:
+        return connect_duckdb(), path
+    return connect_duckdb(endpoint_url=endpoint_url, access_key=access_key, secret_key=secret_key), path
 
-def create_heatmap(df):
-    """Criar um mapa de calor baseado nos acidentes."""
-    logger.info("Criando mapa de calor com os dados de acidentes...")
-    df['geometry'] = df.apply(lambda row: Point(row['longitude'], row['latitude']), axis=1)
+def iter_hotspot_points(backend="summary", partitioned=False, filters=None):
+    """Coordenadas e vítimas de cada acidente em chunks, do Parquet da Silver (duckdb) ou da acidentes_silver."""
+    if backend == "duckdb":
+        con, path = connect_silver_parquet(partitioned)
+        try:
+            yield from iter_columns_duckdb(con, HOTSPOT_COLUMNS, partitioned=partitioned, filters=filters, path=path)
+        finally:
+            con.close()
+    else:
+        yield from iter_chunks(HOTSPOT_COLUMNS)
+
+def detect_hotspots(backend="summary", partitioned=False, filters=None):
+    """
+    Detectar e ranquear os pontos críticos e gravá-los no MySQL (gold_hotspots) e em
+    Parquet. Os acidentes são lidos e agregados por célula chunk a chunk, então a
+    memória não cresce com o tamanho da acidentes_silver.
+    """
+    accumulator = HotspotAccumulator(bounds=BRAZIL_BOUNDS)
+    for chunk in iter_hotspot_points(backend, partitioned, filters):
+        contar("pontos_hotspots", len(chunk))
+        accumulator.add(chunk)
+    hotspots = accumulator.result()
+    conn = connect_to_db()
+    try:
+        write_hotspots_mysql(conn, hotspots)
+    finally:
+        conn.close()
+    write_hotspots_parquet(hotspots)
+    if not hotspots.empty:
+        worst = hotspots.iloc[0]
+        logger.info(
+            f"Ponto crítico mais grave: {worst['uf']} BR-{worst['br']} km {worst['km_inicio']}-{worst['km_fim']} "
+            f"({worst['acidentes']} acidentes, {worst['mortos']} mortos)."
+        )
+    return hotspots
+
+def fetch_heatmap_cells(resolution=HEATMAP_RESOLUTION):
+    """Agregar as coordenadas em células de grade direto no MySQL (só as células são transferidas)."""
+    logger.info(f"Agregando coordenadas em células de {resolution}° no banco de dados...")
+    conn = connect_to_db()
+    query = """
+    SELECT (FLOOR(latitude / %(res)s) + 0.5) * %(res)s AS latitude,
+           (FLOOR(longitude / %(res)s) + 0.5) * %(res)s AS longitude,
+           COUNT(*) AS weight
+    FROM acidentes_silver
+    WHERE latitude BETWEEN %(lat_min)s AND %(lat_max)s
+      AND longitude BETWEEN %(lon_min)s AND %(lon_max)s
+    GROUP BY FLOOR(latitude / %(res)s), FLOOR(longitude / %(res)s)
+    """
+    cells = pd.read_sql(query, conn, params=dict(BRAZIL_BOUNDS, res=resolution))
+    conn.close()
+    logger.info(f"{len(cells)} células carregadas para o mapa de calor.")
+    return cells
+
+def render_heatmap(cells, path):
+    """Criar um mapa de calor a partir das células agregadas (latitude, longitude, weight)."""
     mapa = folium.Map(location=[-15.7801, -47.9292], zoom_start=5)
-    heat_data = [[row['latitude'], row['longitude']] for _, row in df.iterrows()]
+    weights = cells["weight"].to_numpy(dtype=float)
+    if len(weights):
+        weights = weights / weights.max()
+    heat_data = np.column_stack([cells["latitude"].to_numpy(dtype=float), cells["longitude"].to_numpy(dtype=float), weights]).tolist()
     HeatMap(heat_data).add_to(mapa)
-    mapa_path = "/opt/airflow/data/heatmap_acidentes.html"
-    mapa.save(mapa_path)
-    logger.info(f"Mapa de calor salvo em '{mapa_path}'.")
-    return mapa_path
+    mapa.save(path)
 
-def create_graphs(analysis_results):
-    """Criar gráficos com base nas análises e salvar como imagens."""
-    output_dir = "/opt/airflow/data/graphs"
-    os.makedirs(output_dir, exist_ok=True)
+def plot_heatmap(cells, path):
+    """Imagem estática do mapa de calor para o PDF (o fpdf não lê o HTML do folium)."""
+    plt.figure(figsize=(10, 10))
+    if len(cells):
+        weights = np.log1p(cells["weight"].to_numpy(dtype=float))
+        plt.scatter(cells["longitude"], cells["latitude"], c=weights, s=2, cmap="hot_r", marker="s", linewidths=0)
+        plt.colorbar(label="log(1 + acidentes)", shrink=0.6)
+    plt.xlim(BRAZIL_BOUNDS["lon_min"], BRAZIL_BOUNDS["lon_max"])
+    plt.ylim(BRAZIL_BOUNDS["lat_min"], BRAZIL_BOUNDS["lat_max"])
+    plt.gca().set_aspect("equal")
+    plt.title("Mapa de Calor de Acidentes")
+    plt.xlabel("Longitude")
+    plt.ylabel("Latitude")
+    plt.tight_layout()
+    plt.savefig(path)
+    plt.close()
 
-    # Gráfico de acidentes por tipo de dia (Pizza)
+def plot_tipo_dia(acidentes_dia_semana, path):
+    """Gráfico de acidentes por tipo de dia (Pizza)."""
     plt.figure(figsize=(8, 6))
-    analysis_results['acidentes_dia_semana'].plot(kind='pie', autopct='%1.1f%%', startangle=90, colors=['blue', 'orange'])
+    acidentes_dia_semana.plot(kind='pie', autopct='%1.1f%%', startangle=90, colors=['blue', 'orange'])
     plt.title("Acidentes por Tipo de Dia")
     plt.ylabel("")  # Remove o label desnecessário
-    dia_path = os.path.join(output_dir, "acidentes_tipo_dia.png")
-    plt.savefig(dia_path)
-    logger.info(f"Gráfico de acidentes por tipo de dia salvo em '{dia_path}'")
+    plt.savefig(path)
     plt.close()
 
-    # Gráfico de óbitos e acidentes por estado (Barras agrupadas)
+def plot_obitos_estado(obitos_por_estado, path):
+    """Gráfico de óbitos e acidentes por estado (Barras agrupadas)."""
     plt.figure(figsize=(10, 8))
-    analysis_results['obitos_por_estado'].plot(kind='bar', width=0.8)
+    obitos_por_estado.plot(kind='bar', width=0.8)
     plt.title("Óbitos e Acidentes por Estado")
     plt.xlabel("Estado")
     plt.ylabel("Quantidade")
     plt.tight_layout()
-    estado_path = os.path.join(output_dir, "obitos_acidentes_estado.png")
-    plt.savefig(estado_path)
-    logger.info(f"Gráfico de óbitos e acidentes por estado salvo em '{estado_path}'")
+    plt.savefig(path)
     plt.close()
 
-    # Gráfico de principais causas de acidentes (Barras verticais)
+def plot_principais_causas(principais_causas, path):
+    """Gráfico de principais causas de acidentes (Barras verticais)."""
     plt.figure(figsize=(10, 6))
-    analysis_results['principais_causas'].plot(kind='bar', color='red')
+    principais_causas.plot(kind='bar', color='red')
     plt.title("Principais Causas de Acidentes")
     plt.xlabel("Causa Principal")
     plt.ylabel("Número de Acidentes")
     plt.tight_layout()
-    causa_path = os.path.join(output_dir, "principais_causas.png")
-    plt.savefig(causa_path)
-    logger.info(f"Gráfico de principais causas salvo em '{causa_path}'")
+    plt.savefig(path)
     plt.close()
 
-    return [dia_path, estado_path, causa_path]
+def render_pdf(report, path):
+    generate_pdf_report(report["analysis_results"], report["graph_paths"], report["heatmap_path"], path)
 
-def generate_pdf_report(analysis_results, graph_paths, heatmap_path):
-    """Gerar relatório em PDF com os resultados das análises, gráficos e heatmap."""
-    pdf_path = "/opt/airflow/data/analise_acidentes.pdf"
+def create_artifacts(analysis_results, cells, graphs_dir=GRAPHS_DIR, heatmap_path=HEATMAP_PATH, pdf_path=PDF_PATH,
+                     cache_dir=CACHE_DIR):
+    """
+    Gerar gráficos, mapa de calor e relatório PDF. Gráficos e mapa são independentes
+    e renderizados em paralelo; cada artefato só é refeito se o agregado de entrada
+    mudou desde a última execução (ver artifacts.render_artifacts).
+    """
+    logger.info("Gerando gráficos e mapa de calor...")
+    graphs = {
+        "acidentes_tipo_dia": (plot_tipo_dia, analysis_results['acidentes_dia_semana'], os.path.join(graphs_dir, "acidentes_tipo_dia.png")),
+        "obitos_acidentes_estado": (plot_obitos_estado, analysis_results['obitos_por_estado'], os.path.join(graphs_dir, "obitos_acidentes_estado.png")),
+        "principais_causas": (plot_principais_causas, analysis_results['principais_causas'], os.path.join(graphs_dir, "principais_causas.png")),
+    }
+    entries = render_artifacts(dict(
+        graphs,
+        heatmap=(render_heatmap, cells, heatmap_path),
+        heatmap_imagem=(plot_heatmap, cells, os.path.join(graphs_dir, HEATMAP_IMAGE_NAME)),
+    ), cache_dir)
+    for name, entry in entries.items():
+        logger.info(f"Artefato '{name}' salvo em '{entry['output_path']}' ({entry['bytes']} bytes).")
+
+    report = {
+        "analysis_results": analysis_results,
+        "graph_paths": [entries[name]["output_path"] for name in graphs],
+        "heatmap_path": entries["heatmap_imagem"]["output_path"],
+        "inputs": {name: entry["hash"] for name, entry in entries.items()},
+    }
+    render_artifacts({"relatorio_pdf": (render_pdf, report, pdf_path)}, cache_dir)
+    logger.info(f"Relatório PDF gerado em '{pdf_path}'.")
+    return pdf_path
+
+def generate_pdf_report(analysis_results, graph_paths, heatmap_path, pdf_path=PDF_PATH):
+    """Gerar relatório em PDF com os resultados das análises, gráficos e heatmap (imagem PNG)."""
     logger.info("Gerando relatório PDF com os resultados das análises e gráficos...")
     pdf = FPDF()
     pdf.add_page()
@@ -164,20 +350,42 @@ def generate_pdf_report(analysis_results, graph_paths, heatmap_path):
     pdf.image(heatmap_path, x=10, y=30, w=190)
 
     pdf.output(pdf_path)
-    logger.info(f"Relatório PDF gerado em '{pdf_path}'.")
 
-def main():
-    """Pipeline da camada Gold."""
-    logger.info("Iniciando a camada Gold...")
-    try:
-        df = fetch_data()
-        analysis_results = analyze_data(df)
-        heatmap_path = create_heatmap(df)
-        graph_paths = create_graphs(analysis_results)
-        generate_pdf_report(analysis_results, graph_paths, heatmap_path)
-        logger.info("Camada Gold concluída com sucesso!")
-    except Exception as e:
-        logger.error(f"Erro na execução da camada Gold: {e}")
+def main(backend="summary", partitioned=False, filters=None, hotspots=True):
+    """
+    Pipeline da camada Gold.
+
+    backend="summary" consulta as tabelas de resumo no MySQL; backend="streaming" lê a
+    acidentes_silver em chunks e agrega incrementalmente; backend="duckdb" lê o
+    Parquet da Silver no MinIO (partitioned=True para o layout ano/mes/uf, com filtros
+    opcionais como {"ano": 2024} que descartam partições inteiras).
+
+    Com hotspots=True os pontos críticos (ver hotspots.py) são recalculados a partir da
+    mesma fonte de dados.
+    """
+    logger.info(f"Iniciando a camada Gold (backend {backend})...")
+    with sessao("gold"):
+        try:
+            with etapa("analise", backend=backend):
+                if backend == "duckdb":
+                    analysis_results, cells = analyze_parquet(partitioned=partitioned, filters=filters)
+                elif backend == "streaming":
+                    analysis_results = analyze_streaming()
+                    cells = fetch_heatmap_cells()
+                elif backend == "summary":
+                    analysis_results = analyze_data()
+                    cells = fetch_heatmap_cells()
+                else:
+                    raise ValueError(f"Backend da camada Gold desconhecido: {backend}")
+            with etapa("artefatos", celulas=len(cells)):
+                create_artifacts(analysis_results, cells)
+            if hotspots:
+                with etapa("hotspots"):
+                    detect_hotspots(backend, partitioned, filters)
+            logger.info("Camada Gold concluída com sucesso!")
+        except Exception as e:
+            logger.error(f"Erro na execução da camada Gold: {e}")
+            raise
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,352 @@
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+# Colunas da Silver usadas na detecção de pontos críticos
+HOTSPOT_COLUMNS = ["id", "latitude", "longitude", "uf", "br", "km", "mortos", "feridos_graves", "feridos_leves", "tipo_acidente"]
+
+HOTSPOTS_TABLE = "gold_hotspots"
+HOTSPOTS_PATH = "/opt/airflow/data/hotspots.parquet"
+
+# Lado da célula da grade (metros): vizinhos a até ~1 célula entram no mesmo ponto crítico
+CELL_SIZE_M = 1000
+
+# Acidentes na vizinhança 3x3 de uma célula para ela ser núcleo de um ponto crítico
+MIN_ACCIDENTS = 10
+
+# Pesos de severidade por acidente (Unidade Padrão de Severidade do DNIT)
+SEVERITY_WEIGHTS = {"fatal": 13, "pedestrian": 6, "injury": 4, "property": 1}
+PEDESTRIAN_TYPE = "Atropelamento de Pedestre"
+
+METERS_PER_DEGREE_LAT = 110_574
+METERS_PER_DEGREE_LON = 111_320
+
+# Codificação (ix, iy) -> inteiro único de 64 bits
+_OFFSET = 2 ** 30
+_SPAN = 2 ** 31
+
+NEIGHBOR_OFFSETS = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if (dx, dy) != (0, 0)]
+
+INSERT_BATCH = 1000
+
+HOTSPOTS_DDL = f"""
+CREATE TABLE IF NOT EXISTS {HOTSPOTS_TABLE} (
+    ranking INT NOT NULL PRIMARY KEY,
+    uf CHAR(2) NULL,
+    br SMALLINT NULL,
+    km_inicio DOUBLE NULL,
+    km_fim DOUBLE NULL,
+    latitude DOUBLE NOT NULL,
+    longitude DOUBLE NOT NULL,
+    raio_m DOUBLE NOT NULL,
+    acidentes INT NOT NULL,
+    mortos INT NOT NULL,
+    feridos_graves INT NOT NULL,
+    feridos_leves INT NOT NULL,
+    severidade INT NOT NULL,
+    celulas INT NOT NULL,
+    KEY idx_uf_br (uf, br)
+);
+"""
+
+def severity(df):
+    """Peso de severidade de cada acidente: mortos > atropelamento > feridos > só danos."""
+    mortos = df["mortos"].fillna(0).to_numpy()
+    feridos = (df["feridos_graves"].fillna(0) + df["feridos_leves"].fillna(0)).to_numpy()
+    pedestrian = (
+        (df["tipo_acidente"].astype(object) == PEDESTRIAN_TYPE).to_numpy()
+        if "tipo_acidente" in df else np.zeros(len(df), dtype=bool)
+    )
+    return np.select(
+        [mortos > 0, pedestrian, feridos > 0],
+        [SEVERITY_WEIGHTS["fatal"], SEVERITY_WEIGHTS["pedestrian"], SEVERITY_WEIGHTS["injury"]],
+        default=SEVERITY_WEIGHTS["property"],
+    ).astype(np.int32)
+
+def project(latitude, longitude):
+    """Projeção equirretangular local em metros (distorção desprezível na escala de 1 km)."""
+    lat = np.asarray(latitude, dtype=float)
+    lon = np.asarray(longitude, dtype=float)
+    return lon * METERS_PER_DEGREE_LON * np.cos(np.radians(lat)), lat * METERS_PER_DEGREE_LAT
+
+def _encode(ix, iy):
+    return (ix + _OFFSET) * _SPAN + (iy + _OFFSET)
+
+class GridIndex:
+    """
+    Índice espacial em grade: cada ponto pertence a uma célula de cell_size metros e as
+    células ocupadas ficam em um vetor ordenado de chaves. Consultar a célula vizinha de
+    todas as células é uma busca binária vetorizada (O(c log c) para c células), então
+    nenhuma comparação entre pares de pontos é feita.
+    """
+
+    def __init__(self, x, y, cell_size=CELL_SIZE_M):
+        ix = np.floor(x / cell_size).astype(np.int64)
+        iy = np.floor(y / cell_size).astype(np.int64)
+        self.cell_size = cell_size
+        self.cells, self.point_cell = np.unique(_encode(ix, iy), return_inverse=True)
+        self.cell_ix = self.cells // _SPAN - _OFFSET
+        self.cell_iy = self.cells % _SPAN - _OFFSET
+
+    @classmethod
+    def from_cells(cls, cells, cell_size=CELL_SIZE_M):
+        """Índice a partir das chaves de células já calculadas (ordenadas e sem repetição)."""
+        index = cls.__new__(cls)
+        index.cell_size = cell_size
+        index.cells = np.asarray(cells, dtype=np.int64)
+        index.point_cell = np.arange(len(index.cells))
+        index.cell_ix = index.cells // _SPAN - _OFFSET
+        index.cell_iy = index.cells % _SPAN - _OFFSET
+        return index
+
+    def __len__(self):
+        return len(self.cells)
+
+    def neighbor(self, dx, dy):
+        """Índice da célula deslocada de (dx, dy) para cada célula ocupada, ou -1 se vazia."""
+        keys = _encode(self.cell_ix + dx, self.cell_iy + dy)
+        positions = np.minimum(np.searchsorted(self.cells, keys), len(self.cells) - 1)
+        return np.where(self.cells[positions] == keys, positions, -1)
+
+def cluster_cells(index, counts, min_accidents=MIN_ACCIDENTS):
+    """
+    Agrupamento por densidade (DBSCAN sobre as células da grade): uma célula é núcleo
+    se a vizinhança 3x3 soma pelo menos min_accidents acidentes; núcleos vizinhos
+    formam um ponto crítico (componentes conexas) e células ocupadas encostadas em um
+    núcleo entram como borda. As demais ficam como ruído (-1).
+    """
+    neighbors = [index.neighbor(dx, dy) for dx, dy in NEIGHBOR_OFFSETS]
+    density = counts + sum(np.where(nb >= 0, counts[nb], 0) for nb in neighbors)
+    core = density >= min_accidents
+
+    # Componentes conexas dos núcleos: propagação do menor rótulo com salto de ponteiros
+    src, dst = [], []
+    for nb in neighbors:
+        edge = core & (nb >= 0)
+        edge[edge] = core[nb[edge]]
+        src.append(np.flatnonzero(edge))
+        dst.append(nb[edge])
+    src, dst = np.concatenate(src), np.concatenate(dst)
+    labels = np.arange(len(index))
+    while True:
+        updated = labels.copy()
+        np.minimum.at(updated, src, labels[dst])
+        updated = updated[updated]
+        if np.array_equal(updated, labels):
+            break
+        labels = updated
+
+    # Bordas: o menor rótulo entre os núcleos vizinhos
+    border = np.full(len(index), np.iinfo(np.int64).max)
+    for nb in neighbors:
+        touches_core = ~core & (nb >= 0)
+        touches_core[touches_core] = core[nb[touches_core]]
+        border[touches_core] = np.minimum(border[touches_core], labels[nb[touches_core]])
+
+    cell_labels = np.where(core, labels, np.where(border != np.iinfo(np.int64).max, border, -1))
+    clustered = cell_labels >= 0
+    cell_labels[clustered] = np.unique(cell_labels[clustered], return_inverse=True)[1]
+    return cell_labels
+
+def _combine(frames, keys, aggregations):
+    """Somar (ou tomar mín./máx. de) agregados parciais com as mesmas chaves."""
+    return pd.concat(frames, ignore_index=True).groupby(keys, observed=True, sort=True).agg(aggregations).reset_index()
+
+def _dominant(counts, column):
+    """Valor mais frequente de column em cada ponto crítico, a partir das contagens por célula."""
+    sizes = counts.groupby(["cluster", column], observed=True)["n"].sum()
+    sizes = sizes.reset_index().sort_values("n", ascending=False, kind="stable")
+    return sizes.drop_duplicates("cluster").set_index("cluster")[column]
+
+class HotspotAccumulator:
+    """
+    Detecção de pontos críticos alimentada em chunks. Cada chunk é reduzido a agregados
+    por célula da grade (acidentes, somas de vítimas/severidade/coordenadas, caixa
+    envolvente dos pontos, contagens por UF e por BR com a faixa de km), e os chunks
+    seguintes só atualizam esses agregados: a memória depende do número de células
+    ocupadas, não do número de acidentes.
+
+    O id é a chave primária da Silver, então um acidente não se repete entre chunks;
+    dentro de um chunk (ex.: uma linha por pessoa) só a primeira linha de cada id conta.
+    """
+
+    # Agregados parciais acumulados antes de uma consolidação
+    COMPACT_EVERY = 16
+
+    CELL_AGGREGATIONS = {
+        "acidentes": "sum", "mortos": "sum", "feridos_graves": "sum", "feridos_leves": "sum",
+        "severidade": "sum", "x": "sum", "y": "sum", "latitude": "sum", "longitude": "sum",
+        "x_min": "min", "x_max": "max", "y_min": "min", "y_max": "max",
+    }
+    UF_AGGREGATIONS = {"n": "sum"}
+    BR_AGGREGATIONS = {"n": "sum", "km_min": "min", "km_max": "max"}
+
+    def __init__(self, bounds=None, cell_size=CELL_SIZE_M):
+        self.bounds = bounds
+        self.cell_size = cell_size
+        self.points = 0
+        self._cells, self._ufs, self._brs = [], [], []
+
+    def add(self, df):
+        """Incorporar um chunk com as colunas de HOTSPOT_COLUMNS."""
+        if "id" in df:
+            df = df.drop_duplicates("id")
+        lat = pd.to_numeric(df["latitude"], errors="coerce").to_numpy(dtype=float)
+        lon = pd.to_numeric(df["longitude"], errors="coerce").to_numpy(dtype=float)
+        valid = np.isfinite(lat) & np.isfinite(lon)
+        if self.bounds is not None:
+            valid &= (
+                (lat >= self.bounds["lat_min"]) & (lat <= self.bounds["lat_max"])
+                & (lon >= self.bounds["lon_min"]) & (lon <= self.bounds["lon_max"])
+            )
+        df = df.loc[valid]
+        lat, lon = lat[valid], lon[valid]
+        if len(df) == 0:
+            return
+        self.points += len(df)
+
+        x, y = project(lat, lon)
+        cell = _encode(np.floor(x / self.cell_size).astype(np.int64), np.floor(y / self.cell_size).astype(np.int64))
+        points = pd.DataFrame({
+            "celula": cell,
+            "acidentes": 1,
+            "mortos": df["mortos"].fillna(0).to_numpy(),
+            "feridos_graves": df["feridos_graves"].fillna(0).to_numpy(),
+            "feridos_leves": df["feridos_leves"].fillna(0).to_numpy(),
+            "severidade": severity(df),
+            "x": x, "y": y, "latitude": lat, "longitude": lon,
+            "x_min": x, "x_max": x, "y_min": y, "y_max": y,
+        })
+        self._cells.append(points.groupby("celula", sort=True).agg(self.CELL_AGGREGATIONS).reset_index())
+
+        ufs = pd.DataFrame({"celula": cell, "uf": df["uf"].astype(object).to_numpy(), "n": 1}).dropna(subset=["uf"])
+        self._ufs.append(ufs.groupby(["celula", "uf"], sort=True).agg(self.UF_AGGREGATIONS).reset_index())
+
+        km = pd.to_numeric(df["km"], errors="coerce").to_numpy()
+        brs = pd.DataFrame({
+            "celula": cell, "br": pd.to_numeric(df["br"], errors="coerce").to_numpy(), "n": 1,
+            "km_min": km, "km_max": km,
+        }).dropna(subset=["br"])
+        self._brs.append(brs.groupby(["celula", "br"], sort=True).agg(self.BR_AGGREGATIONS).reset_index())
+
+        if len(self._cells) >= self.COMPACT_EVERY:
+            self._compact()
+
+    def _compact(self):
+        if self._cells:
+            self._cells = [_combine(self._cells, ["celula"], self.CELL_AGGREGATIONS)]
+            self._ufs = [_combine(self._ufs, ["celula", "uf"], self.UF_AGGREGATIONS)]
+            self._brs = [_combine(self._brs, ["celula", "br"], self.BR_AGGREGATIONS)]
+
+    def result(self, min_accidents=MIN_ACCIDENTS, top=None):
+        """
+        Pontos críticos, ordenados pela severidade acumulada (e pelos mortos), com as
+        colunas da tabela gold_hotspots. raio_m é a maior distância do centro do ponto
+        crítico à caixa envolvente dos acidentes de cada célula (limite superior da
+        distância ao acidente mais afastado, no máximo a diagonal de uma célula acima).
+        """
+        logger.info(f"Detectando pontos críticos em {self.points} acidentes com coordenadas válidas...")
+        if not self._cells:
+            return pd.DataFrame(columns=_columns())
+        self._compact()
+        cells, ufs, brs = self._cells[0], self._ufs[0], self._brs[0]
+
+        index = GridIndex.from_cells(cells["celula"].to_numpy(), self.cell_size)
+        cell_labels = cluster_cells(index, cells["acidentes"].to_numpy(), min_accidents)
+        logger.info(f"Grade de {len(index)} células ocupadas; {cell_labels.max() + 1} ponto(s) crítico(s) encontrado(s).")
+
+        cells = cells.assign(cluster=cell_labels)
+        cells = cells[cells["cluster"] >= 0]
+        if cells.empty:
+            return pd.DataFrame(columns=_columns())
+
+        hotspots = cells.groupby("cluster").agg(
+            acidentes=("acidentes", "sum"),
+            mortos=("mortos", "sum"),
+            feridos_graves=("feridos_graves", "sum"),
+            feridos_leves=("feridos_leves", "sum"),
+            severidade=("severidade", "sum"),
+            x=("x", "sum"),
+            y=("y", "sum"),
+            latitude=("latitude", "sum"),
+            longitude=("longitude", "sum"),
+            celulas=("celula", "size"),
+        )
+        for column in ("x", "y", "latitude", "longitude"):
+            hotspots[column] = hotspots[column] / hotspots["acidentes"]
+
+        cx = hotspots["x"].reindex(cells["cluster"]).to_numpy()
+        cy = hotspots["y"].reindex(cells["cluster"]).to_numpy()
+        far_x = np.maximum(np.abs(cells["x_min"].to_numpy() - cx), np.abs(cells["x_max"].to_numpy() - cx))
+        far_y = np.maximum(np.abs(cells["y_min"].to_numpy() - cy), np.abs(cells["y_max"].to_numpy() - cy))
+        hotspots["raio_m"] = pd.Series(np.hypot(far_x, far_y)).groupby(cells["cluster"].to_numpy()).max()
+
+        labels = pd.Series(cell_labels, index=index.cells)
+        ufs = ufs.assign(cluster=labels.reindex(ufs["celula"]).to_numpy())
+        brs = brs.assign(cluster=labels.reindex(brs["celula"]).to_numpy())
+        ufs, brs = ufs[ufs["cluster"] >= 0], brs[brs["cluster"] >= 0]
+        hotspots["uf"] = _dominant(ufs, "uf")
+        hotspots["br"] = _dominant(brs, "br")
+
+        # Trecho (km inicial e final) na BR predominante do ponto crítico
+        on_road = brs[brs["br"].to_numpy() == hotspots["br"].reindex(brs["cluster"]).to_numpy()]
+        km = on_road.groupby("cluster").agg(km_inicio=("km_min", "min"), km_fim=("km_max", "max"))
+        hotspots["km_inicio"] = km["km_inicio"]
+        hotspots["km_fim"] = km["km_fim"]
+
+        hotspots = hotspots.sort_values(["severidade", "mortos", "acidentes"], ascending=False, kind="stable")
+        if top is not None:
+            hotspots = hotspots.head(top)
+        hotspots["ranking"] = np.arange(1, len(hotspots) + 1)
+        return hotspots.reset_index(drop=True)[_columns()]
+
+def find_hotspots(df, bounds=None, cell_size=CELL_SIZE_M, min_accidents=MIN_ACCIDENTS, top=None):
+    """
+    Pontos críticos de acidentes, ordenados pela severidade acumulada (e pelos mortos).
+
+    df traz uma linha por acidente ou por pessoa (com id repetido; só a primeira linha
+    de cada acidente é usada) com as colunas de HOTSPOT_COLUMNS. bounds descarta
+    coordenadas fora da área (ex.: gold.BRAZIL_BOUNDS). Para dados que não cabem em
+    memória, alimente um HotspotAccumulator chunk a chunk.
+
+    Retorna um DataFrame com as colunas da tabela gold_hotspots.
+    """
+    accumulator = HotspotAccumulator(bounds, cell_size)
+    accumulator.add(df)
+    return accumulator.result(min_accidents, top)
+
+def _columns():
+    return [
+        "ranking", "uf", "br", "km_inicio", "km_fim", "latitude", "longitude", "raio_m",
+        "acidentes", "mortos", "feridos_graves", "feridos_leves", "severidade", "celulas",
+    ]
+
+def _sql_value(value):
+    return None if pd.isna(value) else value.item() if isinstance(value, np.generic) else value
+
+def write_hotspots_mysql(conn, hotspots):
+    """Substituir o conteúdo da tabela gold_hotspots pelo ranking atual (uma transação)."""
+    columns = _columns()
+    insert = f"INSERT INTO {HOTSPOTS_TABLE} ({', '.join(columns)}) VALUES ({', '.join(['%s'] * len(columns))})"
+    rows = [tuple(_sql_value(value) for value in row) for row in hotspots[columns].itertuples(index=False)]
+    with conn.cursor() as cursor:
+        cursor.execute(HOTSPOTS_DDL)
+        cursor.execute(f"DELETE FROM {HOTSPOTS_TABLE}")
+        for start in range(0, len(rows), INSERT_BATCH):
+            cursor.executemany(insert, rows[start:start + INSERT_BATCH])
+    conn.commit()
+    logger.info(f"{len(rows)} ponto(s) crítico(s) gravado(s) na tabela {HOTSPOTS_TABLE}.")
+
+def write_hotspots_parquet(hotspots, path=HOTSPOTS_PATH):
+    """Gravar o ranking em Parquet de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    pq.write_table(pa.Table.from_pandas(hotspots, preserve_index=False), tmp_path)
+    os.replace(tmp_path, path)
+    logger.info(f"Pontos críticos gravados em {path}.")
@@ -0,0 +1,306 @@
+import contextlib
+import fcntl
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import psutil
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from esquema_bronze import ler_csv_em_lotes
+from instrumentacao import contar, etapa
+from particionamento import ARQUIVOS_ABERTOS_MAX, MEMORIA_POR_ARQUIVO_ABERTO_MB, criar_filesystem_s3, escrever_particionado
+from upload_minio import EscritorMultipartS3, criar_cliente_s3
+
+logger = logging.getLogger(__name__)
+
+# Arquivos anuais publicados pela PRF: acidentes_AAAA.csv, opcionalmente compactados
+PADRAO_ARQUIVO = re.compile(r'^acidentes_(\d{4})\.csv(\.zip|\.gz)?$', re.IGNORECASE)
+
+# Manifesto com a impressão digital de cada ano já convertido
+MANIFESTO_PADRAO = "/opt/airflow/data/cache/bronze/manifesto_ingestao.json"
+
+# Estimativa de memória de um processo de conversão: base do interpretador + bibliotecas
+# e alguns blocos do leitor CSV em voo (leitura, conversão e row group sendo gravado)
+MEMORIA_BASE_PROCESSO_MB = 256
+BLOCOS_EM_MEMORIA = 6
+
+# Fração da memória disponível usada quando nenhum orçamento é informado
+FRACAO_MEMORIA_DISPONIVEL = 0.5
+
+TAMANHO_LEITURA_HASH = 8 * 1024 * 1024
+
+def abrir_origem(origem, endpoint_url=None, access_key=None, secret_key=None):
+    """
+    Filesystem do pyarrow e caminho base de uma origem: um diretório local ou
+    s3://bucket/prefixo no MinIO.
+    """
+    if origem.startswith("s3://"):
+        return criar_filesystem_s3(endpoint_url, access_key, secret_key), origem[len("s3://"):].rstrip("/")
+    return fs.LocalFileSystem(), os.path.abspath(origem)
+
+def descobrir_arquivos(filesystem, base):
+    """
+    Lista os acidentes_AAAA.csv[.zip|.gz] da origem, um por ano. Se houver mais de um
+    arquivo para o mesmo ano (ex.: .csv e .zip), fica o modificado mais recentemente.
+    """
+    arquivos = {}
+    for info in filesystem.get_file_info(fs.FileSelector(base, recursive=False)):
+        correspondencia = PADRAO_ARQUIVO.match(info.base_name)
+        if info.type != fs.FileType.File or not correspondencia:
+            continue
+        ano = int(correspondencia.group(1))
+        arquivo = {
+            'ano': ano,
+            'caminho': info.path,
+            'tamanho': info.size,
+            'mtime': info.mtime.timestamp() if info.mtime else None,
+        }
+        anterior = arquivos.get(ano)
+        if anterior is not None:
+            logger.warning(f"Mais de um arquivo para {ano}: {anterior['caminho']} e {info.path}.")
+            if (anterior['mtime'] or 0) >= (arquivo['mtime'] or 0):
+                continue
+        arquivos[ano] = arquivo
+    return [arquivos[ano] for ano in sorted(arquivos)]
+
+def abrir_csv(filesystem, caminho):
+    """
+    Fluxo binário com o conteúdo do CSV, descompactado em streaming: nada é extraído
+    para o disco. Um .zip deve conter um único .csv.
+    """
+    extensao = os.path.splitext(caminho)[1].lower()
+    if extensao == '.zip':
+        arquivo_zip = zipfile.ZipFile(filesystem.open_input_file(caminho))
+        membros = [membro for membro in arquivo_zip.namelist() if membro.lower().endswith('.csv')]
+        if len(membros) != 1:
+            arquivo_zip.close()
+            raise ValueError(f"O arquivo {caminho} deve conter exatamente um CSV, encontrados: {membros}")
+        return arquivo_zip.open(membros[0])
+    if extensao == '.gz':
+        return gzip.GzipFile(fileobj=filesystem.open_input_stream(caminho, compression=None), mode='rb')
+    return filesystem.open_input_stream(caminho, compression=None)
+
+def hash_arquivo(filesystem, caminho):
+    """SHA-256 do arquivo como está na origem (compactado, se for o caso)."""
+    digest = hashlib.sha256()
+    with filesystem.open_input_stream(caminho, compression=None) as arquivo:
+        while True:
+            dados = arquivo.read(TAMANHO_LEITURA_HASH)
+            if not dados:
+                break
+            digest.update(dados)
+    return digest.hexdigest()
+
+def carregar_manifesto(caminho_manifesto):
+    if not os.path.exists(caminho_manifesto):
+        return {}
+    with open(caminho_manifesto, encoding="utf-8") as arquivo:
+        return json.load(arquivo)
+
+def salvar_manifesto(manifesto, caminho_manifesto):
+    """Gravar o manifesto de forma atômica (arquivo temporário + rename)."""
+    os.makedirs(os.path.dirname(caminho_manifesto) or ".", exist_ok=True)
+    caminho_temporario = f"{caminho_manifesto}.tmp-{os.getpid()}"
+    with open(caminho_temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(manifesto, arquivo, indent=2, sort_keys=True)
+    os.replace(caminho_temporario, caminho_manifesto)
+
+@contextlib.contextmanager
+def _trava_manifesto(caminho_manifesto):
+    os.makedirs(os.path.dirname(caminho_manifesto) or ".", exist_ok=True)
+    with open(f"{caminho_manifesto}.lock", "w") as trava:
+        fcntl.flock(trava, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(trava, fcntl.LOCK_UN)
+
+def atualizar_manifesto(caminho_manifesto, ano, entrada):
+    """
+    Registrar um ano no manifesto relendo-o sob uma trava de arquivo: tasks paralelas
+    (um ano cada) não sobrescrevem os anos registrados pelas outras.
+    """
+    with _trava_manifesto(caminho_manifesto):
+        manifesto = carregar_manifesto(caminho_manifesto)
+        manifesto[str(ano)] = entrada
+        salvar_manifesto(manifesto, caminho_manifesto)
+
+def _mesma_versao(arquivo, entrada, destino):
+    """Tamanho, mtime e destino iguais aos do manifesto: o ano não mudou (sem ler o arquivo)."""
+    return (
+        entrada is not None
+        and entrada.get('destino') == destino
+        and entrada.get('tamanho') == arquivo['tamanho']
+        and entrada.get('mtime') == arquivo['mtime']
+    )
+
+def arquivos_pendentes(origem, particionado=True, caminho_manifesto=MANIFESTO_PADRAO,
+                       endpoint_url=None, access_key=None, secret_key=None):
+    """
+    Arquivos da origem cujo tamanho/mtime difere do manifesto (sem ler o conteúdo),
+    e o total de arquivos encontrados. Usado para mapear uma task por ano pendente.
+    """
+    filesystem, base = abrir_origem(origem, endpoint_url, access_key, secret_key)
+    arquivos = descobrir_arquivos(filesystem, base)
+    destino = 'particionado' if particionado else 'objeto_anual'
+    manifesto = carregar_manifesto(caminho_manifesto)
+    pendentes = [arquivo for arquivo in arquivos if not _mesma_versao(arquivo, manifesto.get(str(arquivo['ano'])), destino)]
+    return pendentes, len(arquivos)
+
+def dimensionar_pool(quantidade_arquivos, tamanho_bloco, orcamento_memoria_mb=None, max_processos=None,
+                     particionado=False):
+    """
+    Número de processos de conversão: limitado pelos arquivos pendentes, pelas CPUs e
+    pelo orçamento de memória (por padrão, metade da memória disponível no momento).
+    Na escrita particionada cada processo também mantém os buffers dos arquivos abertos.
+    """
+    if orcamento_memoria_mb is None:
+        orcamento_memoria_mb = psutil.virtual_memory().available / (1024 * 1024) * FRACAO_MEMORIA_DISPONIVEL
+    memoria_por_processo_mb = MEMORIA_BASE_PROCESSO_MB + BLOCOS_EM_MEMORIA * tamanho_bloco / (1024 * 1024)
+    if particionado:
+        memoria_por_processo_mb += ARQUIVOS_ABERTOS_MAX * MEMORIA_POR_ARQUIVO_ABERTO_MB
+    por_memoria = max(1, int(orcamento_memoria_mb // memoria_por_processo_mb))
+    processos = min(quantidade_arquivos, max_processos or os.cpu_count() or 1, por_memoria)
+    logger.info(
+        f"Pool de conversão: {processos} processo(s) para {quantidade_arquivos} arquivo(s) "
+        f"(~{memoria_por_processo_mb:.0f} MB por processo, orçamento de {orcamento_memoria_mb:.0f} MB)."
+    )
+    return max(1, processos)
+
+def converter_arquivo(arquivo, origem, destino, bucket_name, endpoint_url, access_key, secret_key,
+                      hash_anterior=None, tamanho_bloco=16 * 1024 * 1024):
+    """
+    Converte um arquivo anual (executado em um processo do pool).
+
+    Calcula primeiro o hash do arquivo; se for igual ao do manifesto (o arquivo só foi
+    tocado), nada é convertido. Caso contrário o CSV é lido em streaming, direto do
+    .zip/.gz, e gravado em um único destino do ano: as partições ano=AAAA do dataset
+    particionado ou o objeto acidentes_AAAA.parquet.
+    """
+    inicio = time.monotonic()
+    filesystem_origem, _ = abrir_origem(origem, endpoint_url, access_key, secret_key)
+    resultado = dict(arquivo, sha256=hash_arquivo(filesystem_origem, arquivo['caminho']), destino=destino)
+    if resultado['sha256'] == hash_anterior:
+        return dict(resultado, status='inalterado', tempo_s=time.monotonic() - inicio)
+
+    ano = arquivo['ano']
+    linhas = 0
+    with abrir_csv(filesystem_origem, arquivo['caminho']) as fluxo:
+        schema, lotes = ler_csv_em_lotes(fluxo, tamanho_bloco)
+
+        def contar_linhas():
+            nonlocal linhas
+            for lote in lotes:
+                linhas += lote.num_rows
+                yield lote
+
+        if destino == 'particionado':
+            filesystem_destino = criar_filesystem_s3(endpoint_url, access_key, secret_key)
+            escrever_particionado(contar_linhas(), schema, f"{bucket_name}/acidentes", filesystem_destino,
+                                  prefixo_arquivo=f"acidentes_{ano}")
+            bytes_gravados = None
+        else:
+            s3_client = criar_cliente_s3(endpoint_url, access_key, secret_key)
+            with EscritorMultipartS3(s3_client, bucket_name, f"acidentes_{ano}.parquet") as objeto:
+                with pq.ParquetWriter(objeto, schema) as writer:
+                    for lote in contar_linhas():
+                        writer.write_batch(lote, row_group_size=lote.num_rows)
+                bytes_gravados = objeto.tell()
+
+    if linhas == 0:
+        raise ValueError(f"Nenhuma linha encontrada no arquivo CSV: {arquivo['caminho']}")
+    return dict(
+        resultado,
+        status='convertido',
+        linhas=linhas,
+        bytes_gravados=bytes_gravados,
+        tempo_s=time.monotonic() - inicio,
+        convertido_em=datetime.now(timezone.utc).isoformat(),
+    )
+
+def ingerir_arquivos(origem, bucket_name, endpoint_url, access_key, secret_key, particionado=True,
+                     caminho_manifesto=MANIFESTO_PADRAO, tamanho_bloco=16 * 1024 * 1024,
+                     orcamento_memoria_mb=None, max_processos=None, forcar=False, anos=None):
+    """
+    Ingestão de todos os anos encontrados na origem (diretório local ou s3://bucket/prefixo).
+
+    Anos cujo arquivo tem o mesmo tamanho e mtime registrados no manifesto são pulados
+    sem leitura; os demais são enviados ao pool, que confere o hash antes de converter.
+    O manifesto é atualizado a cada arquivo concluído, então uma falha em um ano não
+    faz os outros serem reprocessados na próxima execução.
+
+    anos limita a ingestão a esses anos (ex.: uma task por ano na DAG encadeada); o
+    manifesto é atualizado sob uma trava de arquivo, então execuções paralelas sobre
+    anos diferentes podem compartilhá-lo.
+
+    Retorna um dicionário ano -> resultado (status, linhas, tempo).
+    """
+    filesystem, base = abrir_origem(origem, endpoint_url, access_key, secret_key)
+    arquivos = descobrir_arquivos(filesystem, base)
+    if anos is not None:
+        arquivos = [arquivo for arquivo in arquivos if arquivo['ano'] in set(anos)]
+    if not arquivos:
+        raise FileNotFoundError(f"Nenhum arquivo acidentes_AAAA.csv[.zip|.gz] encontrado em {origem} (anos: {anos}).")
+    logger.info(f"{len(arquivos)} arquivo(s) encontrado(s) em {origem}: {[arquivo['caminho'] for arquivo in arquivos]}")
+
+    destino = 'particionado' if particionado else 'objeto_anual'
+    manifesto = {} if forcar else carregar_manifesto(caminho_manifesto)
+    resultados, pendentes = {}, []
+    for arquivo in arquivos:
+        entrada = manifesto.get(str(arquivo['ano']))
+        if _mesma_versao(arquivo, entrada, destino):
+            logger.info(f"Ano {arquivo['ano']} sem alterações desde {entrada.get('convertido_em')}; pulando.")
+            resultados[arquivo['ano']] = dict(entrada, status='inalterado')
+        else:
+            pendentes.append(arquivo)
+
+    falhas = {}
+    if pendentes:
+        processos = dimensionar_pool(len(pendentes), tamanho_bloco, orcamento_memoria_mb, max_processos, particionado)
+        with etapa('ingestao_paralela', arquivos=len(pendentes), processos=processos) as registro, \
+                ProcessPoolExecutor(max_workers=processos) as executor:
+            futuros = {}
+            for arquivo in pendentes:
+                entrada = manifesto.get(str(arquivo['ano']))
+                hash_anterior = entrada.get('sha256') if entrada and entrada.get('destino') == destino else None
+                futuro = executor.submit(
+                    converter_arquivo, arquivo, origem, destino, bucket_name, endpoint_url, access_key, secret_key,
+                    hash_anterior=hash_anterior, tamanho_bloco=tamanho_bloco,
+                )
+                futuros[futuro] = arquivo
+            for futuro in as_completed(futuros):
+                arquivo = futuros[futuro]
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    logger.error(f"Erro ao converter {arquivo['caminho']}: {e}")
+                    falhas[arquivo['ano']] = repr(e)
+                    continue
+                if resultado['status'] == 'inalterado':
+                    logger.info(f"Ano {arquivo['ano']}: conteúdo igual ao já convertido (só o mtime mudou).")
+                    resultado = dict(manifesto[str(arquivo['ano'])], mtime=resultado['mtime'], status='inalterado')
+                else:
+                    logger.info(f"Ano {arquivo['ano']}: {resultado['linhas']} linhas convertidas em {resultado['tempo_s']:.2f}s.")
+                    contar('linhas', resultado['linhas'])
+                    contar('bytes_lidos', resultado['tamanho'])
+                    if resultado['bytes_gravados']:
+                        contar('bytes_gravados', resultado['bytes_gravados'])
+                resultados[arquivo['ano']] = resultado
+                manifesto[str(arquivo['ano'])] = {chave: valor for chave, valor in resultado.items() if chave != 'status'}
+                atualizar_manifesto(caminho_manifesto, arquivo['ano'], manifesto[str(arquivo['ano'])])
+            registro['falhas'] = len(falhas)
+
+    convertidos = sorted(ano for ano, resultado in resultados.items() if resultado['status'] == 'convertido')
+    logger.info(f"Ingestão concluída: anos convertidos {convertidos}, {len(resultados) - len(convertidos)} sem alterações.")
+    if falhas:
+        raise RuntimeError(f"Falha na conversão de {len(falhas)} ano(s): {falhas}")
+    return resultados
@@ -0,0 +1,173 @@
+import contextlib
+import cProfile
+import functools
+import json
+import logging
+import os
+import pstats
+import resource
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+# Arquivo JSON lines com um registro por etapa e um resumo por execução
+VARIAVEL_CAMINHO = "PIPELINE_METRICAS"
+CAMINHO_PADRAO = "/opt/airflow/logs/metricas/pipeline.jsonl"
+
+# Perfis opcionais: "cprofile", "tracemalloc" ou os dois separados por vírgula
+VARIAVEL_PERFIL = "PIPELINE_PERFIL"
+
+# Linhas do cProfile e alocações do tracemalloc incluídas no resumo
+TOP_PERFIL = 20
+
+_processo = psutil.Process()
+_trava = threading.Lock()
+_sessao = None
+
+def rss_mb():
+    """Memória residente (RSS) deste processo, em MB."""
+    return _processo.memory_info().rss / (1024 * 1024)
+
+def _cpu_s():
+    tempos = _processo.cpu_times()
+    return tempos.user + tempos.system
+
+def _agora():
+    return datetime.now(timezone.utc).isoformat()
+
+def _registrar(registro):
+    if _sessao is None:
+        return
+    linha = json.dumps(dict(registro, camada=_sessao['camada'], instante=_agora()), default=str, ensure_ascii=False)
+    with _trava:
+        _sessao['arquivo'].write(linha + "\n")
+        _sessao['arquivo'].flush()
+        _sessao['pico_rss_mb'] = max(_sessao['pico_rss_mb'], registro.get('rss_mb', 0))
+
+def contar(nome, valor=1):
+    """Soma valor ao contador nome da execução atual (linhas, bytes, round trips...)."""
+    if _sessao is None:
+        return
+    with _trava:
+        _sessao['contadores'][nome] = _sessao['contadores'].get(nome, 0) + valor
+
+@contextlib.contextmanager
+def etapa(nome, **rotulos):
+    """
+    Mede uma etapa: tempo, CPU do processo, RSS no início e no fim. O dicionário
+    retornado pode receber campos extras (ex.: registro['linhas'] = len(chunk)),
+    que vão para o mesmo registro.
+    """
+    registro = dict(rotulos, tipo='etapa', etapa=nome)
+    inicio, cpu_inicio, rss_inicio = time.perf_counter(), _cpu_s(), rss_mb()
+    try:
+        yield registro
+    except Exception as e:
+        registro['erro'] = repr(e)
+        raise
+    finally:
+        registro.update(
+            tempo_s=round(time.perf_counter() - inicio, 6),
+            cpu_s=round(_cpu_s() - cpu_inicio, 6),
+            rss_inicio_mb=round(rss_inicio, 1),
+            rss_mb=round(rss_mb(), 1),
+        )
+        _registrar(registro)
+
+def cronometrado(nome=None):
+    """Decorador que mede cada chamada da função como uma etapa."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with etapa(nome or funcao.__name__):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+def _perfis():
+    return {perfil.strip() for perfil in os.environ.get(VARIAVEL_PERFIL, "").split(",") if perfil.strip()}
+
+@contextlib.contextmanager
+def sessao(camada):
+    """
+    Execução instrumentada de uma camada. Os registros das etapas vão para o arquivo em
+    $PIPELINE_METRICAS e, ao final, é gravado um resumo (tempo, CPU, pico de RSS e
+    contadores), que também é o dicionário retornado pelo with.
+
+    Com PIPELINE_PERFIL=cprofile o resumo traz as funções mais caras (e o .prof completo é
+    gravado ao lado do arquivo de métricas); com tracemalloc, as linhas que mais alocaram.
+    """
+    global _sessao
+    caminho = os.environ.get(VARIAVEL_CAMINHO, CAMINHO_PADRAO)
+    os.makedirs(os.path.dirname(caminho) or ".", exist_ok=True)
+    perfis = _perfis()
+    resumo = {'tipo': 'resumo', 'arquivo': caminho}
+
+    with open(caminho, "a", encoding="utf-8") as arquivo:
+        _sessao = {'camada': camada, 'arquivo': arquivo, 'contadores': {}, 'pico_rss_mb': rss_mb()}
+        perfil_cpu = cProfile.Profile() if 'cprofile' in perfis else None
+        if 'tracemalloc' in perfis:
+            tracemalloc.start()
+        inicio, cpu_inicio = time.perf_counter(), _cpu_s()
+        if perfil_cpu:
+            perfil_cpu.enable()
+        try:
+            yield resumo
+            resumo['status'] = 'sucesso'
+        except Exception as e:
+            resumo.update(status='erro', erro=repr(e))
+            raise
+        finally:
+            if perfil_cpu:
+                perfil_cpu.disable()
+            resumo.update(
+                tempo_s=round(time.perf_counter() - inicio, 6),
+                cpu_s=round(_cpu_s() - cpu_inicio, 6),
+                rss_mb=round(rss_mb(), 1),
+                pico_rss_mb=round(max(_sessao['pico_rss_mb'], rss_mb()), 1),
+                # Pico do processo inteiro (inclui o que rodou antes desta execução no mesmo processo)
+                pico_rss_processo_mb=round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+                contadores=dict(_sessao['contadores']),
+            )
+            if perfil_cpu:
+                caminho_perfil = f"{os.path.splitext(caminho)[0]}_{camada}.prof"
+                perfil_cpu.dump_stats(caminho_perfil)
+                estatisticas = pstats.Stats(perfil_cpu).sort_stats("cumulative")
+                resumo['perfil_cpu'] = {
+                    'arquivo': caminho_perfil,
+                    'funcoes': [
+                        {'funcao': f"{arquivo_fonte}:{linha}({funcao})", 'chamadas': chamadas, 'acumulado_s': round(acumulado, 6)}
+                        for (arquivo_fonte, linha, funcao), (_, chamadas, _, acumulado, _) in
+                        sorted(estatisticas.stats.items(), key=lambda item: item[1][3], reverse=True)[:TOP_PERFIL]
+                    ],
+                }
+            if tracemalloc.is_tracing():
+                atual, pico = tracemalloc.get_traced_memory()
+                resumo['perfil_memoria'] = {
+                    'pico_mb': round(pico / (1024 * 1024), 1),
+                    'alocacoes': [str(estatistica) for estatistica in tracemalloc.take_snapshot().statistics("lineno")[:TOP_PERFIL]],
+                }
+                tracemalloc.stop()
+            _registrar(resumo)
+            _sessao = None
+            logger.info(
+                f"Camada {camada}: {resumo['tempo_s']:.2f}s, CPU {resumo['cpu_s']:.2f}s, "
+                f"pico de RSS {resumo['pico_rss_mb']} MB, contadores {resumo['contadores']}. Métricas em {caminho}."
+            )
+
+def ler_resumo(caminho, camada=None):
+    """Último resumo gravado no arquivo de métricas (opcionalmente de uma camada)."""
+    if not os.path.exists(caminho):
+        return None
+    resumo = None
+    with open(caminho, encoding="utf-8") as arquivo:
+        for linha in arquivo:
+            registro = json.loads(linha)
+            if registro.get('tipo') == 'resumo' and (camada is None or registro.get('camada') == camada):
+                resumo = registro
+    return resumo
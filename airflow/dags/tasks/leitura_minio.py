@@ -0,0 +1,99 @@
+import logging
+import re
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from instrumentacao import contar
+
+logger = logging.getLogger(__name__)
+
+# Objetos da Bronze no layout não particionado: o arquivo único de bronze.main e os
+# arquivos anuais gravados por ingestao_bronze (destino 'objeto_anual')
+PADRAO_OBJETO_BRONZE = re.compile(r'^(data|acidentes_\d{4})\.parquet$')
+
+# Chave, nos metadados do schema de cada lote, do arquivo ('bucket/chave') de onde ele veio
+METADADO_ORIGEM = b'origem'
+
+def marcar_origem(lote, caminho):
+    """Anota o arquivo de origem nos metadados do schema do RecordBatch (sem copiar os dados)."""
+    metadados = dict(lote.schema.metadata or {})
+    metadados[METADADO_ORIGEM] = caminho.encode('utf-8')
+    return lote.replace_schema_metadata(metadados)
+
+def origem_do_lote(lote):
+    """Arquivo de origem anotado por marcar_origem, ou None."""
+    origem = (lote.schema.metadata or {}).get(METADADO_ORIGEM)
+    return origem.decode('utf-8') if origem is not None else None
+
+def listar_objetos_parquet(s3_client, bucket, padrao=PADRAO_OBJETO_BRONZE):
+    """Lista, em ordem, os objetos ('bucket/chave') da raiz do bucket cujo nome atende ao padrão."""
+    chaves = []
+    for pagina in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket, Delimiter='/'):
+        chaves.extend(objeto['Key'] for objeto in pagina.get('Contents', []) if padrao.match(objeto['Key']))
+    return [f"{bucket}/{chave}" for chave in sorted(chaves)]
+
+def iterar_lotes_parquet(caminho, filesystem, tamanho_lote=50000, colunas=None, cache=None):
+    """
+    Lê um arquivo Parquet do MinIO ('bucket/chave') em lotes de tamanho fixo.
+
+    O arquivo é aberto pelo S3FileSystem do pyarrow, que busca apenas o rodapé e,
+    depois, cada row group com GETs por intervalo (Range), então nem os bytes
+    comprimidos nem a tabela inteira ficam em memória de uma só vez.
+
+    Com um cache (cache_minio.CacheObjetosS3), o arquivo é lido da cópia local,
+    mapeada em memória, e só é baixado de novo se o ETag mudou.
+
+    Retorna o schema Arrow do arquivo e o gerador de RecordBatches.
+    """
+    arquivo = cache.abrir(caminho) if cache is not None else filesystem.open_input_file(caminho)
+    parquet = pq.ParquetFile(arquivo)
+    metadados = parquet.metadata
+    logger.info(
+        f"Arquivo {caminho}: {metadados.num_rows} linhas em {metadados.num_row_groups} row groups. "
+        f"Lendo em lotes de {tamanho_lote} linhas."
+    )
+
+    schema = parquet.schema_arrow
+    if colunas is not None:
+        schema = pa.schema([schema.field(coluna) for coluna in colunas])
+
+    # Bytes comprimidos das colunas lidas (só as projetadas são buscadas no MinIO)
+    bytes_lidos = sum(
+        grupo.column(indice).total_compressed_size
+        for grupo in (metadados.row_group(numero) for numero in range(metadados.num_row_groups))
+        for indice in range(grupo.num_columns)
+        if colunas is None or grupo.column(indice).path_in_schema in colunas
+    )
+
+    def lotes():
+        try:
+            for lote in parquet.iter_batches(batch_size=tamanho_lote, columns=colunas):
+                contar('linhas_lidas', lote.num_rows)
+                yield lote
+            contar('bytes_lidos', bytes_lidos)
+        finally:
+            arquivo.close()
+
+    return schema, lotes()
+
+def iterar_objetos_parquet(caminhos, filesystem, tamanho_lote=50000, cache=None):
+    """
+    Lê vários arquivos Parquet do MinIO em sequência, como um único fluxo de lotes
+    (ex.: os acidentes_AAAA.parquet da Bronze). Cada arquivo só é aberto quando o
+    anterior termina, e todos precisam ter o schema do primeiro. Cada lote traz o
+    arquivo de onde veio (origem_do_lote).
+
+    Retorna o schema Arrow e o gerador de RecordBatches.
+    """
+    schema, primeiros = iterar_lotes_parquet(caminhos[0], filesystem, tamanho_lote=tamanho_lote, cache=cache)
+
+    def lotes():
+        yield from (marcar_origem(lote, caminhos[0]) for lote in primeiros)
+        for caminho in caminhos[1:]:
+            schema_arquivo, lotes_arquivo = iterar_lotes_parquet(caminho, filesystem, tamanho_lote=tamanho_lote, cache=cache)
+            if not schema_arquivo.equals(schema):
+                raise ValueError(f"Schema de {caminho} difere do de {caminhos[0]}: {schema_arquivo} != {schema}")
+            yield from (marcar_origem(lote, caminho) for lote in lotes_arquivo)
+
+    return schema, lotes()
@@ -0,0 +1,97 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+WEEKEND = "Fim de semana"
+WEEKDAY = "Dia útil"
+
+def _tipo_dia(df):
+    dayofweek = pd.to_datetime(df["data_inversa"], errors="coerce").dt.dayofweek
+    return pd.Categorical(np.where(dayofweek >= 5, WEEKEND, WEEKDAY), categories=[WEEKDAY, WEEKEND])
+
+# Dimensões do cubo de agregação: nome -> (colunas de origem, função vetorizada que a calcula)
+DIMENSIONS = {
+    "uf": (["uf"], lambda df: df["uf"]),
+    "tipo_dia": (["data_inversa"], _tipo_dia),
+    "condicao_metereologica": (["condicao_metereologica"], lambda df: df["condicao_metereologica"]),
+    "causa_principal": (["causa_principal"], lambda df: df["causa_principal"]),
+}
+
+# Medidas do cubo: nome -> (coluna de origem, agregação aditiva)
+MEASURES = {
+    "linhas": (None, "size"),
+    "acidentes": ("id", "count"),
+    "mortos": ("mortos", "sum"),
+}
+
+def _by(cube, dimension, measure):
+    """Somar uma medida do cubo por uma dimensão, ignorando o grupo sem valor (como o groupby do pandas)."""
+    totals = cube.dropna(subset=[dimension]).groupby(dimension, observed=True)[measure].sum()
+    totals.index = totals.index.astype(object)
+    return totals
+
+def _value_counts(cube, dimension):
+    return _by(cube, dimension, "linhas").sort_values(ascending=False).rename("count")
+
+def _obitos_por_estado(cube):
+    return pd.DataFrame({
+        "mortos": _by(cube, "uf", "mortos"),
+        "total_acidentes": _by(cube, "uf", "acidentes"),
+    })
+
+def _condicao(cube, condicao):
+    return int(cube.loc[cube["condicao_metereologica"] == condicao, "acidentes"].sum())
+
+# Métricas da camada Gold, todas derivadas do cubo (nenhuma varre os dados de novo).
+# Para uma nova métrica basta declará-la aqui e, se precisar, acrescentar sua dimensão/medida.
+METRICS = {
+    "media_acidentes_estado": lambda cube: _obitos_por_estado(cube)["total_acidentes"].mean(),
+    "acidentes_dia_semana": lambda cube: _value_counts(cube, "tipo_dia").rename_axis("dia_semana"),
+    "obitos_por_estado": _obitos_por_estado,
+    "condicoes_normais": lambda cube: _condicao(cube, "Normal"),
+    "condicoes_chuvosas": lambda cube: _condicao(cube, "Chuva"),
+    "principais_causas": lambda cube: _value_counts(cube, "causa_principal").head(5),
+}
+
+def required_columns(dimensions=DIMENSIONS, measures=MEASURES):
+    """Colunas da Silver lidas pelo cubo (útil para projetar a consulta)."""
+    columns = {column for source, _ in dimensions.values() for column in source}
+    columns |= {column for column, _ in measures.values() if column}
+    return sorted(columns)
+
+def build_cube(df, dimensions=DIMENSIONS, measures=MEASURES):
+    """
+    Agregar o DataFrame em um cubo com todas as dimensões e medidas em uma única
+    passada (um groupby de várias chaves sobre colunas categóricas).
+    """
+    keys = pd.DataFrame({
+        name: pd.Series(compute(df), index=df.index).astype("category")
+        for name, (_, compute) in dimensions.items()
+    })
+    values = pd.DataFrame(
+        {column: df[column] for column, _ in measures.values() if column},
+        index=df.index
+    )
+    grouped = pd.concat([keys, values], axis=1).groupby(list(dimensions), observed=True, dropna=False, sort=False)
+    cube = grouped.agg(**{
+        name: (column if column else list(dimensions)[0], aggregation)
+        for name, (column, aggregation) in measures.items()
+    })
+    return cube.reset_index()
+
+def merge_cubes(cubes, dimensions=DIMENSIONS):
+    """Combinar cubos parciais (ex.: um por chunk) somando as medidas de cada célula."""
+    cubes = [cube for cube in cubes if len(cube)]
+    if not cubes:
+        return pd.DataFrame(columns=list(dimensions) + list(MEASURES))
+    combined = pd.concat(cubes, ignore_index=True)
+    for name in dimensions:
+        combined[name] = combined[name].astype("category")
+    return combined.groupby(list(dimensions), observed=True, dropna=False, sort=False).sum().reset_index()
+
+def compute_metrics(cube, metrics=METRICS):
+    """Derivar as métricas declaradas a partir do cubo."""
+    return {name: metric(cube) for name, metric in metrics.items()}
@@ -0,0 +1,187 @@
+import logging
+import posixpath
+import re
+from urllib.parse import urlparse
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from leitura_minio import marcar_origem
+
+logger = logging.getLogger(__name__)
+
+# Layout Hive das camadas no MinIO: <bucket>/<prefixo>/ano=AAAA/mes=M/uf=XX/parte-N.parquet
+SCHEMA_PARTICAO = pa.schema([
+    ('ano', pa.int16()),
+    ('mes', pa.int8()),
+    ('uf', pa.string()),
+])
+
+# Colunas derivadas de data_inversa só para o particionamento (não fazem parte dos dados)
+COLUNAS_DERIVADAS = ['ano', 'mes']
+
+# Arquivos abertos ao mesmo tempo na escrita particionada. Cada arquivo aberto no
+# S3FileSystem mantém um buffer da parte em envio (~10 MB): um ano tem ~12 x 27
+# partições, o que passaria de 3 GB por processo com o limite padrão (1024)
+ARQUIVOS_ABERTOS_MAX = 32
+MEMORIA_POR_ARQUIVO_ABERTO_MB = 11
+
+def criar_filesystem_s3(endpoint_url, access_key, secret_key):
+    """Cria um S3FileSystem do pyarrow apontando para o MinIO."""
+    endpoint = urlparse(endpoint_url)
+    return fs.S3FileSystem(
+        endpoint_override=endpoint.netloc,
+        scheme=endpoint.scheme or 'http',
+        access_key=access_key,
+        secret_key=secret_key,
+    )
+
+def particionamento_hive():
+    return ds.partitioning(SCHEMA_PARTICAO, flavor='hive')
+
+def adicionar_colunas_particao(lote):
+    """
+    Acrescenta as colunas ano e mes (a partir de data_inversa) a um RecordBatch/Table
+    e garante que uf seja texto simples, como exigido pelo particionamento.
+    """
+    datas = lote.column('data_inversa')
+    arrays = []
+    nomes = []
+    for nome, coluna in zip(lote.schema.names, lote.columns):
+        if nome in COLUNAS_DERIVADAS:
+            continue
+        if nome == 'uf':
+            coluna = pc.cast(coluna, pa.string())
+        arrays.append(coluna)
+        nomes.append(nome)
+    arrays += [pc.cast(pc.year(datas), pa.int16()), pc.cast(pc.month(datas), pa.int8())]
+    nomes += COLUNAS_DERIVADAS
+    return type(lote).from_arrays(arrays, names=nomes)
+
+def schema_particionado(schema):
+    """Schema dos lotes enviados a escrever_particionado para um schema de dados."""
+    campos = [campo for campo in schema if campo.name not in COLUNAS_DERIVADAS]
+    campos = [pa.field('uf', pa.string()) if campo.name == 'uf' else campo for campo in campos]
+    return pa.schema(campos + [SCHEMA_PARTICAO.field('ano'), SCHEMA_PARTICAO.field('mes')])
+
+def remover_arquivos_do_prefixo(caminho_base, filesystem, prefixo_arquivo):
+    """Remove, de todas as partições, os arquivos {prefixo_arquivo}-N.parquet; retorna quantos."""
+    padrao = re.compile(rf'^{re.escape(prefixo_arquivo)}-\d+\.parquet$')
+    seletor = fs.FileSelector(caminho_base, recursive=True, allow_not_found=True)
+    arquivos = [
+        info.path for info in filesystem.get_file_info(seletor)
+        if info.type == fs.FileType.File and padrao.match(info.base_name)
+    ]
+    for caminho in arquivos:
+        filesystem.delete_file(caminho)
+    return len(arquivos)
+
+def escrever_particionado(lotes, schema, caminho_base, filesystem, prefixo_arquivo='parte', substituir_particoes=False):
+    """
+    Grava lotes (RecordBatches com o schema de dados) como dataset Parquet particionado
+    por ano/mes/uf, em arquivos {prefixo_arquivo}-N.parquet.
+
+    No máximo ARQUIVOS_ABERTOS_MAX arquivos ficam abertos: uma partição que volta a
+    receber linhas depois de fechada ganha um novo arquivo do mesmo prefixo.
+
+    Por padrão só os arquivos gravados antes com o mesmo prefixo_arquivo (a mesma
+    origem, ex.: acidentes_2024) são substituídos, em qualquer partição: os arquivos
+    de outras origens continuam lá mesmo nas partições em comum (ex.: acidentes de
+    31/12 publicados no arquivo do ano seguinte), então origens diferentes podem ser
+    gravadas em paralelo. Com substituir_particoes=True as partições presentes nos
+    lotes são substituídas inteiras, com os arquivos de todas as origens: os lotes
+    precisam trazer todas as linhas dessas partições (ver arquivos_das_particoes).
+    """
+    schema_saida = schema_particionado(schema)
+    if not substituir_particoes:
+        removidos = remover_arquivos_do_prefixo(caminho_base, filesystem, prefixo_arquivo)
+        if removidos:
+            logger.info(f"{removidos} arquivo(s) {prefixo_arquivo}-N.parquet anteriores removidos de {caminho_base}.")
+
+    def lotes_particionados():
+        for lote in lotes:
+            yield adicionar_colunas_particao(lote)
+
+    logger.info(f"Gravando dataset particionado (ano/mes/uf) em {caminho_base}...")
+    ds.write_dataset(
+        lotes_particionados(),
+        caminho_base,
+        schema=schema_saida,
+        format='parquet',
+        partitioning=particionamento_hive(),
+        filesystem=filesystem,
+        basename_template=f"{prefixo_arquivo}-{{i}}.parquet",
+        max_open_files=ARQUIVOS_ABERTOS_MAX,
+        existing_data_behavior='delete_matching' if substituir_particoes else 'overwrite_or_ignore',
+    )
+    logger.info(f"Dataset particionado gravado em {caminho_base}.")
+
+def montar_filtro(filtros):
+    """
+    Converte um dicionário como {'ano': 2024, 'uf': ['SP', 'RJ']} em uma expressão
+    de filtro do pyarrow. Listas viram IN, valores simples viram igualdade.
+    """
+    expressao = None
+    for coluna, valor in (filtros or {}).items():
+        if isinstance(valor, (list, tuple, set)):
+            condicao = pc.field(coluna).isin(list(valor))
+        else:
+            condicao = pc.field(coluna) == valor
+        expressao = condicao if expressao is None else expressao & condicao
+    return expressao
+
+def abrir_particoes(caminho_base, filesystem):
+    return ds.dataset(caminho_base, filesystem=filesystem, format='parquet', partitioning=particionamento_hive())
+
+def ler_particoes(caminho_base, filesystem, filtros=None, colunas=None):
+    """
+    Lê do dataset particionado apenas as partições que atendem aos filtros.
+
+    Filtros sobre ano/mes/uf são resolvidos pelos caminhos das partições, então os
+    arquivos das demais partições nem chegam a ser baixados.
+    """
+    dataset = abrir_particoes(caminho_base, filesystem)
+    filtro = montar_filtro(filtros)
+    logger.info(f"Lendo partições de {caminho_base} com filtros {filtros or {}}...")
+    return dataset.to_table(columns=colunas, filter=filtro)
+
+def iterar_particoes(caminho_base, filesystem, filtros=None, colunas=None, tamanho_lote=50000):
+    """Versão em streaming de ler_particoes: gera RecordBatches das partições filtradas."""
+    dataset = abrir_particoes(caminho_base, filesystem)
+    return dataset.to_batches(columns=colunas, filter=montar_filtro(filtros), batch_size=tamanho_lote)
+
+def listar_arquivos(caminho_base, filesystem, filtros=None):
+    """Lista os arquivos Parquet ('bucket/chave') das partições que atendem aos filtros."""
+    dataset = abrir_particoes(caminho_base, filesystem)
+    return [fragmento.path for fragmento in dataset.get_fragments(filter=montar_filtro(filtros))]
+
+def arquivos_das_particoes(arquivos, alterados):
+    """
+    Arquivos, de qualquer origem, que estão nas mesmas partições dos arquivos alterados.
+    Uma partição pode ter arquivos de várias origens (ex.: 31/12 no arquivo do ano
+    seguinte) e mais de um arquivo por origem, então substituí-la a partir só dos
+    arquivos alterados apagaria as linhas dos demais.
+    """
+    particoes = {posixpath.dirname(arquivo) for arquivo in alterados}
+    return [arquivo for arquivo in arquivos if posixpath.dirname(arquivo) in particoes]
+
+def iterar_arquivos(arquivos, caminho_base, filesystem, tamanho_lote=50000):
+    """
+    Lê em streaming um subconjunto de arquivos do dataset particionado, mantendo a
+    coluna de partição uf e descartando as colunas derivadas ano/mes. Cada lote traz
+    o arquivo de onde veio (leitura_minio.origem_do_lote).
+
+    Retorna o schema dos lotes e o gerador de RecordBatches.
+    """
+    dataset = ds.dataset(
+        arquivos,
+        filesystem=filesystem,
+        format='parquet',
+        partitioning=particionamento_hive(),
+        partition_base_dir=caminho_base,
+    )
+    schema = pa.schema([campo for campo in dataset.schema if campo.name not in COLUNAS_DERIVADAS])
+    lotes = dataset.scanner(columns=schema.names, batch_size=tamanho_lote).scan_batches()
+    return schema, (marcar_origem(item.record_batch, item.fragment.path) for item in lotes)
@@ -0,0 +1,202 @@
+import logging
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Paralelismo padrão de cada estágio. Leitura e escrita do Parquet são sequenciais por natureza.
+PARALELISMO_PADRAO = {
+    'leitura': 1,
+    'transformacao': 1,
+    'mysql': 2,
+    'parquet': 1,
+}
+
+# Intervalo para as threads bloqueadas em filas verificarem se o pipeline foi interrompido
+_INTERVALO_VERIFICACAO = 0.5
+
+_FIM = object()
+
+class _PipelineInterrompido(Exception):
+    pass
+
+def _novas_metricas():
+    return {'itens': 0, 'linhas': 0, 'ocupado_s': 0.0, 'espera_entrada_s': 0.0, 'espera_saida_s': 0.0}
+
+def _colocar(fila, item, parar, metricas, trava):
+    """put com back-pressure: bloqueia enquanto a fila do próximo estágio está cheia."""
+    inicio = time.monotonic()
+    while True:
+        if parar.is_set():
+            raise _PipelineInterrompido()
+        try:
+            fila.put(item, timeout=_INTERVALO_VERIFICACAO)
+            break
+        except queue.Full:
+            continue
+    with trava:
+        metricas['espera_saida_s'] += time.monotonic() - inicio
+
+def _retirar(fila, parar, metricas, trava):
+    inicio = time.monotonic()
+    while True:
+        if parar.is_set():
+            raise _PipelineInterrompido()
+        try:
+            item = fila.get(timeout=_INTERVALO_VERIFICACAO)
+            break
+        except queue.Empty:
+            continue
+    with trava:
+        metricas['espera_entrada_s'] += time.monotonic() - inicio
+    return item
+
+def _registrar(metricas, trava, inicio, linhas):
+    with trava:
+        metricas['itens'] += 1
+        metricas['linhas'] += linhas
+        metricas['ocupado_s'] += time.monotonic() - inicio
+
+def executar_pipeline(lotes, transformar, carregar, criar_conexao, escrever, paralelismo=None, tamanho_fila=2):
+    """
+    Executa a Silver como um pipeline produtor/consumidor de quatro estágios ligados
+    por filas limitadas:
+
+    1. leitura: consome o iterador de lotes Arrow (row groups da Bronze);
+    2. transformacao: transformar(lote) -> DataFrame (conversão de tipos);
+    3. mysql: carregar(conexao, chunk), cada thread com sua própria conexão criada
+       por criar_conexao() (um pequeno pool de conexões);
+    4. parquet: escrever(iterador_de_chunks), que consome os chunks transformados.
+
+    As filas têm no máximo tamanho_fila itens, então um estágio lento segura os
+    anteriores (back-pressure) e a memória fica limitada a poucos lotes.
+
+    Retorna as métricas por estágio: itens, linhas, tempo ocupado e tempo esperando
+    entrada/saída. O estágio com maior tempo ocupado por thread é o gargalo.
+    """
+    paralelismo = dict(PARALELISMO_PADRAO, **(paralelismo or {}))
+    paralelismo['leitura'] = 1
+    paralelismo['parquet'] = 1
+
+    fila_transformacao = queue.Queue(maxsize=tamanho_fila)
+    fila_mysql = queue.Queue(maxsize=tamanho_fila)
+    fila_parquet = queue.Queue(maxsize=tamanho_fila)
+
+    metricas = {estagio: _novas_metricas() for estagio in PARALELISMO_PADRAO}
+    trava = threading.Lock()
+    parar = threading.Event()
+    erros = []
+    restantes_transformacao = [paralelismo['transformacao']]
+
+    def falhar(estagio, erro):
+        logger.error(f"Erro no estágio {estagio} do pipeline da Silver: {erro}")
+        erros.append(erro)
+        parar.set()
+
+    def ler():
+        try:
+            iterador = iter(lotes)
+            while True:
+                inicio = time.monotonic()
+                lote = next(iterador, _FIM)
+                if lote is _FIM:
+                    break
+                _registrar(metricas['leitura'], trava, inicio, lote.num_rows)
+                _colocar(fila_transformacao, lote, parar, metricas['leitura'], trava)
+            for _ in range(paralelismo['transformacao']):
+                _colocar(fila_transformacao, _FIM, parar, metricas['leitura'], trava)
+        except _PipelineInterrompido:
+            pass
+        except Exception as e:
+            falhar('leitura', e)
+
+    def transformar_worker():
+        try:
+            while True:
+                lote = _retirar(fila_transformacao, parar, metricas['transformacao'], trava)
+                if lote is _FIM:
+                    break
+                inicio = time.monotonic()
+                chunk = transformar(lote)
+                _registrar(metricas['transformacao'], trava, inicio, len(chunk))
+                _colocar(fila_mysql, chunk, parar, metricas['transformacao'], trava)
+                _colocar(fila_parquet, chunk, parar, metricas['transformacao'], trava)
+
+            # O último worker de transformação encerra os estágios seguintes
+            with trava:
+                restantes_transformacao[0] -= 1
+                ultimo = restantes_transformacao[0] == 0
+            if ultimo:
+                for _ in range(paralelismo['mysql']):
+                    _colocar(fila_mysql, _FIM, parar, metricas['transformacao'], trava)
+                _colocar(fila_parquet, _FIM, parar, metricas['transformacao'], trava)
+        except _PipelineInterrompido:
+            pass
+        except Exception as e:
+            falhar('transformacao', e)
+
+    def mysql_worker():
+        conexao = None
+        try:
+            conexao = criar_conexao()
+            while True:
+                chunk = _retirar(fila_mysql, parar, metricas['mysql'], trava)
+                if chunk is _FIM:
+                    break
+                inicio = time.monotonic()
+                carregar(conexao, chunk)
+                _registrar(metricas['mysql'], trava, inicio, len(chunk))
+        except _PipelineInterrompido:
+            pass
+        except Exception as e:
+            falhar('mysql', e)
+        finally:
+            if conexao is not None:
+                conexao.close()
+
+    def parquet_worker():
+        def chunks():
+            while True:
+                chunk = _retirar(fila_parquet, parar, metricas['parquet'], trava)
+                if chunk is _FIM:
+                    return
+                # O tempo ocupado do estágio é medido entre uma retirada e a próxima
+                inicio = time.monotonic()
+                yield chunk
+                _registrar(metricas['parquet'], trava, inicio, len(chunk))
+
+        try:
+            escrever(chunks())
+        except _PipelineInterrompido:
+            pass
+        except Exception as e:
+            falhar('parquet', e)
+
+    threads = [threading.Thread(target=ler, name='silver-leitura')]
+    threads += [threading.Thread(target=transformar_worker, name=f'silver-transformacao-{i}') for i in range(paralelismo['transformacao'])]
+    threads += [threading.Thread(target=mysql_worker, name=f'silver-mysql-{i}') for i in range(paralelismo['mysql'])]
+    threads.append(threading.Thread(target=parquet_worker, name='silver-parquet'))
+
+    inicio_total = time.monotonic()
+    logger.info(f"Iniciando pipeline da Silver com paralelismo {paralelismo} e filas de {tamanho_fila} lotes.")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if erros:
+        raise erros[0]
+
+    total_s = time.monotonic() - inicio_total
+    for estagio, valores in metricas.items():
+        valores['threads'] = paralelismo[estagio]
+        valores['ocupado_por_thread_s'] = valores['ocupado_s'] / paralelismo[estagio]
+        logger.info(
+            f"Estágio {estagio}: {valores['itens']} lotes, {valores['linhas']} linhas, "
+            f"ocupado {valores['ocupado_s']:.2f}s em {valores['threads']} thread(s), "
+            f"esperando entrada {valores['espera_entrada_s']:.2f}s, saída {valores['espera_saida_s']:.2f}s."
+        )
+    gargalo = max(metricas, key=lambda estagio: metricas[estagio]['ocupado_por_thread_s'])
+    logger.info(f"Pipeline da Silver concluído em {total_s:.2f}s. Estágio gargalo: {gargalo}.")
+    return {'total_s': total_s, 'gargalo': gargalo, 'estagios': metricas}
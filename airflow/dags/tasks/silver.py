@@ -1,9 +1,28 @@
-import pandas as pd
+import contextlib
+import itertools
+import pyarrow as pa
+import pyarrow.parquet as pq
 import boto3
-import io
 import logging
 import pymysql
-import psutil
+
+from aggregates import REQUIRED_COLUMNS, refresh_summaries, stored_dates
+from cache_minio import CacheObjetosS3
+from carga_incremental import (
+    carregar_manifesto,
+    criar_tabela_manifesto,
+    garantir_chave_primaria,
+    hashes_das_origens,
+    origens_pendentes,
+    registrar_no_manifesto,
+)
+from carga_mysql import carregar_chunk, indices_adiados
+from instrumentacao import contar, etapa, rss_mb, sessao
+from esquema_mysql import AjustadorDeTipos, chave_primaria, criar_ou_evoluir_tabela, inferir_tipos, tamanho_medio_linha
+from leitura_minio import iterar_objetos_parquet, listar_objetos_parquet, origem_do_lote
+from particionamento import arquivos_das_particoes, criar_filesystem_s3, escrever_particionado, iterar_arquivos, listar_arquivos
+from pipeline_silver import executar_pipeline
+from upload_minio import EscritorMultipartS3
 
 # Configuração de logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -13,116 +32,293 @@ def sanitize_column_name(name):
     """Sanitiza os nomes das colunas para serem compatíveis com o MySQL."""
     return name.replace(" ", "_").replace("-", "_")
 
-def processar_camada_silver():
+# Chave usada nas cargas incrementais (upsert) da tabela acidentes_silver
+CHAVE_PRIMARIA = ['id']
+
+def conectar_mysql(local_infile=False):
+    """Abre uma conexão com o MySQL da Silver."""
+    return pymysql.connect(
+        host="mysql-airflow",
+        user="airflow_user",
+        password="airflow_password",
+        database="airflow",
+        port=3306,
+        local_infile=local_infile
+    )
+
+def processar_camada_silver(particionado=False, filtros=None, incremental=True, backend_carga="multirow", adiar_indices=False,
+                            pipeline=False, paralelismo=None, indices=None, particionar_por_ano=False, usar_cache=True):
+    """
+    Processa a camada Silver: carrega os dados da Bronze no MySQL e grava o Parquet tratado.
+
+    Com particionado=True a entrada e a saída usam o layout ano/mes/uf do MinIO e apenas
+    as partições que atendem aos filtros (ex.: {'ano': 2024, 'uf': ['SP', 'RJ']}) são lidas.
+    Na carga incremental as partições com arquivos alterados são relidas e regravadas
+    inteiras na Silver, com os arquivos de todas as origens.
+
+    Com incremental=True (padrão) apenas arquivos da Bronze novos ou alterados desde a
+    última carga são processados (conforme o manifesto silver_manifest) e as linhas são
+    gravadas com upsert pela chave primária, então reexecutar sobre a mesma entrada não
+    duplica a tabela e praticamente não faz trabalho. Origens inalteradas relidas só para
+    regravar a saída (o Parquet único ou as partições tocadas) não voltam ao MySQL.
+
+    backend_carga escolhe como as linhas chegam ao MySQL: "executemany", "multirow"
+    (INSERTs de várias linhas do tamanho do max_allowed_packet) ou "load_data"
+    (LOAD DATA LOCAL INFILE). Com adiar_indices=True os índices secundários são
+    removidos durante a carga e recriados no final.
+
+    Com pipeline=True leitura, transformação, carga no MySQL e escrita do Parquet rodam
+    em paralelo, ligadas por filas limitadas (ver pipeline_silver), e o tempo de cada
+    estágio é registrado no log e retornado. paralelismo ajusta o número de threads
+    por estágio, ex.: {'transformacao': 1, 'mysql': 2}.
+
+    Os tipos da acidentes_silver são inferidos do schema e do primeiro lote (ver
+    esquema_mysql); indices define os índices secundários (padrão: INDICES_PADRAO) e
+    particionar_por_ano=True cria a tabela particionada por YEAR(data_inversa), o que
+    inclui data_inversa na chave primária e descarta da carga as linhas sem data.
+
+    Sem particionamento a entrada são os objetos da raiz do bucket bronze: data.parquet
+    (bronze.main) e os acidentes_AAAA.parquet gravados pela ingestão por ano. Com
+    usar_cache=True (padrão) eles são lidos do cache local de objetos do MinIO (ver
+    cache_minio), revalidados pelo ETag em vez de baixados de novo.
+
+    Retorna as origens carregadas nesta execução (lista vazia se nada mudou), as
+    métricas do pipeline, quando usado, e as estatísticas do cache.
+    """
     try:
         # Logar uso inicial de memória
-        logger.info(f"Uso de memória inicial: {psutil.virtual_memory().percent}%")
+        logger.info(f"Uso de memória inicial do processo: {rss_mb():.1f} MB")
 
         # Conectar ao MinIO
         logger.info("Conectando ao MinIO para baixar o arquivo Parquet...")
+        endpoint_url = "http://minio:9000"
+        access_key = "minioadmin"
+        secret_key = "minio@1234!"
         s3_client = boto3.client(
             's3',
-            endpoint_url="http://minio:9000",
-            aws_access_key_id="minioadmin",
-            aws_secret_access_key="minio@1234!"
+            endpoint_url=endpoint_url,
+            aws_access_key_id=access_key,
+            aws_secret_access_key=secret_key
         )
 
-        # Download do arquivo Parquet
-        bucket_name = "bronze"
-        object_key = "data.parquet"
-        logger.info(f"Baixando o arquivo {object_key} do bucket {bucket_name}...")
-        response = s3_client.get_object(Bucket=bucket_name, Key=object_key)
-        parquet_data = response['Body'].read()
+        # Configurar conexão com o MySQL
+        logger.info("Conectando ao banco de dados MySQL...")
+        connection = conectar_mysql(local_infile=(backend_carga == "load_data"))
 
-        # Carregar o arquivo Parquet para um DataFrame
-        df = pd.read_parquet(io.BytesIO(parquet_data))
-        logger.info(f"Arquivo Parquet baixado e carregado com sucesso. Dimensões: {df.shape}")
+        cursor = connection.cursor()
 
-        # Sanitizar nomes das colunas
-        df.columns = [sanitize_column_name(col) for col in df.columns]
+        # Arquivos da Bronze que compõem a entrada
+        bucket_name = "bronze"
+        filesystem = criar_filesystem_s3(endpoint_url, access_key, secret_key)
+        cache = CacheObjetosS3(s3_client) if usar_cache and not particionado else None
+        if particionado:
+            base_bronze = f"{bucket_name}/acidentes"
+            origens = listar_arquivos(base_bronze, filesystem, filtros=filtros)
+        else:
+            # data.parquet (bronze.main) e/ou os acidentes_AAAA.parquet da ingestão por ano
+            origens = listar_objetos_parquet(s3_client, bucket_name)
+            if not origens:
+                raise FileNotFoundError(f"Nenhum arquivo data.parquet ou acidentes_AAAA.parquet no bucket {bucket_name}.")
+
+        origens_inalteradas = set()
+        if incremental:
+            # Comparar o hash de cada arquivo com o manifesto da última carga
+            criar_tabela_manifesto(cursor)
+            connection.commit()
+            hashes = hashes_das_origens(s3_client, origens)
+            pendentes = origens_pendentes(hashes, carregar_manifesto(cursor, origens))
+            if not pendentes:
+                origens = []
+            elif particionado:
+                # As partições tocadas são regravadas inteiras na Silver, então todos os
+                # arquivos delas (de qualquer origem) são lidos, não só os alterados
+                origens = arquivos_das_particoes(origens, pendentes)
+            if not origens:
+                logger.info("Nenhum arquivo novo ou alterado na Bronze desde a última carga. Nada a fazer.")
+                cursor.close()
+                connection.close()
+                return {'origens': [], 'pipeline': None, 'cache': None}
+            logger.info(f"{len(pendentes)} arquivo(s) novo(s) ou alterado(s) a carregar: {pendentes}")
+            if len(origens) > len(pendentes):
+                # O Parquet único (ou as partições tocadas) da Silver é regravado inteiro, então
+                # as demais origens também são lidas; o upsert não altera as linhas que não mudaram
+                origens_inalteradas = set(origens) - set(pendentes)
+                logger.info(f"Relendo também {sorted(origens_inalteradas)} para regravar a saída.")
 
-        # Processar e inserir dados em chunks
+        # Processar e inserir dados em lotes
         chunk_size = 50000
         logger.info(f"Iniciando processamento em chunks de {chunk_size} linhas...")
 
-        # Configurar conexão com o MySQL
-        logger.info("Conectando ao banco de dados MySQL...")
-        connection = pymysql.connect(
-            host="mysql-airflow",
-            user="airflow_user",
-            password="airflow_password",
-            database="airflow",
-            port=3306
-        )
+        if particionado:
+            # Leitura apenas das partições necessárias
+            schema_entrada, lotes = iterar_arquivos(origens, base_bronze, filesystem, tamanho_lote=chunk_size)
+        else:
+            # Leitura dos Parquets row group a row group, do cache local ou direto do MinIO
+            schema_entrada, lotes = iterar_objetos_parquet(origens, filesystem, tamanho_lote=chunk_size, cache=cache)
 
-        cursor = connection.cursor()
+        # Sanitizar nomes das colunas
+        schema_saida = pa.schema([pa.field(sanitize_column_name(campo.name), campo.type) for campo in schema_entrada])
+        colunas = schema_saida.names
 
-        # Criar tabela dinamicamente
-        logger.info("Criando tabela dinamicamente no banco de dados...")
-        column_types = []
-        for column, dtype in zip(df.columns, df.dtypes):
-            if pd.api.types.is_integer_dtype(dtype):
-                sql_type = "INT"
-            elif pd.api.types.is_float_dtype(dtype):
-                sql_type = "DOUBLE"
-            elif pd.api.types.is_datetime64_any_dtype(dtype):
-                sql_type = "DATETIME"
-            elif pd.api.types.is_object_dtype(dtype):
-                sql_type = "TEXT"
-            else:
-                sql_type = "TEXT"  # Tipo genérico para tipos desconhecidos
-            column_types.append(f"`{column}` {sql_type} NULL")
-
-        create_table_query = f"""
-        CREATE TABLE IF NOT EXISTS acidentes_silver (
-            {', '.join(column_types)}
-        );
-        """
-        cursor.execute(create_table_query)
+        if incremental and not set(CHAVE_PRIMARIA).issubset(colunas):
+            raise ValueError(f"Carga incremental exige as colunas de chave {CHAVE_PRIMARIA} nos dados.")
+
+        # Tipos do MySQL inferidos do schema e dos valores do primeiro lote
+        primeiro_lote = next(lotes, None)
+        amostra = None
+        if primeiro_lote is not None:
+            lotes = itertools.chain([primeiro_lote], lotes)
+            amostra = pa.Table.from_batches([primeiro_lote]).rename_columns(colunas).to_pandas()
+        tipos = inferir_tipos(schema_saida, amostra)
+
+        logger.info("Criando/evoluindo a tabela acidentes_silver no banco de dados...")
+        chave = chave_primaria(CHAVE_PRIMARIA, particionar_por_ano) if incremental else []
+        tipos = criar_ou_evoluir_tabela(cursor, "acidentes_silver", tipos, chave, indices, particionar_por_ano)
+        if incremental:
+            # Tabelas criadas por versões anteriores não têm chave primária
+            garantir_chave_primaria(cursor, "acidentes_silver", chave)
         connection.commit()
-        logger.info("Tabela acidentes_silver criada/verificada com sucesso.")
+        logger.info(f"Tabela acidentes_silver criada/verificada com sucesso: {tipos}")
+
+        # Alarga colunas durante a carga se algum chunk não couber nos tipos inferidos
+        ajustador_tipos = AjustadorDeTipos("acidentes_silver", tipos, chave)
+
+        colunas_chave = chave if incremental else None
 
-        # Preparar para escrita incremental no MinIO
+        # Preparar para escrita em streaming no MinIO
         silver_bucket_name = "silver"
         silver_object_key = "data_silver_final.parquet"
-        buffer = io.BytesIO()
 
-        # Processar os chunks
-        for start in range(0, len(df), chunk_size):
-            end = start + chunk_size
-            chunk = df.iloc[start:end]
+        # Resumos da Gold (aggregates) atualizados incrementalmente a cada carga
+        atualizar_resumos = REQUIRED_COLUMNS.issubset(colunas)
+        datas_carregadas = set()
+        datas_sem_valor = [False]
 
-            # Tratar valores NaN no chunk
-            logger.info(f"Processando chunk de linhas {start} a {end}...")
-            chunk = chunk.where(pd.notnull(chunk), None)
+        def transformar(lote):
+            # Conversão do lote Arrow para os tipos pandas da carga
+            with etapa('transformacao_chunk', linhas=lote.num_rows):
+                chunk = lote.to_pandas()
+                chunk.columns = colunas
+                chunk.attrs['origem'] = origem_do_lote(lote)
+            return chunk
 
-            # Converter o chunk para uma lista de tuplas garantindo valores None
-            rows = [tuple(None if pd.isna(val) else val for val in row) for row in chunk.to_numpy()]
-            columns = ",".join([f"`{col}`" for col in chunk.columns])
+        def carregar(conexao, chunk):
+            if chunk.attrs.get('origem') in origens_inalteradas:
+                # Relido só para regravar a saída: as linhas já estão no MySQL
+                return
+            # Inserir o chunk com o backend de carga escolhido (nulos mapeados de forma vetorizada)
+            if particionar_por_ano:
+                chunk = chunk[chunk['data_inversa'].notna()]
+            with etapa('carga_chunk', backend=backend_carga, linhas=len(chunk)) as registro, conexao.cursor() as cursor_carga:
+                if atualizar_resumos and incremental:
+                    # Datas atuais dos ids do chunk: se o upsert mudar a data de um id, o dia antigo também muda
+                    datas_anteriores, sem_data_anterior = stored_dates(cursor_carga, chunk['id'].tolist())
+                    datas_carregadas.update(datas_anteriores)
+                    if sem_data_anterior:
+                        datas_sem_valor[0] = True
+                ajustador_tipos.ajustar(cursor_carga, chunk)
+                linhas_afetadas = carregar_chunk(backend_carga, cursor_carga, "acidentes_silver", chunk, colunas_chave=colunas_chave)
+                conexao.commit()
+                registro['linhas_afetadas'] = linhas_afetadas
+            contar('linhas_carregadas', len(chunk))
 
-            insert_query = f"INSERT INTO acidentes_silver ({columns}) VALUES ({','.join(['%s'] * len(chunk.columns))})"
-            cursor.executemany(insert_query, rows)
-            connection.commit()
-            logger.info(f"Chunk {start // chunk_size + 1} inserido com sucesso!")
+            # No upsert, linhas inalteradas não contam como afetadas
+            logger.info(f"Chunk de {len(chunk)} linhas inserido com sucesso! Linhas afetadas: {linhas_afetadas}")
+
+            # Datas tocadas pela carga (novas e anteriores), para atualizar só esses dias nos resumos da Gold
+            if atualizar_resumos:
+                datas = chunk['data_inversa']
+                datas_carregadas.update(datas.dropna().unique())
+                if datas.isna().any():
+                    datas_sem_valor[0] = True
 
-            # Adicionar chunk ao arquivo Parquet
-            chunk.to_parquet(buffer, engine='pyarrow', index=False)
+        def criar_conexao_pool():
+            conexao = conectar_mysql(local_infile=(backend_carga == "load_data"))
+            if adiar_indices:
+                with conexao.cursor() as cursor_pool:
+                    cursor_pool.execute("SET SESSION unique_checks = 0")
+                    cursor_pool.execute("SET SESSION foreign_key_checks = 0")
+            return conexao
 
-        buffer.seek(0)
-        s3_client.put_object(Bucket=silver_bucket_name, Key=silver_object_key, Body=buffer.getvalue())
-        logger.info(f"Arquivo final tratado salvo no bucket {silver_bucket_name} com o nome {silver_object_key}.")
+        def escrever_saida(chunks):
+            if particionado:
+                # Gravar a saída tratada no mesmo layout particionado da Bronze
+                lotes_saida = (pa.RecordBatch.from_pandas(chunk, schema=schema_saida, preserve_index=False) for chunk in chunks)
+                escrever_particionado(lotes_saida, schema_saida, f"{silver_bucket_name}/acidentes", filesystem,
+                                      substituir_particoes=True)
+                logger.info(f"Dataset tratado salvo no bucket {silver_bucket_name} com o prefixo acidentes/.")
+            else:
+                # Cada chunk vira um row group de um único Parquet válido, enviado em partes
+                # ao MinIO enquanto os próximos chunks ainda estão sendo processados
+                with EscritorMultipartS3(s3_client, silver_bucket_name, silver_object_key) as destino, \
+                        pq.ParquetWriter(destino, schema_saida) as writer:
+                    for chunk in chunks:
+                        writer.write_table(pa.Table.from_pandas(chunk, schema=schema_saida, preserve_index=False))
+
+                logger.info(f"Arquivo final tratado salvo no bucket {silver_bucket_name} com o nome {silver_object_key}.")
+
+        def processar_chunks():
+            start = 0
+            for lote in lotes:
+                chunk = transformar(lote)
+                end = start + len(chunk)
+                logger.info(f"Processando chunk de linhas {start} a {end}...")
+                carregar(connection, chunk)
+                yield chunk
+                start = end
+
+        metricas_pipeline = None
+        with etapa('carga_e_escrita', backend=backend_carga, pipeline=pipeline):
+            with indices_adiados(cursor, "acidentes_silver") if adiar_indices else contextlib.nullcontext():
+                if pipeline:
+                    metricas_pipeline = executar_pipeline(
+                        lotes,
+                        transformar,
+                        carregar,
+                        criar_conexao_pool,
+                        escrever_saida,
+                        paralelismo=paralelismo
+                    )
+                else:
+                    escrever_saida(processar_chunks())
+
+        if atualizar_resumos:
+            with etapa('resumos_gold', datas=len(datas_carregadas)):
+                refresh_summaries(cursor, datas_carregadas, include_null_date=datas_sem_valor[0])
+                connection.commit()
+            logger.info("Tabelas de resumo da camada Gold atualizadas.")
+        else:
+            logger.warning(f"Colunas {sorted(REQUIRED_COLUMNS - set(colunas))} ausentes; resumos da Gold não foram atualizados.")
+
+        if incremental:
+            # Registrar as origens só depois que os dados foram gravados
+            registrar_no_manifesto(cursor, {origem: hashes[origem] for origem in origens})
+            connection.commit()
 
         logger.info("Todos os dados foram inseridos na tabela acidentes_silver com sucesso!")
+        tamanho_linha, tamanho_dados, tamanho_indices = tamanho_medio_linha(cursor, "acidentes_silver")
+        logger.info(f"acidentes_silver: {tamanho_linha} bytes por linha, {tamanho_dados} bytes de dados e {tamanho_indices} de índices.")
 
         cursor.close()
         connection.close()
 
         # Logar uso final de memória
-        logger.info(f"Uso de memória final: {psutil.virtual_memory().percent}%")
+        logger.info(f"Uso de memória final do processo: {rss_mb():.1f} MB")
+
+        estatisticas_cache = cache.estatisticas() if cache is not None else None
+        if estatisticas_cache:
+            logger.info(f"Cache de objetos do MinIO: {estatisticas_cache}")
+
+        return {'origens': origens, 'pipeline': metricas_pipeline, 'cache': estatisticas_cache}
 
     except Exception as e:
         logger.error(f"Erro ao processar a camada Silver: {e}")
         raise
 
+def main(**parametros):
+    """Ponto de entrada da camada Silver; aceita os mesmos parâmetros de processar_camada_silver."""
+    with sessao('silver'):
+        return processar_camada_silver(**parametros)
+
 if __name__ == "__main__":
-    processar_camada_silver()
+    main()
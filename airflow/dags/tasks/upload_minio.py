@@ -0,0 +1,368 @@
+import base64
+import hashlib
+import io
+import logging
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from instrumentacao import contar
+
+logger = logging.getLogger(__name__)
+
+# O S3/MinIO exige partes de pelo menos 5 MiB (exceto a última)
+TAMANHO_PARTE_MINIMO = 5 * 1024 * 1024
+TAMANHO_PARTE_PADRAO = 16 * 1024 * 1024
+CONCORRENCIA_PADRAO = 4
+
+# Uploads multipart inacabados mais antigos que isso são abortados em vez de retomados
+IDADE_MAXIMA_PENDENTE = 24 * 60 * 60
+
+def criar_cliente_s3(endpoint_url, access_key, secret_key, max_conexoes=CONCORRENCIA_PADRAO):
+    """Cria um cliente S3 para o MinIO com um pool de conexões do tamanho da concorrência."""
+    return boto3.client(
+        's3',
+        endpoint_url=endpoint_url,
+        aws_access_key_id=access_key,
+        aws_secret_access_key=secret_key,
+        config=Config(max_pool_connections=max(max_conexoes, 10))
+    )
+
+def _intervalos_partes(tamanho_arquivo, tamanho_parte):
+    """Gera (numero_parte, inicio, comprimento) cobrindo o arquivo inteiro."""
+    numero = 1
+    for inicio in range(0, max(tamanho_arquivo, 1), tamanho_parte):
+        yield numero, inicio, min(tamanho_parte, tamanho_arquivo - inicio)
+        numero += 1
+
+def _ler_parte(caminho_arquivo, inicio, comprimento):
+    with open(caminho_arquivo, 'rb') as arquivo:
+        arquivo.seek(inicio)
+        return arquivo.read(comprimento)
+
+def _b64(digest):
+    return base64.b64encode(digest).decode('ascii')
+
+def calcular_checksums(caminho_arquivo, tamanho_parte):
+    """
+    Calcula MD5 e CRC32 de cada parte do arquivo em uma única leitura sequencial.
+
+    Retorna a lista de partes e o ETag que o S3 atribuiria ao objeto enviado com
+    esse tamanho de parte (MD5 simples para uma parte, MD5 dos MD5s + "-N" para multipart).
+    """
+    tamanho_arquivo = os.path.getsize(caminho_arquivo)
+    partes = []
+    with open(caminho_arquivo, 'rb') as arquivo:
+        for numero, inicio, comprimento in _intervalos_partes(tamanho_arquivo, tamanho_parte):
+            dados = arquivo.read(comprimento)
+            partes.append({
+                'numero': numero,
+                'inicio': inicio,
+                'comprimento': comprimento,
+                'md5': hashlib.md5(dados).digest(),
+                'crc32': zlib.crc32(dados).to_bytes(4, 'big'),
+            })
+
+    if len(partes) == 1:
+        etag = partes[0]['md5'].hex()
+    else:
+        etag = hashlib.md5(b''.join(parte['md5'] for parte in partes)).hexdigest() + f"-{len(partes)}"
+    return partes, etag
+
+def etag_remoto(s3_client, bucket_name, object_key):
+    """Retorna o ETag do objeto no bucket, ou None se ele não existir."""
+    try:
+        resposta = s3_client.head_object(Bucket=bucket_name, Key=object_key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+    return resposta['ETag'].strip('"')
+
+def _uploads_pendentes(s3_client, bucket_name, object_key):
+    """Multipart uploads inacabados do objeto, do mais recente para o mais antigo."""
+    uploads = []
+    paginator = s3_client.get_paginator('list_multipart_uploads')
+    for pagina in paginator.paginate(Bucket=bucket_name, Prefix=object_key):
+        uploads.extend(u for u in pagina.get('Uploads', []) if u['Key'] == object_key)
+    return sorted(uploads, key=lambda u: u['Initiated'], reverse=True)
+
+def _abortar_upload(s3_client, bucket_name, object_key, upload_id, motivo):
+    logger.info(f"Abortando o upload pendente {upload_id} de {bucket_name}/{object_key}: {motivo}.")
+    s3_client.abort_multipart_upload(Bucket=bucket_name, Key=object_key, UploadId=upload_id)
+    contar('uploads_abortados')
+
+def _limpar_uploads_pendentes(s3_client, bucket_name, object_key, motivo):
+    """Aborta todos os uploads inacabados do objeto (as partes ocupam espaço no bucket até isso)."""
+    for upload in _uploads_pendentes(s3_client, bucket_name, object_key):
+        _abortar_upload(s3_client, bucket_name, object_key, upload['UploadId'], motivo)
+
+def _partes_ja_enviadas(s3_client, bucket_name, object_key, upload_id):
+    enviadas = {}
+    paginator = s3_client.get_paginator('list_parts')
+    for pagina in paginator.paginate(Bucket=bucket_name, Key=object_key, UploadId=upload_id):
+        for parte in pagina.get('Parts', []):
+            enviadas[parte['PartNumber']] = parte
+    return enviadas
+
+def _mesma_origem(enviadas, partes):
+    """As partes já no servidor são do arquivo local (mesmo número, tamanho e MD5)?"""
+    locais = {parte['numero']: parte for parte in partes}
+    return all(
+        numero in locais
+        and enviada['Size'] == locais[numero]['comprimento']
+        and enviada['ETag'].strip('"') == locais[numero]['md5'].hex()
+        for numero, enviada in enviadas.items()
+    )
+
+def _upload_pendente(s3_client, bucket_name, object_key, partes, idade_maxima=IDADE_MAXIMA_PENDENTE):
+    """
+    Procura um multipart upload inacabado do mesmo arquivo para ser retomado e retorna
+    (upload_id, partes já enviadas), ou (None, {}). Os demais uploads do objeto são
+    abortados: os iniciados há mais de idade_maxima segundos, os com partes de outra
+    versão do arquivo (ou de outro tamanho de parte) e os mais antigos que o retomado.
+    """
+    agora = datetime.now(timezone.utc)
+    retomado = None
+    for upload in _uploads_pendentes(s3_client, bucket_name, object_key):
+        upload_id = upload['UploadId']
+        idade = (agora - upload['Initiated']).total_seconds()
+        if retomado is not None:
+            _abortar_upload(s3_client, bucket_name, object_key, upload_id, "há um upload mais recente para retomar")
+        elif idade > idade_maxima:
+            _abortar_upload(s3_client, bucket_name, object_key, upload_id, f"iniciado há {idade / 3600:.1f} h")
+        else:
+            enviadas = _partes_ja_enviadas(s3_client, bucket_name, object_key, upload_id)
+            if _mesma_origem(enviadas, partes):
+                retomado = (upload_id, enviadas)
+            else:
+                _abortar_upload(s3_client, bucket_name, object_key, upload_id, "partes de outra versão do arquivo")
+    return retomado or (None, {})
+
+def enviar_arquivo_multipart(
+    s3_client,
+    caminho_arquivo,
+    bucket_name,
+    object_key,
+    tamanho_parte=TAMANHO_PARTE_PADRAO,
+    concorrencia=CONCORRENCIA_PADRAO,
+    checksum_crc32=False,
+    forcar=False,
+    idade_maxima_pendente=IDADE_MAXIMA_PENDENTE,
+):
+    """
+    Envia um arquivo local ao MinIO em partes paralelas.
+
+    - Cada parte é enviada com Content-MD5 (e CRC32, se checksum_crc32=True), então o
+      servidor rejeita partes corrompidas no caminho.
+    - Se o ETag do objeto remoto já corresponde ao arquivo local, o envio é pulado.
+    - Um multipart upload interrompido do mesmo arquivo é retomado, reenviando apenas
+      as partes que faltam. Uploads pendentes do objeto iniciados há mais de
+      idade_maxima_pendente segundos ou com partes de outra versão do arquivo são
+      abortados, assim como todos eles quando o envio é pulado.
+
+    Retorna um dicionário com o ETag, o número de bytes enviados e se houve envio.
+    """
+    if tamanho_parte < TAMANHO_PARTE_MINIMO:
+        raise ValueError(f"Tamanho de parte deve ser de pelo menos {TAMANHO_PARTE_MINIMO} bytes.")
+
+    if not os.path.exists(caminho_arquivo):
+        raise FileNotFoundError(f"Arquivo não encontrado: {caminho_arquivo}")
+
+    inicio_envio = time.monotonic()
+    partes, etag = calcular_checksums(caminho_arquivo, tamanho_parte)
+    tamanho_arquivo = sum(parte['comprimento'] for parte in partes)
+
+    if not forcar and etag_remoto(s3_client, bucket_name, object_key) == etag:
+        logger.info(f"Objeto {bucket_name}/{object_key} já está atualizado (ETag {etag}). Envio ignorado.")
+        _limpar_uploads_pendentes(s3_client, bucket_name, object_key, "o objeto já está atualizado")
+        return {'etag': etag, 'bytes_enviados': 0, 'enviado': False}
+
+    checksum_args = {'ChecksumAlgorithm': 'CRC32'} if checksum_crc32 else {}
+
+    if len(partes) == 1:
+        _limpar_uploads_pendentes(s3_client, bucket_name, object_key, "o arquivo é enviado em uma única parte")
+        parte = partes[0]
+        extras = {'ChecksumCRC32': _b64(parte['crc32'])} if checksum_crc32 else {}
+        s3_client.put_object(
+            Bucket=bucket_name,
+            Key=object_key,
+            Body=_ler_parte(caminho_arquivo, 0, parte['comprimento']),
+            ContentMD5=_b64(parte['md5']),
+            **extras
+        )
+        bytes_enviados = tamanho_arquivo
+    else:
+        upload_id, ja_enviadas = _upload_pendente(s3_client, bucket_name, object_key, partes, idade_maxima_pendente)
+        if upload_id:
+            logger.info(f"Retomando upload {upload_id}: {len(ja_enviadas)} partes já no servidor.")
+        else:
+            upload_id = s3_client.create_multipart_upload(Bucket=bucket_name, Key=object_key, **checksum_args)['UploadId']
+
+        def enviar_parte(parte):
+            dados = _ler_parte(caminho_arquivo, parte['inicio'], parte['comprimento'])
+            extras = {'ChecksumCRC32': _b64(parte['crc32'])} if checksum_crc32 else {}
+            resposta = s3_client.upload_part(
+                Bucket=bucket_name,
+                Key=object_key,
+                UploadId=upload_id,
+                PartNumber=parte['numero'],
+                Body=dados,
+                ContentMD5=_b64(parte['md5']),
+                **extras
+            )
+            logger.info(f"Parte {parte['numero']}/{len(partes)} enviada ({parte['comprimento']} bytes).")
+            return resposta
+
+        pendentes = []
+        concluidas = {}
+        for parte in partes:
+            existente = ja_enviadas.get(parte['numero'])
+            if (existente and existente['Size'] == parte['comprimento']
+                    and existente['ETag'].strip('"') == parte['md5'].hex()):
+                concluidas[parte['numero']] = existente
+            else:
+                pendentes.append(parte)
+
+        with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+            for parte, resposta in zip(pendentes, executor.map(enviar_parte, pendentes)):
+                concluidas[parte['numero']] = resposta
+
+        partes_finais = []
+        for parte in partes:
+            info = {'PartNumber': parte['numero'], 'ETag': concluidas[parte['numero']]['ETag']}
+            if checksum_crc32:
+                info['ChecksumCRC32'] = _b64(parte['crc32'])
+            partes_finais.append(info)
+
+        s3_client.complete_multipart_upload(
+            Bucket=bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': partes_finais}
+        )
+        bytes_enviados = sum(parte['comprimento'] for parte in pendentes)
+
+    segundos = time.monotonic() - inicio_envio
+    logger.info(
+        f"Objeto {bucket_name}/{object_key} enviado: {bytes_enviados} bytes em {segundos:.2f}s "
+        f"({bytes_enviados / 1024 / 1024 / max(segundos, 1e-9):.2f} MB/s, {len(partes)} partes)."
+    )
+    contar('bytes_gravados', bytes_enviados)
+    return {'etag': etag, 'bytes_enviados': bytes_enviados, 'enviado': True}
+
+class EscritorMultipartS3(io.RawIOBase):
+    """
+    Arquivo somente-escrita que envia o conteúdo ao MinIO em multipart à medida que é
+    escrito, para uso com escritores em streaming como o pq.ParquetWriter.
+
+    Cada parte completa é enviada em uma thread enquanto o chamador continua produzindo
+    dados, e no máximo `concorrencia` partes ficam em memória ao mesmo tempo (a escrita
+    bloqueia quando todas as vagas estão ocupadas). O objeto só passa a existir no bucket
+    quando o arquivo é fechado sem erro; se o bloco `with` terminar com exceção, o
+    multipart upload é abortado.
+    """
+
+    def __init__(self, s3_client, bucket_name, object_key, tamanho_parte=TAMANHO_PARTE_PADRAO, concorrencia=CONCORRENCIA_PADRAO):
+        super().__init__()
+        if tamanho_parte < TAMANHO_PARTE_MINIMO:
+            raise ValueError(f"Tamanho de parte deve ser de pelo menos {TAMANHO_PARTE_MINIMO} bytes.")
+        self._s3_client = s3_client
+        self._bucket_name = bucket_name
+        self._object_key = object_key
+        self._tamanho_parte = tamanho_parte
+        self._buffer = bytearray()
+        self._posicao = 0
+        self._numero_parte = 0
+        self._futuros = []
+        self._executor = ThreadPoolExecutor(max_workers=concorrencia)
+        self._vagas = threading.BoundedSemaphore(concorrencia)
+        self._upload_id = s3_client.create_multipart_upload(Bucket=bucket_name, Key=object_key)['UploadId']
+        logger.info(f"Multipart upload iniciado para {bucket_name}/{object_key}.")
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._posicao
+
+    def write(self, dados):
+        self._buffer += dados
+        self._posicao += len(dados)
+        contar('bytes_gravados', len(dados))
+        while len(self._buffer) >= self._tamanho_parte:
+            parte = bytes(self._buffer[:self._tamanho_parte])
+            del self._buffer[:self._tamanho_parte]
+            self._enviar_parte(parte)
+        return len(dados)
+
+    def _enviar_parte(self, dados):
+        # Falhar cedo se alguma parte anterior já deu erro
+        for _, futuro in self._futuros:
+            if futuro.done() and futuro.exception() is not None:
+                raise futuro.exception()
+
+        self._vagas.acquire()
+        self._numero_parte += 1
+        numero = self._numero_parte
+
+        def enviar():
+            try:
+                resposta = self._s3_client.upload_part(
+                    Bucket=self._bucket_name,
+                    Key=self._object_key,
+                    UploadId=self._upload_id,
+                    PartNumber=numero,
+                    Body=dados,
+                    ContentMD5=_b64(hashlib.md5(dados).digest())
+                )
+                logger.info(f"Parte {numero} de {self._object_key} enviada ({len(dados)} bytes).")
+                return resposta['ETag']
+            finally:
+                self._vagas.release()
+
+        self._futuros.append((numero, self._executor.submit(enviar)))
+
+    def close(self):
+        """Envia a última parte e conclui o multipart upload."""
+        if self.closed:
+            return
+        try:
+            if self._buffer or self._numero_parte == 0:
+                self._enviar_parte(bytes(self._buffer))
+                self._buffer = bytearray()
+            partes = [{'PartNumber': numero, 'ETag': futuro.result()} for numero, futuro in self._futuros]
+            self._s3_client.complete_multipart_upload(
+                Bucket=self._bucket_name,
+                Key=self._object_key,
+                UploadId=self._upload_id,
+                MultipartUpload={'Parts': partes}
+            )
+            logger.info(f"Objeto {self._bucket_name}/{self._object_key} concluído: {self._posicao} bytes em {len(partes)} partes.")
+        except Exception:
+            self._abortar()
+            raise
+        finally:
+            self._executor.shutdown(wait=True)
+            super().close()
+
+    def _abortar(self):
+        logger.warning(f"Abortando multipart upload de {self._bucket_name}/{self._object_key}.")
+        self._s3_client.abort_multipart_upload(Bucket=self._bucket_name, Key=self._object_key, UploadId=self._upload_id)
+
+    def __exit__(self, tipo_excecao, excecao, traceback):
+        if tipo_excecao is None:
+            self.close()
+            return
+        try:
+            self._executor.shutdown(wait=True)
+            self._abortar()
+        finally:
+            super().close()
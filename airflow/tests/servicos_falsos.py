@@ -0,0 +1,245 @@
+"""
+Substitutos dos serviços usados pelas camadas nos testes: um S3 local (moto, em uma
+thread do próprio processo) no lugar do MinIO e um MySQL falso em memória que entende
+só os comandos emitidos pela Silver.
+"""
+import itertools
+import logging
+import os
+import re
+import sys
+import threading
+import urllib.request
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dags', 'tasks'))
+
+from carga_incremental import TABELA_MANIFESTO  # noqa: E402
+from particionamento import criar_filesystem_s3  # noqa: E402
+
+try:
+    from moto.server import ThreadedMotoServer
+except ImportError:  # moto só é necessário para os testes com S3
+    ThreadedMotoServer = None
+
+MOTO_DISPONIVEL = ThreadedMotoServer is not None
+
+class ServidorS3:
+    """Servidor S3 do moto em uma porta livre, com clientes boto3 e pyarrow apontando para ele."""
+
+    def __init__(self):
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        self._servidor = ThreadedMotoServer(ip_address='127.0.0.1', port=0, verbose=False)
+        self._servidor.start()
+        host, porta = self._servidor.get_host_and_port()
+        self.endpoint_url = f"http://{host}:{porta}"
+
+    def parar(self):
+        self._servidor.stop()
+
+    def limpar(self, *buckets):
+        """Apaga todo o estado do servidor e cria os buckets informados."""
+        urllib.request.urlopen(urllib.request.Request(f"{self.endpoint_url}/moto-api/reset", method='POST'))
+        cliente = self.cliente()
+        for bucket in buckets:
+            cliente.create_bucket(Bucket=bucket)
+
+    def cliente(self, **kwargs):
+        return boto3.client(
+            's3', **dict(kwargs, endpoint_url=self.endpoint_url, aws_access_key_id='teste', aws_secret_access_key='teste')
+        )
+
+    def filesystem(self):
+        return criar_filesystem_s3(self.endpoint_url, 'teste', 'teste')
+
+class BancoFalso:
+    """
+    Estado compartilhado pelas conexões falsas. Cada tabela é um dicionário chave
+    primária -> linha e cada resumo da Gold uma lista de linhas; comandos guarda os
+    comandos recebidos e linhas_recebidas quantas linhas chegaram em INSERTs em cada tabela.
+    """
+
+    def __init__(self, chaves=None):
+        self.chaves = chaves or {'acidentes_silver': ['id'], TABELA_MANIFESTO: ['origem']}
+        self.tabelas = {tabela: {} for tabela in self.chaves}
+        self.resumos = {}
+        self.colunas = {}
+        self.indices = set()
+        self.comandos = []
+        self.linhas_recebidas = {tabela: 0 for tabela in self.chaves}
+        self.literais = {}
+        self._contador = itertools.count()
+        self.trava = threading.Lock()
+
+    def conectar(self, **kwargs):
+        return ConexaoFalsa(self)
+
+    def comandos_em(self, tabela, prefixo="INSERT INTO"):
+        return [comando for comando in self.comandos if comando.startswith(f"{prefixo} {tabela} ")]
+
+class ConexaoFalsa:
+    """
+    Conexão com o banco falso. escape devolve um marcador (@N) para a linha, que o
+    cursor resolve de volta nos INSERTs de várias linhas do backend multirow.
+    """
+
+    def __init__(self, banco):
+        self.banco = banco
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def escape(self, linha):
+        with self.banco.trava:
+            marcador = f"@{next(self.banco._contador)}"
+            self.banco.literais[marcador] = linha
+        return marcador
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+class CursorFalso:
+    """
+    Cursor que entende só os comandos usados pela Silver. O INSERT ... ON DUPLICATE KEY
+    UPDATE devolve as linhas afetadas como o MySQL: 1 por inserção, 2 por atualização e
+    0 quando a linha já tinha os mesmos valores.
+    """
+
+    INSERT = re.compile(r"INSERT INTO (\w+) \(([^)]*)\) VALUES (.*?)(?: ON DUPLICATE KEY UPDATE (.*))?$", re.S)
+    DELETE_RESUMO = re.compile(r"DELETE FROM (gold_resumo_\w+)(?: WHERE (.*))?$")
+    INSERT_RESUMO = re.compile(r"INSERT INTO (gold_resumo_\w+) \(([^)]*)\) SELECT .* FROM acidentes_silver WHERE (.*) GROUP BY")
+    COLUNA = re.compile(r"`(\w+)` ([A-Z]+(?:\(\d+\))?(?: UNSIGNED)?) (?:NOT )?NULL")
+
+    def __init__(self, conexao):
+        self.connection = conexao
+        self.banco = conexao.banco
+        self.resultado = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.close()
+
+    def close(self):
+        pass
+
+    def execute(self, query, parametros=None):
+        query = " ".join(query.split())
+        with self.banco.trava:
+            self.banco.comandos.append(query)
+            return self._executar(query, parametros)
+
+    def _executar(self, query, parametros):
+        banco = self.banco
+        self.resultado = []
+        if query.startswith("CREATE TABLE IF NOT EXISTS acidentes_silver "):
+            banco.colunas = dict(self.COLUNA.findall(query))
+            banco.indices = {'PRIMARY'} | set(re.findall(r"KEY `(\w+)`", query))
+            return 0
+        if query.startswith("CREATE TABLE IF NOT EXISTS"):
+            return 0
+        if query.startswith("ALTER TABLE acidentes_silver MODIFY"):
+            banco.colunas.update(self.COLUNA.findall(query))
+            return 0
+        if query == "SELECT @@max_allowed_packet":
+            self.resultado = [(16 * 1024 * 1024,)]
+        elif query.startswith(f"SELECT origem, hash_conteudo FROM {TABELA_MANIFESTO}"):
+            manifesto = banco.tabelas[TABELA_MANIFESTO]
+            self.resultado = [
+                (origem, manifesto[(origem,)]['hash_conteudo']) for origem in parametros if (origem,) in manifesto
+            ]
+        elif "FROM information_schema.columns" in query:
+            self.resultado = list(banco.colunas.items())
+        elif "FROM information_schema.statistics" in query:
+            self.resultado = [(nome,) for nome in sorted(banco.indices)]
+        elif "FROM information_schema.table_constraints" in query:
+            self.resultado = [(1,)]
+        elif "FROM information_schema.tables" in query:
+            self.resultado = [(0, 0, 0)]
+        elif query.startswith("INSERT INTO acidentes_silver "):
+            encontrado = self.INSERT.match(query)
+            assert encontrado, query
+            tabela, colunas, valores, atualizacao = encontrado.groups()
+            linhas = [banco.literais.pop(marcador) for marcador in valores.split(",")]
+            return self._upsert(tabela, colunas, linhas, atualizacao)
+        elif query.startswith("SELECT DISTINCT data_inversa FROM acidentes_silver WHERE id IN"):
+            registros = banco.tabelas['acidentes_silver']
+            self.resultado = list({(registros[(id_,)]['data_inversa'],) for id_ in parametros if (id_,) in registros})
+        elif query.startswith("DELETE FROM gold_resumo_"):
+            resumo, condicao = self.DELETE_RESUMO.match(query).groups()
+            filtro = self._filtro_data(condicao, parametros)
+            banco.resumos[resumo] = [linha for linha in banco.resumos.get(resumo, []) if not filtro(linha['data_inversa'])]
+            return 0
+        elif query.startswith("INSERT INTO gold_resumo_"):
+            resumo, colunas, condicao = self.INSERT_RESUMO.match(query).groups()
+            banco.resumos.setdefault(resumo, []).extend(self._agregar(colunas, self._filtro_data(condicao, parametros)))
+            return 0
+        else:
+            raise AssertionError(f"Comando inesperado: {query}")
+        return len(self.resultado)
+
+    @staticmethod
+    def _filtro_data(condicao, parametros):
+        if condicao in (None, "1 = 1"):
+            return lambda data: True
+        if condicao == "data_inversa IS NULL":
+            return lambda data: data is None
+        assert condicao.startswith("data_inversa IN"), condicao
+        datas = set(parametros)
+        return lambda data: data in datas
+
+    def _agregar(self, colunas, filtro):
+        """Mesmo GROUP BY data_inversa, <dimensão> dos selects de aggregates.SUMMARY_TABLES."""
+        colunas = [coluna.strip() for coluna in colunas.split(",")]
+        grupos = {}
+        for linha in self.banco.tabelas['acidentes_silver'].values():
+            if filtro(linha['data_inversa']):
+                grupo = grupos.setdefault((linha['data_inversa'], linha[colunas[1]]), {'acidentes': 0, 'mortos': 0})
+                grupo['acidentes'] += 1
+                grupo['mortos'] += linha['mortos'] or 0
+        return [
+            dict(zip(colunas[:2], chave), **{coluna: grupo[coluna] for coluna in colunas[2:]})
+            for chave, grupo in grupos.items()
+        ]
+
+    def executemany(self, query, linhas):
+        query = " ".join(query.split())
+        encontrado = self.INSERT.match(query)
+        assert encontrado, query
+        tabela, colunas, _, atualizacao = encontrado.groups()
+        with self.banco.trava:
+            self.banco.comandos.append(query)
+            return self._upsert(tabela, colunas, linhas, atualizacao)
+
+    def _upsert(self, tabela, colunas, linhas, atualizacao):
+        colunas = [coluna.strip(" `") for coluna in colunas.split(",")]
+        atualizadas = re.findall(r"`?(\w+)`? = VALUES\(", atualizacao or "")
+        registros = self.banco.tabelas[tabela]
+        afetadas = 0
+        for linha in linhas:
+            registro = dict(zip(colunas, linha))
+            chave = tuple(registro[coluna] for coluna in self.banco.chaves[tabela])
+            if chave not in registros:
+                registros[chave] = registro
+                afetadas += 1
+            elif atualizacao is None:
+                raise AssertionError(f"Chave duplicada {chave} em {tabela}")
+            else:
+                novo = dict(registros[chave], **{coluna: registro[coluna] for coluna in atualizadas})
+                if novo != registros[chave]:
+                    registros[chave] = novo
+                    afetadas += 2
+        self.banco.linhas_recebidas[tabela] += len(linhas)
+        return afetadas
+
+    def fetchall(self):
+        return self.resultado
+
+    def fetchone(self):
+        return self.resultado[0] if self.resultado else None
@@ -0,0 +1,211 @@
+"""
+Testes da carga incremental da Silver: as funções de carga_incremental.py com um
+cliente S3 falso e silver.processar_camada_silver de ponta a ponta com um S3 do moto
+e um MySQL falso (servicos_falsos.py). Nenhum serviço externo é necessário.
+
+Uso: python -m unittest discover -s airflow/tests
+"""
+import datetime
+import io
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest import mock
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dags', 'tasks'))
+
+import silver  # noqa: E402
+from cache_minio import CacheObjetosS3  # noqa: E402
+from carga_incremental import TABELA_MANIFESTO, clausula_upsert, hashes_das_origens, origens_pendentes  # noqa: E402
+from particionamento import escrever_particionado, ler_particoes  # noqa: E402
+from servicos_falsos import MOTO_DISPONIVEL, BancoFalso, ServidorS3  # noqa: E402
+from upload_minio import EscritorMultipartS3  # noqa: E402
+
+class S3Falso:
+    """Responde head_object com o ETag (entre aspas, como o MinIO) de cada objeto."""
+
+    def __init__(self, etags):
+        self.etags = etags
+        self.chamadas = []
+
+    def head_object(self, Bucket, Key):
+        self.chamadas.append(f"{Bucket}/{Key}")
+        return {'ETag': f'"{self.etags[f"{Bucket}/{Key}"]}"'}
+
+class TestOrigensPendentes(unittest.TestCase):
+
+    def test_nada_pendente_quando_os_etags_conferem(self):
+        s3_client = S3Falso({'bronze/data.parquet': 'abc-2', 'bronze/acidentes_2024.parquet': 'def-1'})
+        hashes = hashes_das_origens(s3_client, list(s3_client.etags))
+        self.assertEqual(hashes, s3_client.etags)
+        self.assertEqual(origens_pendentes(hashes, dict(s3_client.etags)), [])
+
+    def test_origens_novas_ou_alteradas_ficam_pendentes(self):
+        hashes = {'bronze/data.parquet': 'abc-2', 'bronze/acidentes_2024.parquet': 'novo-1'}
+        manifesto = {'bronze/acidentes_2024.parquet': 'def-1'}
+        self.assertEqual(
+            origens_pendentes(hashes, manifesto),
+            ['bronze/data.parquet', 'bronze/acidentes_2024.parquet']
+        )
+
+class TestClausulaUpsert(unittest.TestCase):
+
+    def test_atualiza_so_colunas_fora_da_chave(self):
+        self.assertEqual(
+            clausula_upsert(['id', 'uf', 'mortos'], ['id']),
+            "ON DUPLICATE KEY UPDATE `uf` = VALUES(`uf`), `mortos` = VALUES(`mortos`)"
+        )
+
+    def test_so_colunas_da_chave(self):
+        self.assertEqual(clausula_upsert(['id'], ['id']), "ON DUPLICATE KEY UPDATE `id` = `id`")
+
+def tabela_bronze(linhas):
+    """Tabela da Bronze a partir de (id, data_inversa, mortos), com as colunas dos resumos da Gold."""
+    ids, datas, mortos = zip(*linhas)
+    return pa.table({
+        'id': pa.array(ids, pa.int64()),
+        'data_inversa': pa.array(datas, pa.date32()),
+        'uf': ['SP'] * len(ids),
+        'mortos': pa.array(mortos, pa.int64()),
+        'causa_principal': ['Velocidade'] * len(ids),
+        'condicao_metereologica': ['Normal'] * len(ids),
+    })
+
+ACIDENTES_2024 = [(1, datetime.date(2024, 12, 30), 0), (2, datetime.date(2024, 12, 30), 1), (3, datetime.date(2024, 12, 30), 0)]
+# O arquivo de 2025 traz um acidente de 31/12/2024, na mesma partição dos de 2024
+ACIDENTES_2025 = [(10, datetime.date(2024, 12, 31), 0), (20, datetime.date(2025, 1, 2), 0)]
+
+@unittest.skipUnless(MOTO_DISPONIVEL, "moto não instalado")
+class TestSilverIncremental(unittest.TestCase):
+    """
+    silver.processar_camada_silver com o MinIO substituído por um S3 do moto e o MySQL
+    por servicos_falsos.BancoFalso, com o backend de carga padrão (multirow).
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.s3 = ServidorS3()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.s3.parar()
+
+    def setUp(self):
+        self.s3.limpar('bronze', 'silver')
+        self.s3_client = self.s3.cliente()
+        self.filesystem = self.s3.filesystem()
+        self.banco = BancoFalso()
+        self.cache = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache.cleanup)
+
+    def executar_silver(self, **parametros):
+        """Executa a Silver; retorna o resultado, as linhas enviadas ao MySQL e as escritas da saída."""
+        linhas_antes = self.banco.linhas_recebidas['acidentes_silver']
+        with mock.patch.object(silver, 'boto3', SimpleNamespace(client=lambda *args, **kwargs: self.s3.cliente())), \
+                mock.patch.object(silver, 'criar_filesystem_s3', side_effect=lambda *args: self.s3.filesystem()), \
+                mock.patch.object(silver, 'conectar_mysql', side_effect=self.banco.conectar), \
+                mock.patch.object(silver, 'CacheObjetosS3', side_effect=lambda cliente: CacheObjetosS3(cliente, self.cache.name)), \
+                mock.patch.object(silver, 'escrever_particionado', wraps=escrever_particionado) as escrita_particionada, \
+                mock.patch.object(silver, 'EscritorMultipartS3', wraps=EscritorMultipartS3) as escrita_objeto:
+            resultado = silver.processar_camada_silver(**parametros)
+        linhas = self.banco.linhas_recebidas['acidentes_silver'] - linhas_antes
+        return resultado, linhas, escrita_particionada.call_count + escrita_objeto.call_count
+
+    def publicar_objeto(self, chave, linhas):
+        buffer = io.BytesIO()
+        pq.write_table(tabela_bronze(linhas), buffer)
+        self.s3_client.put_object(Bucket='bronze', Key=chave, Body=buffer.getvalue())
+
+    def publicar_particionado(self, origem, linhas):
+        tabela = tabela_bronze(linhas)
+        escrever_particionado(iter(tabela.to_batches()), tabela.schema, 'bronze/acidentes', self.filesystem, prefixo_arquivo=origem)
+
+    def ids_na_silver(self, particionado=False):
+        if particionado:
+            tabela = ler_particoes('silver/acidentes', self.filesystem, colunas=['id'])
+        else:
+            tabela = pq.read_table('silver/data_silver_final.parquet', filesystem=self.filesystem, columns=['id'])
+        return sorted(tabela['id'].to_pylist())
+
+    def ids_no_mysql(self):
+        return sorted(chave[0] for chave in self.banco.tabelas['acidentes_silver'])
+
+    def resumo_uf_dia(self):
+        return sorted(
+            (linha['data_inversa'], linha['uf'], linha['acidentes'], linha['mortos'])
+            for linha in self.banco.resumos['gold_resumo_uf_dia']
+        )
+
+    def test_segunda_execucao_sem_mudancas_nao_faz_nada(self):
+        self.publicar_objeto('acidentes_2024.parquet', ACIDENTES_2024)
+        self.publicar_objeto('acidentes_2025.parquet', ACIDENTES_2025)
+        resultado, linhas, escritas = self.executar_silver()
+        self.assertEqual(resultado['origens'], ['bronze/acidentes_2024.parquet', 'bronze/acidentes_2025.parquet'])
+        self.assertEqual((linhas, escritas), (5, 1))
+        self.assertEqual(self.ids_na_silver(), [1, 2, 3, 10, 20])
+        self.assertEqual(self.ids_no_mysql(), [1, 2, 3, 10, 20])
+
+        comandos = len(self.banco.comandos_em('acidentes_silver'))
+        resultado, linhas, escritas = self.executar_silver()
+        self.assertEqual((resultado['origens'], linhas, escritas), ([], 0, 0))
+        self.assertEqual(len(self.banco.comandos_em('acidentes_silver')), comandos)
+
+    def test_origem_alterada_so_ela_volta_ao_mysql(self):
+        self.publicar_objeto('acidentes_2024.parquet', ACIDENTES_2024)
+        self.publicar_objeto('acidentes_2025.parquet', ACIDENTES_2025)
+        self.executar_silver()
+
+        self.publicar_objeto('acidentes_2025.parquet', [(10, datetime.date(2024, 12, 31), 2)] + ACIDENTES_2025[1:] + [
+            (21, datetime.date(2025, 1, 3), 0)
+        ])
+        resultado, linhas, escritas = self.executar_silver()
+        # O Parquet único é regravado com as duas origens, mas só a alterada vai ao MySQL
+        self.assertEqual(len(resultado['origens']), 2)
+        self.assertEqual((linhas, escritas), (3, 1))
+        self.assertEqual(self.ids_na_silver(), [1, 2, 3, 10, 20, 21])
+        self.assertEqual(self.ids_no_mysql(), [1, 2, 3, 10, 20, 21])
+        self.assertEqual(self.banco.tabelas['acidentes_silver'][(10,)]['mortos'], 2)
+        self.assertEqual(self.banco.tabelas[TABELA_MANIFESTO][('bronze/acidentes_2025.parquet',)]['hash_conteudo'],
+                         self.s3_client.head_object(Bucket='bronze', Key='acidentes_2025.parquet')['ETag'].strip('"'))
+
+    def test_id_com_data_alterada_atualiza_o_resumo_do_dia_antigo(self):
+        self.publicar_objeto('acidentes_2025.parquet', ACIDENTES_2025)
+        self.executar_silver()
+        self.assertEqual(self.resumo_uf_dia(), [
+            (datetime.date(2024, 12, 31), 'SP', 1, 0), (datetime.date(2025, 1, 2), 'SP', 1, 0),
+        ])
+
+        # O acidente 10 é republicado com a data corrigida: o resumo de 31/12 não pode continuar com ele
+        self.publicar_objeto('acidentes_2025.parquet', [(10, datetime.date(2025, 1, 5), 1)] + ACIDENTES_2025[1:])
+        self.executar_silver()
+        self.assertEqual(self.resumo_uf_dia(), [
+            (datetime.date(2025, 1, 2), 'SP', 1, 0), (datetime.date(2025, 1, 5), 'SP', 1, 1),
+        ])
+
+    def test_particionada_origem_alterada_mantem_as_demais_nas_particoes(self):
+        self.publicar_particionado('acidentes_2024', ACIDENTES_2024)
+        self.publicar_particionado('acidentes_2025', ACIDENTES_2025)
+        resultado, linhas, escritas = self.executar_silver(particionado=True)
+        self.assertEqual((len(resultado['origens']), linhas, escritas), (3, 5, 1))
+        self.assertEqual(self.ids_na_silver(particionado=True), [1, 2, 3, 10, 20])
+
+        self.publicar_particionado('acidentes_2025', [
+            (10, datetime.date(2024, 12, 31), 0), (11, datetime.date(2024, 12, 31), 0),
+            (12, datetime.date(2025, 1, 2), 0), (20, datetime.date(2025, 1, 2), 0),
+        ])
+        resultado, linhas, escritas = self.executar_silver(particionado=True)
+        # A partição 2024-12 é regravada com o arquivo de 2024, que não volta ao MySQL
+        self.assertEqual((len(resultado['origens']), linhas, escritas), (3, 4, 1))
+        self.assertEqual(self.ids_na_silver(particionado=True), [1, 2, 3, 10, 11, 12, 20])
+        self.assertEqual(self.ids_no_mysql(), [1, 2, 3, 10, 11, 12, 20])
+
+        resultado, linhas, escritas = self.executar_silver(particionado=True)
+        self.assertEqual((resultado['origens'], linhas, escritas), ([], 0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
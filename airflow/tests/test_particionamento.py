@@ -0,0 +1,83 @@
+"""
+Testes da escrita particionada (particionamento.py) em um LocalFileSystem: a Bronze
+e a Silver ficam em um diretório temporário, sem MinIO.
+
+Uso: python -m unittest discover -s airflow/tests
+"""
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+
+import pyarrow as pa
+from pyarrow import fs
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dags', 'tasks'))
+
+from particionamento import (  # noqa: E402
+    arquivos_das_particoes,
+    escrever_particionado,
+    iterar_arquivos,
+    listar_arquivos,
+    ler_particoes,
+)
+
+SCHEMA = pa.schema([('id', pa.int64()), ('data_inversa', pa.date32()), ('uf', pa.string()), ('mortos', pa.int64())])
+
+def lote(ids, data, uf='SP'):
+    return pa.RecordBatch.from_pydict(
+        {'id': ids, 'data_inversa': [data] * len(ids), 'uf': [uf] * len(ids), 'mortos': [0] * len(ids)},
+        schema=SCHEMA
+    )
+
+class TestSubstituicaoDeParticoes(unittest.TestCase):
+
+    def setUp(self):
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.filesystem = fs.LocalFileSystem()
+        self.bronze = os.path.join(self.diretorio.name, 'bronze', 'acidentes')
+        self.silver = os.path.join(self.diretorio.name, 'silver', 'acidentes')
+
+    def tearDown(self):
+        self.diretorio.cleanup()
+
+    def publicar_bronze(self, origem, lotes):
+        escrever_particionado(iter(lotes), SCHEMA, self.bronze, self.filesystem, prefixo_arquivo=origem)
+        return [arquivo for arquivo in listar_arquivos(self.bronze, self.filesystem)
+                if os.path.basename(arquivo).startswith(f"{origem}-")]
+
+    def regravar_silver(self, arquivos):
+        # Mesmo caminho da Silver particionada: lê os arquivos e substitui as partições deles
+        schema, lotes = iterar_arquivos(arquivos, self.bronze, self.filesystem)
+        escrever_particionado(lotes, schema, self.silver, self.filesystem, substituir_particoes=True)
+
+    def ids_na_silver(self):
+        return sorted(ler_particoes(self.silver, self.filesystem, colunas=['id'])['id'].to_pylist())
+
+    def test_origem_republicada_nao_apaga_linhas_de_outra_origem_na_mesma_particao(self):
+        # acidentes_2025 traz um acidente de 31/12/2024, na mesma partição de acidentes_2024
+        self.publicar_bronze('acidentes_2024', [lote([1, 2, 3], datetime.date(2024, 12, 30))])
+        self.publicar_bronze('acidentes_2025', [
+            lote([10], datetime.date(2024, 12, 31)),
+            lote([20], datetime.date(2025, 1, 2)),
+        ])
+        self.regravar_silver(listar_arquivos(self.bronze, self.filesystem))
+        self.assertEqual(self.ids_na_silver(), [1, 2, 3, 10, 20])
+
+        alterados = self.publicar_bronze('acidentes_2025', [
+            lote([10, 11], datetime.date(2024, 12, 31)),
+            lote([12, 20], datetime.date(2025, 1, 2)),
+        ])
+        origens = arquivos_das_particoes(listar_arquivos(self.bronze, self.filesystem), alterados)
+        self.assertEqual(len(origens), len(alterados) + 1)
+        self.regravar_silver(origens)
+        self.assertEqual(self.ids_na_silver(), [1, 2, 3, 10, 11, 12, 20])
+
+    def test_particoes_nao_tocadas_nao_sao_relidas(self):
+        self.publicar_bronze('acidentes_2024', [lote([1], datetime.date(2024, 3, 1)), lote([2], datetime.date(2024, 4, 1))])
+        alterados = [arquivo for arquivo in listar_arquivos(self.bronze, self.filesystem) if '/mes=3/' in arquivo]
+        self.assertEqual(arquivos_das_particoes(listar_arquivos(self.bronze, self.filesystem), alterados), alterados)
+
+if __name__ == '__main__':
+    unittest.main()
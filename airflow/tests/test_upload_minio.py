@@ -0,0 +1,168 @@
+"""
+Testes do envio ao MinIO (upload_minio.py) contra um S3 do moto: ETag conferido antes
+do envio, checksums por parte, retomada e descarte de multipart uploads pendentes e o
+escritor em streaming.
+
+Uso: python -m unittest discover -s airflow/tests
+"""
+import base64
+import datetime
+import hashlib
+import os
+import sys
+import tempfile
+import unittest
+import zlib
+from unittest import mock
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dags', 'tasks'))
+
+import upload_minio  # noqa: E402
+from servicos_falsos import MOTO_DISPONIVEL, ServidorS3  # noqa: E402
+from upload_minio import EscritorMultipartS3, calcular_checksums, enviar_arquivo_multipart  # noqa: E402
+
+MB = 1024 * 1024
+TAMANHO_PARTE = 5 * MB
+CHAVE = 'data.parquet'
+
+@unittest.skipUnless(MOTO_DISPONIVEL, "moto não instalado")
+class TestEnvioMultipart(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.s3 = ServidorS3()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.s3.parar()
+
+    def setUp(self):
+        self.s3.limpar('bronze')
+        self.s3_client = self.s3.cliente()
+        self.diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.diretorio.cleanup)
+        # 12 MiB: partes de 5, 5 e 2 MiB
+        self.conteudo = os.urandom(12 * MB)
+        self.arquivo = self.gravar('data.parquet', self.conteudo)
+
+    def gravar(self, nome, conteudo):
+        caminho = os.path.join(self.diretorio.name, nome)
+        with open(caminho, 'wb') as arquivo:
+            arquivo.write(conteudo)
+        return caminho
+
+    def enviar(self, caminho=None, **kwargs):
+        return enviar_arquivo_multipart(self.s3_client, caminho or self.arquivo, 'bronze', CHAVE, tamanho_parte=TAMANHO_PARTE, **kwargs)
+
+    def iniciar_pendente(self, conteudo, partes):
+        """Multipart upload interrompido depois de enviar as primeiras partes de conteudo."""
+        upload_id = self.s3_client.create_multipart_upload(Bucket='bronze', Key=CHAVE)['UploadId']
+        for numero in range(1, partes + 1):
+            inicio = (numero - 1) * TAMANHO_PARTE
+            self.s3_client.upload_part(
+                Bucket='bronze', Key=CHAVE, UploadId=upload_id, PartNumber=numero,
+                Body=conteudo[inicio:inicio + TAMANHO_PARTE]
+            )
+        return upload_id
+
+    def pendentes(self):
+        return [upload['UploadId'] for upload in self.s3_client.list_multipart_uploads(Bucket='bronze').get('Uploads', [])]
+
+    def horas_depois_do_inicio(self, horas):
+        """Relógio do upload_minio adiantado em relação ao início do upload pendente."""
+        iniciado = self.s3_client.list_multipart_uploads(Bucket='bronze')['Uploads'][0]['Initiated']
+        relogio = mock.patch.object(upload_minio, 'datetime', wraps=datetime.datetime)
+        falso = relogio.start()
+        self.addCleanup(relogio.stop)
+        falso.now.return_value = iniciado + datetime.timedelta(hours=horas)
+
+    def test_etag_local_confere_com_o_s3_e_segundo_envio_e_pulado(self):
+        resultado = self.enviar()
+        self.assertEqual((resultado['enviado'], resultado['bytes_enviados']), (True, 12 * MB))
+        self.assertTrue(resultado['etag'].endswith('-3'))
+        self.assertEqual(self.s3_client.head_object(Bucket='bronze', Key=CHAVE)['ETag'].strip('"'), resultado['etag'])
+
+        resultado = self.enviar()
+        self.assertEqual((resultado['enviado'], resultado['bytes_enviados']), (False, 0))
+
+    def partes_enviadas(self, **kwargs):
+        """Envia o arquivo registrando os argumentos de cada upload_part."""
+        with mock.patch.object(self.s3_client, 'upload_part', wraps=self.s3_client.upload_part) as upload_part:
+            resultado = self.enviar(**kwargs)
+        return resultado, sorted((chamada.kwargs for chamada in upload_part.call_args_list), key=lambda parte: parte['PartNumber'])
+
+    def test_cada_parte_leva_o_md5_dos_proprios_bytes(self):
+        # O moto aceita qualquer Content-MD5, então a conferência é feita aqui
+        resultado, partes = self.partes_enviadas()
+        self.assertEqual([parte['PartNumber'] for parte in partes], [1, 2, 3])
+        for parte in partes:
+            self.assertEqual(parte['ContentMD5'], base64.b64encode(hashlib.md5(parte['Body']).digest()).decode())
+            self.assertNotIn('ChecksumCRC32', parte)
+        self.assertEqual(b''.join(parte['Body'] for parte in partes), self.conteudo)
+
+    def test_checksum_crc32_por_parte(self):
+        resultado, partes = self.partes_enviadas(checksum_crc32=True)
+        for parte in partes:
+            crc32 = zlib.crc32(parte['Body']).to_bytes(4, 'big')
+            self.assertEqual(parte['ChecksumCRC32'], base64.b64encode(crc32).decode())
+        self.assertEqual(resultado['etag'], calcular_checksums(self.arquivo, TAMANHO_PARTE)[1])
+        objeto = self.s3_client.get_object(Bucket='bronze', Key=CHAVE)
+        self.assertEqual(objeto['Body'].read(), self.conteudo)
+
+    def test_upload_pendente_do_mesmo_arquivo_e_retomado(self):
+        upload_id = self.iniciar_pendente(self.conteudo, 2)
+        self.horas_depois_do_inicio(1)
+        with mock.patch.object(self.s3_client, 'create_multipart_upload') as novo_upload:
+            resultado = self.enviar()
+        novo_upload.assert_not_called()
+        # Só a última parte (2 MiB) faltava
+        self.assertEqual(resultado['bytes_enviados'], 2 * MB)
+        self.assertNotIn(upload_id, self.pendentes())
+        self.assertEqual(self.s3_client.get_object(Bucket='bronze', Key=CHAVE)['Body'].read(), self.conteudo)
+
+    def test_upload_pendente_antigo_e_abortado(self):
+        upload_id = self.iniciar_pendente(self.conteudo, 2)
+        self.horas_depois_do_inicio(25)
+        with mock.patch.object(self.s3_client, 'abort_multipart_upload', wraps=self.s3_client.abort_multipart_upload) as abortar:
+            resultado = self.enviar()
+        abortar.assert_called_once_with(Bucket='bronze', Key=CHAVE, UploadId=upload_id)
+        self.assertEqual(resultado['bytes_enviados'], 12 * MB)
+        self.assertEqual(self.pendentes(), [])
+
+    def test_upload_pendente_de_outro_arquivo_e_abortado(self):
+        upload_id = self.iniciar_pendente(os.urandom(12 * MB), 2)
+        self.horas_depois_do_inicio(1)
+        with mock.patch.object(self.s3_client, 'abort_multipart_upload', wraps=self.s3_client.abort_multipart_upload) as abortar:
+            resultado = self.enviar()
+        abortar.assert_called_once_with(Bucket='bronze', Key=CHAVE, UploadId=upload_id)
+        self.assertEqual(resultado['bytes_enviados'], 12 * MB)
+        self.assertEqual(self.s3_client.get_object(Bucket='bronze', Key=CHAVE)['Body'].read(), self.conteudo)
+
+    def test_envio_pulado_descarta_uploads_pendentes(self):
+        self.enviar()
+        self.iniciar_pendente(self.conteudo, 1)
+        resultado = self.enviar()
+        self.assertFalse(resultado['enviado'])
+        self.assertEqual(self.pendentes(), [])
+
+    def test_escritor_grava_o_objeto_ao_fechar(self):
+        with EscritorMultipartS3(self.s3_client, 'bronze', CHAVE, tamanho_parte=TAMANHO_PARTE) as destino:
+            for inicio in range(0, len(self.conteudo), MB):
+                destino.write(self.conteudo[inicio:inicio + MB])
+        self.assertEqual(self.s3_client.get_object(Bucket='bronze', Key=CHAVE)['Body'].read(), self.conteudo)
+        self.assertEqual(self.pendentes(), [])
+
+    def test_escritor_aborta_o_upload_em_excecao(self):
+        with self.assertRaises(RuntimeError):
+            with EscritorMultipartS3(self.s3_client, 'bronze', CHAVE, tamanho_parte=TAMANHO_PARTE) as destino:
+                # Uma parte completa já foi enviada quando a exceção acontece
+                destino.write(self.conteudo[:6 * MB])
+                raise RuntimeError("falha no meio da escrita")
+        self.assertEqual(self.pendentes(), [])
+        with self.assertRaises(ClientError):
+            self.s3_client.head_object(Bucket='bronze', Key=CHAVE)
+
+if __name__ == '__main__':
+    unittest.main()